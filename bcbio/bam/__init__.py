@@ -5,10 +5,7 @@ import os
 import itertools
 import signal
 import subprocess
-import numpy
 
-import pybedtools
-import pysam
 import toolz as tz
 
 from bcbio import broad, utils
@@ -20,6 +17,10 @@ from bcbio.pipeline import config_utils
 import bcbio.pipeline.datadict as dd
 from bcbio.provenance import do
 
+numpy = utils.LazyImport("numpy")
+pybedtools = utils.LazyImport("pybedtools")
+pysam = utils.LazyImport("pysam")
+
 def is_empty(bam_file):
     """Determine if a BAM file is empty
     """
@@ -220,7 +221,7 @@ def _get_maxcov_downsample(data):
     params = {"min_coverage_for_downsampling": 10,
               "maxcov_downsample_multiplier": dd.get_maxcov_downsample(data)}
     fastq_file = data["files"][0]
-    num_reads = alignprep.total_reads_from_grabix(fastq_file)
+    num_reads = alignprep.total_reads(fastq_file)
     if num_reads and params["maxcov_downsample_multiplier"] and params["maxcov_downsample_multiplier"] > 0:
         vrs = dd.get_variant_regions_merged(data)
         total_size = sum([c.size for c in ref.file_contigs(dd.get_ref_file(data), data["config"])])
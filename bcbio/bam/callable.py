@@ -12,12 +12,10 @@ small blocks.
 import collections
 import os
 
-import numpy
-import pybedtools
-import pysam
 import toolz as tz
 
 from bcbio import broad, utils
+from bcbio.bed import intervals
 from bcbio.cwl import cwlutils
 from bcbio.log import logger
 from bcbio.distributed.transaction import file_transaction
@@ -26,6 +24,10 @@ from bcbio.pipeline import datadict as dd
 from bcbio.variation import coverage
 from bcbio.variation import multi as vmulti
 
+numpy = utils.LazyImport("numpy")
+pybedtools = utils.LazyImport("pybedtools")
+pysam = utils.LazyImport("pysam")
+
 
 def sample_callable_bed(bam_file, ref_file, data):
     """Retrieve callable regions for a sample subset by defined analysis regions.
@@ -48,23 +50,35 @@ def sample_callable_bed(bam_file, ref_file, data):
                     filter_regions.saveas(tx_out_file)
     return CovInfo(out_file, callable_bed, depth_files)
 
-def get_ref_bedtool(ref_file, config, chrom=None):
-    """Retrieve a pybedtool BedTool object with reference sizes from input reference.
+def _get_ref_sizes(ref_file, config, chrom=None):
+    """Retrieve (chrom, size) for reference sequences, in reference order.
     """
     broad_runner = broad.runner_from_path("picard", config)
     ref_dict = broad_runner.run_fn("picard_index_ref", ref_file)
-    ref_lines = []
+    out = []
     with pysam.Samfile(ref_dict, "r") as ref_sam:
         for sq in ref_sam.header["SQ"]:
             if not chrom or sq["SN"] == chrom:
-                ref_lines.append("%s\t%s\t%s" % (sq["SN"], 0, sq["LN"]))
+                out.append((sq["SN"], sq["LN"]))
+    return out
+
+def get_ref_bedtool(ref_file, config, chrom=None):
+    """Retrieve a pybedtool BedTool object with reference sizes from input reference.
+    """
+    ref_lines = ["%s\t%s\t%s" % (c, 0, size) for c, size in _get_ref_sizes(ref_file, config, chrom)]
     return pybedtools.BedTool("\n".join(ref_lines), from_string=True)
 
+def get_ref_intervals(ref_file, config, chrom=None):
+    """Retrieve an in memory IntervalSet with reference sizes from input reference.
+    """
+    return intervals.IntervalSet.from_records((c, 0, size) for c, size
+                                              in _get_ref_sizes(ref_file, config, chrom))
+
 def _get_nblock_regions(in_file, min_n_size, ref_regions):
     """Retrieve coordinates of regions in reference genome with no mapping.
     These are potential breakpoints for parallelizing analysis.
     """
-    out_lines = []
+    out = []
     called_contigs = set([])
     with utils.open_gzipsafe(in_file) as in_handle:
         for line in in_handle:
@@ -72,28 +86,16 @@ def _get_nblock_regions(in_file, min_n_size, ref_regions):
             called_contigs.add(contig)
             if (ctype in ["REF_N", "NO_COVERAGE", "EXCESSIVE_COVERAGE", "LOW_COVERAGE"] and
                   int(end) - int(start) > min_n_size):
-                out_lines.append("%s\t%s\t%s\n" % (contig, start, end))
+                out.append((contig, start, end))
     for refr in ref_regions:
         if refr.chrom not in called_contigs:
-            out_lines.append("%s\t%s\t%s\n" % (refr.chrom, 0, refr.stop))
-    return pybedtools.BedTool("\n".join(out_lines), from_string=True)
+            out.append((refr.chrom, 0, refr.end))
+    return intervals.IntervalSet.from_records(out)
 
 def _combine_regions(all_regions, ref_regions):
-    """Combine multiple BEDtools regions of regions into sorted final BEDtool.
+    """Combine multiple sets of regions into a final set sorted by reference order.
     """
-    chrom_order = {}
-    for i, x in enumerate(ref_regions):
-        chrom_order[x.chrom] = i
-    def wchrom_key(x):
-        chrom, start, end = x
-        return (chrom_order[chrom], start, end)
-    all_intervals = []
-    for region_group in all_regions:
-        for region in region_group:
-            all_intervals.append((region.chrom, int(region.start), int(region.stop)))
-    all_intervals.sort(key=wchrom_key)
-    bed_lines = ["%s\t%s\t%s" % (c, s, e) for (c, s, e) in all_intervals]
-    return pybedtools.BedTool("\n".join(bed_lines), from_string=True)
+    return reduce(lambda a, b: a.cat(b), all_regions).sort(ref_regions.chroms())
 
 def _add_config_regions(nblock_regions, ref_regions, config):
     """Add additional nblock regions based on configured regions to call.
@@ -101,13 +103,8 @@ def _add_config_regions(nblock_regions, ref_regions, config):
     """
     input_regions_bed = config["algorithm"].get("variant_regions", None)
     if input_regions_bed:
-        input_regions = pybedtools.BedTool(input_regions_bed)
-        # work around problem with single region not subtracted correctly.
-        if len(input_regions) == 1:
-            str_regions = str(input_regions[0]).strip()
-            input_regions = pybedtools.BedTool("%s\n%s" % (str_regions, str_regions),
-                                               from_string=True)
-        input_nblock = ref_regions.subtract(input_regions, nonamecheck=True)
+        input_regions = intervals.IntervalSet.from_bed(input_regions_bed)
+        input_nblock = ref_regions.subtract(input_regions)
         if input_nblock == ref_regions:
             raise ValueError("Input variant_region file (%s) "
                              "excludes all genomic regions. Do the chromosome names "
@@ -131,41 +128,41 @@ class NBlockRegionPicker:
         self._end_buffer = 250 if min_n_size > 50 else 0
         self._chr_last_blocks = {}
         target_blocks = int(config["algorithm"].get("nomap_split_targets", 200))
-        self._target_size = self._get_target_size(target_blocks, ref_regions)
-        self._ref_sizes = {x.chrom: x.stop for x in ref_regions}
+        self._target_size = ref_regions.total_size() // target_blocks
+        self._ref_sizes = {x.chrom: x.end for x in ref_regions}
 
-    def _get_target_size(self, target_blocks, ref_regions):
-        size = 0
-        for x in ref_regions:
-            size += (x.end - x.start)
-        return size // target_blocks
+    def include_blocks(self, chrom, starts, ends):
+        """Select blocks on a chromosome based on distance from previous included blocks.
 
-    def include_block(self, x):
-        """Check for inclusion of block based on distance from previous.
+        Suitable for `IntervalSet.filter`, returning a boolean mask of blocks to keep.
         """
-        last_pos = self._chr_last_blocks.get(x.chrom, 0)
+        ref_size = self._ref_sizes.get(chrom, 0)
+        last_pos = self._chr_last_blocks.get(chrom, 0)
         # Region excludes an entire chromosome, typically decoy/haplotypes
-        if last_pos <= self._end_buffer and x.stop >= self._ref_sizes.get(x.chrom, 0) - self._end_buffer:
-            return True
+        whole_chrom = ends >= ref_size - self._end_buffer
         # Do not split on smaller decoy and haplotype chromosomes
-        elif self._ref_sizes.get(x.chrom, 0) <= self._target_size:
-            return False
-        elif (x.start - last_pos) > self._target_size:
-            self._chr_last_blocks[x.chrom] = x.stop
-            return True
-        else:
-            return False
+        if ref_size <= self._target_size:
+            return whole_chrom & (last_pos <= self._end_buffer)
+        keep = numpy.zeros(len(starts), dtype=bool)
+        for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+            if last_pos <= self._end_buffer and whole_chrom[i]:
+                keep[i] = True
+            elif (start - last_pos) > self._target_size:
+                last_pos = end
+                keep[i] = True
+        self._chr_last_blocks[chrom] = last_pos
+        return keep
 
-    def expand_block(self, feat):
+    def expand_blocks(self, chrom, starts, ends):
         """Expand any blocks which are near the start or end of a contig.
+
+        Suitable for `IntervalSet.transform`.
         """
-        chrom_end = self._ref_sizes.get(feat.chrom)
+        chrom_end = self._ref_sizes.get(chrom)
         if chrom_end:
-            if feat.start < self._end_buffer:
-                feat.start = 0
-            if feat.stop >= chrom_end - self._end_buffer:
-                feat.stop = chrom_end
-        return feat
+            starts[starts < self._end_buffer] = 0
+            ends[ends >= chrom_end - self._end_buffer] = chrom_end
+        return starts, ends
 
 def block_regions(callable_bed, in_bam, ref_file, data):
     """Find blocks of regions for analysis from mapped input BAM file.
@@ -175,27 +172,27 @@ def block_regions(callable_bed, in_bam, ref_file, data):
     """
     config = data["config"]
     min_n_size = int(config["algorithm"].get("nomap_split_size", 250))
-    with shared.bedtools_tmpdir({"config": config}):
-        nblock_bed = "%s-nblocks.bed" % utils.splitext_plus(callable_bed)[0]
-        callblock_bed = "%s-callableblocks.bed" % utils.splitext_plus(callable_bed)[0]
-        if not utils.file_uptodate(nblock_bed, callable_bed):
-            ref_regions = get_ref_bedtool(ref_file, config)
-            nblock_regions = _get_nblock_regions(callable_bed, min_n_size, ref_regions)
-            nblock_regions = _add_config_regions(nblock_regions, ref_regions, config)
-            nblock_regions.filter(lambda r: len(r) > min_n_size).saveas(nblock_bed)
-            if len(ref_regions.subtract(nblock_regions, nonamecheck=True)) > 0:
-                ref_regions.subtract(nblock_bed, nonamecheck=True).merge(d=min_n_size).saveas(callblock_bed)
-            else:
-                raise ValueError("No callable regions found from BAM file. Alignment regions might "
-                                 "not overlap with regions found in your `variant_regions` BED: %s" % in_bam)
+    nblock_bed = "%s-nblocks.bed" % utils.splitext_plus(callable_bed)[0]
+    callblock_bed = "%s-callableblocks.bed" % utils.splitext_plus(callable_bed)[0]
+    if not utils.file_uptodate(nblock_bed, callable_bed):
+        ref_regions = get_ref_intervals(ref_file, config)
+        nblock_regions = _get_nblock_regions(callable_bed, min_n_size, ref_regions)
+        nblock_regions = _add_config_regions(nblock_regions, ref_regions, config)
+        nblock_regions = nblock_regions.filter_size(min_n_size)
+        nblock_regions.to_bed(nblock_bed)
+        callable_regions = ref_regions.subtract(nblock_regions)
+        if len(callable_regions) > 0:
+            with file_transaction(data, callblock_bed) as tx_callblock_bed:
+                callable_regions.merge(min_n_size).to_bed(tx_callblock_bed)
+        else:
+            raise ValueError("No callable regions found from BAM file. Alignment regions might "
+                             "not overlap with regions found in your `variant_regions` BED: %s" % in_bam)
     return callblock_bed, nblock_bed, callable_bed
 
-def _write_bed_regions(data, final_regions, out_file, out_file_ref):
-    ref_file = tz.get_in(["reference", "fasta", "base"], data)
-    ref_regions = get_ref_bedtool(ref_file, data["config"])
-    noanalysis_regions = ref_regions.subtract(final_regions, nonamecheck=True)
-    final_regions.saveas(out_file)
-    noanalysis_regions.saveas(out_file_ref)
+def _write_bed_regions(final_regions, ref_regions, out_file, out_file_ref):
+    noanalysis_regions = ref_regions.subtract(final_regions)
+    final_regions.to_bed(out_file)
+    noanalysis_regions.to_bed(out_file_ref)
 
 def _analysis_block_stats(regions, samples):
     """Provide statistics on sizes and number of analysis blocks.
@@ -261,32 +258,36 @@ def combine_sample_regions(*samples):
     out = []
     analysis_files = []
     batches = []
-    with shared.bedtools_tmpdir(samples[0]):
-        for batch, items in vmulti.group_by_batch(samples, require_bam=False).items():
-            batches.append(items)
-            if global_analysis_file:
-                analysis_file, no_analysis_file = global_analysis_file, global_no_analysis_file
-            else:
-                analysis_file, no_analysis_file = _combine_sample_regions_batch(batch, items)
-            for data in items:
-                vr_file = dd.get_variant_regions(data)
-                if analysis_file:
-                    analysis_files.append(analysis_file)
-                    data["config"]["algorithm"]["callable_regions"] = analysis_file
-                    data["config"]["algorithm"]["non_callable_regions"] = no_analysis_file
-                    data["config"]["algorithm"]["callable_count"] = pybedtools.BedTool(analysis_file).count()
-                elif vr_file:
-                    data["config"]["algorithm"]["callable_count"] = pybedtools.BedTool(vr_file).count()
-                # attach a representative sample for calculating callable region
-                if not data.get("work_bam"):
-                    for x in items:
-                        if x.get("work_bam"):
-                            data["work_bam_callable"] = x["work_bam"]
-                out.append([data])
-        assert len(out) == len(samples)
-        if len(analysis_files) > 0:
-            final_regions = pybedtools.BedTool(analysis_files[0])
-            _analysis_block_stats(final_regions, batches[0])
+    region_counts = {}
+    def _count_regions(bed_file):
+        if bed_file not in region_counts:
+            region_counts[bed_file] = len(intervals.IntervalSet.from_bed(bed_file))
+        return region_counts[bed_file]
+    for batch, items in vmulti.group_by_batch(samples, require_bam=False).items():
+        batches.append(items)
+        if global_analysis_file:
+            analysis_file, no_analysis_file = global_analysis_file, global_no_analysis_file
+        else:
+            analysis_file, no_analysis_file = _combine_sample_regions_batch(batch, items)
+        for data in items:
+            vr_file = dd.get_variant_regions(data)
+            if analysis_file:
+                analysis_files.append(analysis_file)
+                data["config"]["algorithm"]["callable_regions"] = analysis_file
+                data["config"]["algorithm"]["non_callable_regions"] = no_analysis_file
+                data["config"]["algorithm"]["callable_count"] = _count_regions(analysis_file)
+            elif vr_file:
+                data["config"]["algorithm"]["callable_count"] = _count_regions(vr_file)
+            # attach a representative sample for calculating callable region
+            if not data.get("work_bam"):
+                for x in items:
+                    if x.get("work_bam"):
+                        data["work_bam_callable"] = x["work_bam"]
+            out.append([data])
+    assert len(out) == len(samples)
+    if len(analysis_files) > 0:
+        final_regions = intervals.IntervalSet.from_bed(analysis_files[0])
+        _analysis_block_stats(final_regions, batches[0])
     return out
 
 def _combine_sample_regions_batch(batch, items):
@@ -300,25 +301,22 @@ def _combine_sample_regions_batch(batch, items):
         # Combine all nblocks into a final set of intersecting regions
         # without callable bases. HT @brentp for intersection approach
         # https://groups.google.com/forum/?fromgroups#!topic/bedtools-discuss/qA9wK4zN8do
-        bed_regions = [pybedtools.BedTool(x["regions"]["nblock"])
-                       for x in items if "regions" in x]
-        if len(bed_regions) == 0:
+        # Intersections are done in memory, loading one sample's nblocks at a time.
+        nblock_files = [x["regions"]["nblock"] for x in items if "regions" in x]
+        if len(nblock_files) == 0:
             analysis_file, no_analysis_file = None, None
         else:
             with file_transaction(items[0], analysis_file, no_analysis_file) as (tx_afile, tx_noafile):
-                def intersect_two(a, b):
-                    return a.intersect(b, nonamecheck=True)
-                nblock_regions = reduce(intersect_two, bed_regions).saveas(
-                    "%s-nblock%s" % utils.splitext_plus(tx_afile))
+                nblock_regions = reduce(lambda a, b: a.intersect(b),
+                                        (intervals.IntervalSet.from_bed(x) for x in nblock_files))
                 ref_file = tz.get_in(["reference", "fasta", "base"], items[0])
-                ref_regions = get_ref_bedtool(ref_file, config)
+                ref_regions = get_ref_intervals(ref_file, config)
                 min_n_size = int(config["algorithm"].get("nomap_split_size", 250))
                 block_filter = NBlockRegionPicker(ref_regions, config, min_n_size)
                 final_nblock_regions = nblock_regions.filter(
-                    block_filter.include_block).saveas().each(block_filter.expand_block).saveas(
-                        "%s-nblockfinal%s" % utils.splitext_plus(tx_afile))
-                final_regions = ref_regions.subtract(final_nblock_regions, nonamecheck=True).merge(d=min_n_size)
-                _write_bed_regions(items[0], final_regions, tx_afile, tx_noafile)
+                    block_filter.include_blocks).transform(block_filter.expand_blocks)
+                final_regions = ref_regions.subtract(final_nblock_regions).merge(min_n_size)
+                _write_bed_regions(final_regions, ref_regions, tx_afile, tx_noafile)
     if analysis_file and utils.file_exists(analysis_file):
         return analysis_file, no_analysis_file
     else:
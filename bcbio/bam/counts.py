@@ -6,8 +6,10 @@ differences in defined or random regions.
 from __future__ import print_function
 import random
 import collections
+from bcbio import utils
+
+pysam = utils.LazyImport("pysam")
 
-import pysam
 
 class NormalizedBam:
     """Prepare and query an alignment BAM file for normalized read counts.
@@ -4,8 +4,6 @@ calculate coverage across a list of regions
 import os
 
 import six
-import pandas as pd
-import pybedtools
 
 from bcbio import utils
 from bcbio.utils import rbind, file_exists
@@ -16,6 +14,9 @@ from bcbio.pipeline import config_utils
 from collections import defaultdict
 from itertools import repeat
 
+pd = utils.LazyImport("pandas")
+pybedtools = utils.LazyImport("pybedtools")
+
 mpl = utils.LazyImport("matplotlib")
 plt = utils.LazyImport("matplotlib.pyplot")
 pylab = utils.LazyImport("pylab")
@@ -1,4 +1,6 @@
-from Bio import SeqIO
+from bcbio import utils
+
+SeqIO = utils.LazyImport("Bio.SeqIO")
 
 def sequence_length(fasta):
     """
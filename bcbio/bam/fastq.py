@@ -2,13 +2,16 @@
 """
 
 from six.moves import zip
-from itertools import product
+from itertools import islice, product
+import contextlib
+import io
 import os
 import random
 import gzip
+import signal
+import subprocess
 import sys
 
-from Bio import SeqIO
 from bcbio.distributed import objectstore
 from bcbio.distributed.transaction import file_transaction
 from bcbio.log import logger
@@ -39,15 +42,15 @@ def filter_single_reads_by_length(in_file, quality_format, min_length=20,
     removes reads from a fastq file which are shorter than a minimum
     length
 
+    Records are copied unchanged so quality_format does not require conversion.
     """
     logger.info("Removing reads in %s thare are less than %d bases."
                 % (in_file, min_length))
-    in_iterator = SeqIO.parse(in_file, quality_format)
-    out_iterator = (record for record in in_iterator if
-                    len(record.seq) > min_length)
     with file_transaction(out_file) as tmp_out_file:
-        with open(tmp_out_file, "w") as out_handle:
-            SeqIO.write(out_iterator, out_handle, quality_format)
+        with open_possible_gzip(tmp_out_file, "wb") as out_handle:
+            for record in fastq_records(in_file):
+                if len(record[1].rstrip()) > min_length:
+                    out_handle.write(b"".join(record))
     return out_file
 
 def filter_reads_by_length(fq1, fq2, quality_format, min_length=20):
@@ -67,26 +70,25 @@ def filter_reads_by_length(fq1, fq2, quality_format, min_length=20):
     if all(map(utils.file_exists, [fq1_out, fq2_out, fq2_single, fq2_single])):
         return [fq1_out, fq2_out]
 
-    fq1_in = SeqIO.parse(fq1, quality_format)
-    fq2_in = SeqIO.parse(fq2, quality_format)
-
     out_files = [fq1_out, fq2_out, fq1_single, fq2_single]
 
     with file_transaction(out_files) as tmp_out_files:
-        fq1_out_handle = open(tmp_out_files[0], "w")
-        fq2_out_handle = open(tmp_out_files[1], "w")
-        fq1_single_handle = open(tmp_out_files[2], "w")
-        fq2_single_handle = open(tmp_out_files[3], "w")
-
-        for fq1_record, fq2_record in zip(fq1_in, fq2_in):
-            if len(fq1_record.seq) >= min_length and len(fq2_record.seq) >= min_length:
-                fq1_out_handle.write(fq1_record.format(quality_format))
-                fq2_out_handle.write(fq2_record.format(quality_format))
+        fq1_out_handle = open_possible_gzip(tmp_out_files[0], "wb")
+        fq2_out_handle = open_possible_gzip(tmp_out_files[1], "wb")
+        fq1_single_handle = open_possible_gzip(tmp_out_files[2], "wb")
+        fq2_single_handle = open_possible_gzip(tmp_out_files[3], "wb")
+
+        for fq1_record, fq2_record in zip(fastq_records(fq1), fastq_records(fq2)):
+            fq1_len = len(fq1_record[1].rstrip())
+            fq2_len = len(fq2_record[1].rstrip())
+            if fq1_len >= min_length and fq2_len >= min_length:
+                fq1_out_handle.write(b"".join(fq1_record))
+                fq2_out_handle.write(b"".join(fq2_record))
             else:
-                if len(fq1_record.seq) > min_length:
-                    fq1_single_handle.write(fq1_record.format(quality_format))
-                if len(fq2_record.seq) > min_length:
-                    fq2_single_handle.write(fq2_record.format(quality_format))
+                if fq1_len > min_length:
+                    fq1_single_handle.write(b"".join(fq1_record))
+                if fq2_len > min_length:
+                    fq2_single_handle.write(b"".join(fq2_record))
         fq1_out_handle.close()
         fq2_out_handle.close()
         fq1_single_handle.close()
@@ -195,15 +197,6 @@ def downsample(f1, f2, data, N, quick=False):
     quick=True will just grab the first N reads rather than do a true
     downsampling
     """
-    if quick:
-        rand_records = range(N)
-    else:
-        records = sum(1 for _ in open(f1)) / 4
-        N = records if N > records else N
-        rand_records = sorted(random.sample(xrange(records), N))
-
-    fh1 = open_possible_gzip(f1)
-    fh2 = open_possible_gzip(f2) if f2 else None
     outf1 = os.path.splitext(f1)[0] + ".subset" + os.path.splitext(f1)[1]
     outf2 = os.path.splitext(f2)[0] + ".subset" + os.path.splitext(f2)[1] if f2 else None
 
@@ -213,6 +206,13 @@ def downsample(f1, f2, data, N, quick=False):
         elif utils.file_exists(outf2):
             return outf1, outf2
 
+    if quick:
+        rand_records = range(N)
+    else:
+        records = count_records(f1)
+        N = records if N > records else N
+        rand_records = sorted(random.sample(xrange(records), N))
+
     out_files = (outf1, outf2) if outf2 else (outf1)
 
     with file_transaction(out_files) as tx_out_files:
@@ -220,24 +220,31 @@ def downsample(f1, f2, data, N, quick=False):
             tx_out_f1 = tx_out_files
         else:
             tx_out_f1, tx_out_f2 = tx_out_files
-        sub1 = open_possible_gzip(tx_out_f1, "w")
-        sub2 = open_possible_gzip(tx_out_f2, "w") if outf2 else None
-        rec_no = - 1
-        for rr in rand_records:
-            while rec_no < rr:
+        sub1 = open_possible_gzip(tx_out_f1, "wb")
+        sub2 = open_possible_gzip(tx_out_f2, "wb") if outf2 else None
+        records1 = fastq_records(f1)
+        records2 = fastq_records(f2) if f2 else None
+        try:
+            rec_no = 0
+            for rr in rand_records:
+                while rec_no < rr:
+                    next(records1)
+                    if records2:
+                        next(records2)
+                    rec_no += 1
+                try:
+                    sub1.write(b"".join(next(records1)))
+                    if sub2:
+                        sub2.write(b"".join(next(records2)))
+                except StopIteration:
+                    break
                 rec_no += 1
-                for i in range(4): fh1.readline()
-                if fh2:
-                    for i in range(4): fh2.readline()
-            for i in range(4):
-                sub1.write(fh1.readline())
-                if sub2:
-                    sub2.write(fh2.readline())
-            rec_no += 1
-        fh1.close()
+        finally:
+            records1.close()
+            if records2:
+                records2.close()
         sub1.close()
-        if f2:
-            fh2.close()
+        if sub2:
             sub2.close()
 
     return outf1, outf2
@@ -246,16 +253,10 @@ def estimate_read_length(fastq_file, quality_format="fastq-sanger", nreads=1000)
     """
     estimate average read length of a fastq file
     """
-
-    in_handle = SeqIO.parse(open_fastq(fastq_file), quality_format)
-    read = in_handle.next()
-    average = len(read.seq)
-    for _ in range(nreads):
-        try:
-            average = (average + len(in_handle.next().seq)) / 2
-        except StopIteration:
-            break
-    in_handle.close()
+    lengths = _read_lengths(fastq_file, nreads + 1)
+    average = lengths[0]
+    for length in lengths[1:]:
+        average = (average + length) / 2
     return average
 
 def estimate_maximum_read_length(fastq_file, quality_format="fastq-sanger",
@@ -263,15 +264,68 @@ def estimate_maximum_read_length(fastq_file, quality_format="fastq-sanger",
     """
     estimate average read length of a fastq file
     """
-    in_handle = SeqIO.parse(open_fastq(fastq_file), quality_format)
-    lengths = []
-    for _ in range(nreads):
+    return max(_read_lengths(fastq_file, nreads))
+
+def _read_lengths(fastq_file, nreads):
+    records = fastq_records(fastq_file)
+    try:
+        return [len(record[1].rstrip()) for record in islice(records, nreads)]
+    finally:
+        records.close()
+
+def count_records(fastq_file, threads=1):
+    """Count the number of records in a fastq file.
+    """
+    records = fastq_records(fastq_file, threads)
+    try:
+        return sum(1 for _ in records)
+    finally:
+        records.close()
+
+def fastq_records(in_file, threads=1):
+    """Iterate over records in a fastq file as tuples of raw name, sequence, plus and quality lines.
+
+    Lines are returned as bytes with trailing newlines, so records can be
+    written back out by joining them. Handles plain, gzip and bgzip inputs;
+    with multiple threads, gzipped inputs are decompressed with pigz when
+    available.
+    """
+    with _open_fastq_binary(in_file, threads) as in_handle:
+        lines = iter(in_handle)
+        for record in zip(lines, lines, lines, lines):
+            if not record[0].startswith(b"@") or not record[2].startswith(b"+"):
+                raise ValueError("Unexpected fastq record format in %s: %s" % (in_file, record[0].rstrip()))
+            yield record
+
+@contextlib.contextmanager
+def _open_fastq_binary(in_file, threads=1):
+    """Open a fastq file for fast binary reading, using a multithreaded decompressor if available.
+    """
+    if objectstore.is_remote(in_file):
+        in_handle = objectstore.open_file(in_file)
+        try:
+            yield in_handle
+        finally:
+            in_handle.close()
+    elif utils.is_gzipped(in_file) and threads > 1 and utils.which("pigz"):
+        cmd = [utils.which("pigz"), "-dc", "-p", str(threads), in_file]
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=-1)
         try:
-            lengths.append(len(in_handle.next().seq))
-        except StopIteration:
-            break
-    in_handle.close()
-    return max(lengths)
+            yield p.stdout
+        except:
+            p.stdout.close()
+            p.wait()
+            raise
+        p.stdout.close()
+        # pigz exits from SIGPIPE when callers stop reading early
+        if p.wait() not in [0, -signal.SIGPIPE]:
+            raise subprocess.CalledProcessError(p.returncode, " ".join(cmd))
+    elif utils.is_gzipped(in_file):
+        with gzip.open(in_file, "rb") as gz_handle:
+            yield io.BufferedReader(gz_handle)
+    else:
+        with open(in_file, "rb") as in_handle:
+            yield in_handle
 
 def open_fastq(in_file):
     """ open a fastq file, using gzip if it is gzipped
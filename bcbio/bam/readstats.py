@@ -1,7 +1,12 @@
 """Calculation of mapped reads by BAM counting, currently implemented with samtools.
+
+Also provides a per-run metrics cache shared by read counting and coverage
+calculations.
 """
+import hashlib
 import json
 import os
+import sqlite3
 import toolz as tz
 
 from bcbio import bam, utils
@@ -30,7 +35,101 @@ def get_cache_file(data):
         return cache_file
     else:
         return os.path.join(utils.safe_makedir(os.path.join(dd.get_work_dir(data), "coverage")),
-                            "mapped_stats.txt")
+                            "mapped_stats.db")
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS metrics (
+               sample TEXT, metric TEXT, bam TEXT, flags TEXT, target TEXT, value REAL,
+               PRIMARY KEY (sample, metric, bam, flags, target))"""
+
+def _connect(cache_file):
+    """Connect to the metrics cache.
+
+    Uses SQLite's default rollback journal with a long busy timeout to
+    serialize concurrent writers, since work directories are commonly on
+    shared filesystems where write-ahead logging is not supported.
+    """
+    conn = sqlite3.connect(cache_file, timeout=120)
+    conn.execute(_SCHEMA)
+    return conn
+
+def _file_signature(fname):
+    """Identify a file by size and checksums of its start and end.
+
+    Avoids reading full BAM files, while staying valid if files get re-staged
+    or symlinked to new locations with different modification times.
+    """
+    if not fname:
+        return ""
+    chunk_size = 65536
+    size = os.path.getsize(fname)
+    sig = hashlib.sha1(str(size).encode())
+    with open(fname, "rb") as in_handle:
+        sig.update(in_handle.read(chunk_size))
+        if size > chunk_size:
+            in_handle.seek(max(chunk_size, size - chunk_size))
+            sig.update(in_handle.read())
+    return sig.hexdigest()
+
+def _metric_key(data, metric, bam_file, flags, bed_file, target_name):
+    target = ""
+    if bed_file or target_name:
+        target = "%s:%s" % (target_name or os.path.basename(bed_file), _file_signature(bed_file))
+    return (dd.get_sample_name(data), metric, _file_signature(bam_file),
+            ",".join(sorted(flags or [])), target)
+
+def get_metric(data, metric, bam_file, flags=None, bed_file=None, target_name=None):
+    """Retrieve a cached metric for a BAM file, or None if not yet calculated.
+
+    Values are keyed by sample, BAM file contents, read flags and target regions.
+    """
+    cache_file = get_cache_file(data)
+    if not utils.file_exists(cache_file):
+        return None
+    try:
+        conn = _connect(cache_file)
+        try:
+            val = conn.execute("SELECT value FROM metrics WHERE sample = ? AND metric = ? AND bam = ? "
+                               "AND flags = ? AND target = ?",
+                               _metric_key(data, metric, bam_file, flags, bed_file, target_name)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.debug("Could not read metrics cache %s: %s" % (cache_file, e))
+        return None
+    return val[0] if val else None
+
+def set_metric(data, metric, value, bam_file, flags=None, bed_file=None, target_name=None):
+    """Store a calculated metric in the cache, safe for concurrent writers.
+
+    Failures to write, like read-only cache files, only mean we re-calculate later.
+    """
+    cache_file = get_cache_file(data)
+    try:
+        conn = _connect(cache_file)
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO metrics (sample, metric, bam, flags, target, value) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             _metric_key(data, metric, bam_file, flags, bed_file, target_name) + (value,))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.debug("Could not write metrics cache %s: %s" % (cache_file, e))
+    return value
+
+def _legacy_cache_value(query_flags, bed_file, data):
+    """Back-compatible: retrieve counts from tab delimited mapped_stats.txt caches.
+    """
+    cache_file = os.path.join(dd.get_work_dir(data), "coverage", "mapped_stats.txt")
+    if utils.file_exists(cache_file):
+        key = json.dumps({"flags": sorted(query_flags),
+                          "region": os.path.basename(bed_file) if bed_file else "",
+                          "sample": dd.get_sample_name(data)},
+                         separators=(",", ":"), sort_keys=True)
+        with open(cache_file) as in_handle:
+            for cur_key, cur_val in (l.strip().split("\t") for l in in_handle):
+                if cur_key == key:
+                    return int(cur_val)
 
 def number_of_mapped_reads(data, bam_file, keep_dups=True, bed_file=None, target_name=None):
     """Count mapped reads, allow adjustment for duplicates and BED regions.
@@ -39,10 +138,8 @@ def number_of_mapped_reads(data, bam_file, keep_dups=True, bed_file=None, target
     (https://github.com/samtools/samtools/issues/88)
     we loop over regions in a BED file and add the counts together.
 
-    Uses a global cache file to store counts, making it possible to pass this single
-    file for CWL runs. For parallel processes it can have concurrent append writes,
-    with the hopes this will avoid race conditions. Need to revisit with some kind
-    of global file locking if it becomes an issue.
+    Uses a global cache database to store counts, making it possible to pass this single
+    file for CWL runs. SQLite locking handles concurrent writes from parallel processes.
     """
     # Flag explainer https://broadinstitute.github.io/picard/explain-flags.html
     callable_flags = ["not unmapped", "not mate_is_unmapped", "not secondary_alignment",
@@ -60,17 +157,14 @@ def number_of_mapped_reads(data, bam_file, keep_dups=True, bed_file=None, target
         with open(oldcache_file) as f:
             return int(f.read().strip())
 
+    count = _legacy_cache_value(query_flags, bed_file, data)
+    if count is not None:
+        return count
+
     # New cache
-    key = json.dumps({"flags": sorted(query_flags),
-                      "region": os.path.basename(bed_file) if bed_file else "",
-                      "sample": dd.get_sample_name(data)},
-                     separators=(",", ":"), sort_keys=True)
-    cache_file = get_cache_file(data)
-    if utils.file_exists(cache_file):
-        with open(cache_file) as in_handle:
-            for cur_key, cur_val in (l.strip().split("\t") for l in in_handle):
-                if cur_key == key:
-                    return int(cur_val)
+    count = get_metric(data, "mapped_reads", bam_file, query_flags, bed_file)
+    if count is not None:
+        return int(count)
 
     # Calculate stats
     bam.index(bam_file, data["config"], check_timestamp=False)
@@ -95,7 +189,4 @@ def number_of_mapped_reads(data, bam_file, keep_dups=True, bed_file=None, target
             with open(count_out) as in_handle:
                 count += int(in_handle.read().strip())
 
-    # Update cache
-    with open(cache_file, "a") as out_handle:
-        out_handle.write("%s\t%s\n" % (key, count))
-    return count
+    return set_metric(data, "mapped_reads", count, bam_file, query_flags, bed_file)
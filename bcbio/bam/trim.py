@@ -3,8 +3,6 @@
 import os
 import sys
 
-from Bio.Seq import Seq
-
 from bcbio import utils
 from bcbio.bam.fastq import is_fastq
 from bcbio.log import logger
@@ -14,6 +12,8 @@ from bcbio.pipeline import config_utils
 from bcbio.provenance import do
 import bcbio.pipeline.datadict as dd
 
+Seq = utils.LazyImport("Bio.Seq")
+
 SUPPORTED_ADAPTERS = {
     "illumina": ["AACACTCTTTCCCT", "AGATCGGAAGAGCG"],
     "truseq": ["AGATCGGAAGAG"],
@@ -102,12 +102,12 @@ def _get_sequences_to_trim(config, builtin):
     # for unstranded RNA-seq, libraries, both polyA and polyT can appear
     # at the 3' end as well
     if polya:
-        trim_sequences += [polya, str(Seq(polya).reverse_complement())]
+        trim_sequences += [polya, str(Seq.Seq(polya).reverse_complement())]
 
     # also trim the reverse complement of the adapters
     for _, v in builtin_adapters.items():
-        trim_sequences += [str(Seq(sequence)) for sequence in v]
-        trim_sequences += [str(Seq(sequence).reverse_complement()) for
+        trim_sequences += [str(Seq.Seq(sequence)) for sequence in v]
+        trim_sequences += [str(Seq.Seq(sequence).reverse_complement()) for
                            sequence in v]
     out = []
     for trim in trim_sequences:
@@ -1,7 +1,8 @@
-import pybedtools as bt
 from bcbio.utils import file_exists
 from bcbio import utils
 
+bt = utils.LazyImport("pybedtools")
+
 def decomment(bed_file, out_file):
     """
     clean a BED file
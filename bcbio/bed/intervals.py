@@ -0,0 +1,247 @@
+"""In memory genomic interval sets backed by per-chromosome NumPy arrays.
+
+Provides the subset of bedtools operations used for building callable
+analysis regions (intersect, subtract, merge, complement and filtering)
+without temporary files or subprocesses, so combining regions across large
+batches of samples stays in a single process. Results match the equivalent
+bedtools commands on BED3 inputs.
+"""
+import collections
+
+from bcbio import utils
+
+np = utils.LazyImport("numpy")
+
+Interval = collections.namedtuple("Interval", "chrom, start, end")
+
+class IntervalSet(object):
+    """Genomic intervals grouped by chromosome, sorted by start within each.
+
+    Chromosomes keep the order they were first seen in, matching the order
+    bedtools writes results in for inputs grouped by chromosome. Intervals
+    are not merged unless requested, so book-ended and overlapping intervals
+    stay distinct as they do in bedtools output.
+    """
+    def __init__(self, chroms=None):
+        self._chroms = collections.OrderedDict()
+        for chrom, starts, ends in chroms or []:
+            self._add(chrom, starts, ends)
+
+    def _add(self, chrom, starts, ends):
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if len(starts) > 0:
+            if chrom in self._chroms:
+                prev_starts, prev_ends = self._chroms[chrom]
+                starts = np.concatenate([prev_starts, starts])
+                ends = np.concatenate([prev_ends, ends])
+            if len(starts) > 1 and (np.any(starts[1:] < starts[:-1]) or
+                                    np.any((starts[1:] == starts[:-1]) & (ends[1:] < ends[:-1]))):
+                order = np.lexsort((ends, starts))
+                starts, ends = starts[order], ends[order]
+            self._chroms[chrom] = (starts, ends)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from an iterable of (chrom, start, end) records.
+        """
+        by_chrom = collections.OrderedDict()
+        for chrom, start, end in records:
+            if chrom not in by_chrom:
+                by_chrom[chrom] = ([], [])
+            by_chrom[chrom][0].append(int(start))
+            by_chrom[chrom][1].append(int(end))
+        return cls((chrom, starts, ends) for chrom, (starts, ends) in by_chrom.items())
+
+    @classmethod
+    def from_bed(cls, in_file):
+        """Read the first three columns of a BED file, skipping headers and blank lines.
+        """
+        def _records(in_handle):
+            for line in in_handle:
+                if line.startswith(("#", "track", "browser")) or not line.strip():
+                    continue
+                parts = line.split("\t", 3) if "\t" in line else line.split()
+                yield parts[0], parts[1], parts[2]
+        with utils.open_gzipsafe(in_file) as in_handle:
+            return cls.from_records(_records(in_handle))
+
+    def to_bed(self, out_file):
+        with open(out_file, "w") as out_handle:
+            for chrom, starts, ends in self.items():
+                out_handle.writelines("%s\t%s\t%s\n" % (chrom, s, e)
+                                      for s, e in zip(starts.tolist(), ends.tolist()))
+        return out_file
+
+    def items(self):
+        """Iterate over (chrom, starts, ends) for each chromosome.
+        """
+        for chrom, (starts, ends) in self._chroms.items():
+            yield chrom, starts, ends
+
+    def chroms(self):
+        return list(self._chroms.keys())
+
+    def __iter__(self):
+        for chrom, starts, ends in self.items():
+            for s, e in zip(starts.tolist(), ends.tolist()):
+                yield Interval(chrom, s, e)
+
+    def __len__(self):
+        return sum(len(starts) for starts, _ in self._chroms.values())
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet) or self.chroms() != other.chroms():
+            return False
+        for chrom, starts, ends in self.items():
+            ostarts, oends = other._chroms[chrom]
+            if not (np.array_equal(starts, ostarts) and np.array_equal(ends, oends)):
+                return False
+        return True
+
+    def __ne__(self, other):
+        return not self == other
+
+    def total_size(self):
+        return int(sum(int((ends - starts).sum()) for _, starts, ends in self.items()))
+
+    def filter(self, fn):
+        """Keep intervals where fn(chrom, starts, ends) returns a True mask.
+        """
+        out = IntervalSet()
+        for chrom, starts, ends in self.items():
+            keep = np.asarray(fn(chrom, starts, ends), dtype=bool)
+            out._add(chrom, starts[keep], ends[keep])
+        return out
+
+    def filter_size(self, min_size):
+        """Keep intervals longer than min_size, like filtering on len(interval) > min_size.
+        """
+        return self.filter(lambda chrom, starts, ends: (ends - starts) > min_size)
+
+    def transform(self, fn):
+        """Replace coordinates with the (starts, ends) returned by fn(chrom, starts, ends).
+        """
+        out = IntervalSet()
+        for chrom, starts, ends in self.items():
+            new_starts, new_ends = fn(chrom, starts.copy(), ends.copy())
+            out._add(chrom, new_starts, new_ends)
+        return out
+
+    def sort(self, chrom_order):
+        """Order chromosomes by a list of names, as in a reference genome.
+        """
+        positions = dict((c, i) for i, c in enumerate(chrom_order))
+        out = IntervalSet()
+        for chrom in sorted(self.chroms(), key=lambda c: positions[c]):
+            out._chroms[chrom] = self._chroms[chrom]
+        return out
+
+    def cat(self, other):
+        """Combine intervals from both sets without merging.
+        """
+        out = IntervalSet(self.items())
+        for chrom, starts, ends in other.items():
+            out._add(chrom, starts, ends)
+        return out
+
+    def merge(self, distance=0):
+        """Merge overlapping and book-ended intervals, and those within distance bp.
+
+        Equivalent to `bedtools merge -d distance`.
+        """
+        out = IntervalSet()
+        for chrom, starts, ends in self.items():
+            out._add(chrom, *_merge_arrays(starts, ends, distance))
+        return out
+
+    def intersect(self, other):
+        """Overlapping portions of each interval with intervals in other.
+
+        Equivalent to `bedtools intersect -a self -b other`, reporting one
+        interval for each overlapping pair, ordered by position.
+        """
+        out = IntervalSet()
+        for chrom, starts, ends in self.items():
+            if chrom in other._chroms:
+                ostarts, oends = other._chroms[chrom]
+                a_idx, b_idx = _overlap_pairs(starts, ends, ostarts, oends)
+                out._add(chrom, np.maximum(starts[a_idx], ostarts[b_idx]),
+                         np.minimum(ends[a_idx], oends[b_idx]))
+        return out
+
+    def subtract(self, other):
+        """Remove portions of intervals overlapping any interval in other.
+
+        Equivalent to `bedtools subtract -a self -b other`.
+        """
+        out = IntervalSet()
+        for chrom, starts, ends in self.items():
+            if chrom in other._chroms:
+                gap_starts, gap_ends = _gaps(*_merge_arrays(*other._chroms[chrom]))
+                a_idx, b_idx = _overlap_pairs(starts, ends, gap_starts, gap_ends)
+                out._add(chrom, np.maximum(starts[a_idx], gap_starts[b_idx]),
+                         np.minimum(ends[a_idx], gap_ends[b_idx]))
+            else:
+                out._add(chrom, starts, ends)
+        return out
+
+    def complement(self, ref_regions):
+        """Regions of the reference not covered by these intervals.
+        """
+        return ref_regions.subtract(self)
+
+    def overlaps(self, chrom, starts, ends):
+        """Pairs of query intervals and overlapping intervals on a chromosome.
+
+        Returns the index of each query interval with the start and end of
+        each interval it overlaps, like `bedtools intersect -wa -wb`.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if chrom not in self._chroms:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        ostarts, oends = self._chroms[chrom]
+        a_idx, b_idx = _overlap_pairs(starts, ends, ostarts, oends)
+        return a_idx, ostarts[b_idx], oends[b_idx]
+
+def _merge_arrays(starts, ends, distance=0):
+    """Merge sorted intervals separated by at most distance bp.
+    """
+    if len(starts) == 0:
+        return starts, ends
+    max_ends = np.maximum.accumulate(ends)
+    new_group = np.concatenate([[True], starts[1:] - max_ends[:-1] > distance])
+    group_starts = np.flatnonzero(new_group)
+    group_ends = np.concatenate([group_starts[1:], [len(starts)]]) - 1
+    return starts[group_starts], max_ends[group_ends]
+
+def _gaps(starts, ends):
+    """Intervals between sorted, non-overlapping intervals, open at both ends.
+    """
+    gap_starts = np.concatenate([[0], ends])
+    gap_ends = np.concatenate([starts, [np.iinfo(np.int64).max]])
+    keep = gap_ends > gap_starts
+    return gap_starts[keep], gap_ends[keep]
+
+def _overlap_pairs(a_starts, a_ends, b_starts, b_ends):
+    """Indices of all pairs of overlapping a and b intervals.
+
+    b must be sorted by start. Candidate b intervals for each a are found
+    with binary searches on b starts and running maximum ends, then expanded
+    into index pairs with NumPy without a Python level loop.
+    """
+    if len(a_starts) == 0 or len(b_starts) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    max_ends = np.maximum.accumulate(b_ends)
+    lo = np.searchsorted(max_ends, a_starts, side="right")
+    hi = np.searchsorted(b_starts, a_ends, side="left")
+    counts = np.maximum(hi - lo, 0)
+    a_idx = np.repeat(np.arange(len(a_starts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    b_idx = np.repeat(lo, counts) + offsets
+    # with overlapping b intervals, skip candidates ending before the a start
+    keep = (b_ends[b_idx] > a_starts[a_idx]) & (b_starts[b_idx] < a_ends[a_idx])
+    return a_idx[keep], b_idx[keep]
@@ -9,8 +9,10 @@ import subprocess
 from bcbio.utils import tmpfile, file_exists
 from bcbio.distributed.transaction import file_transaction
 from bcbio.broad.picardrun import picard_rnaseq_metrics
+from bcbio import utils
+
+pysam = utils.LazyImport("pysam")
 
-import pysam
 
 class PicardMetricsParser(object):
     """Read metrics files produced by Picard analyses.
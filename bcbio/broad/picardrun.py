@@ -3,10 +3,12 @@
 import os
 import collections
 
-import pysam
 
 from bcbio.utils import file_exists
 from bcbio.distributed.transaction import file_transaction, tx_tmpdir
+from bcbio import utils
+
+pysam = utils.LazyImport("pysam")
 
 
 def picard_rnaseq_metrics(picard, align_bam, ref, ribo="null", out_file=None):
@@ -8,13 +8,15 @@ def to_parallel(args, module="bcbio.distributed"):
                                        getattr(args, "paralleltype", None),
                                        args.scheduler)
     local_controller = getattr(args, "local_controller", False)
+    reuse_cluster = getattr(args, "reuse_cluster", False)
     parallel = {"type": ptype, "cores": cores,
                 "scheduler": args.scheduler, "queue": args.queue,
                 "tag": args.tag, "module": module,
                 "resources": args.resources, "timeout": args.timeout,
                 "retries": args.retries,
                 "run_local": args.queue == "localrun",
-                "local_controller": local_controller}
+                "local_controller": local_controller,
+                "reuse_cluster": reuse_cluster}
     return parallel
 
 def _get_cores_and_type(numcores, paralleltype, scheduler):
@@ -9,10 +9,13 @@ Cluster implementation from ipython-cluster-helper:
 https://github.com/roryk/ipython-cluster-helper
 """
 import collections
+import hashlib
 import math
 import os
 import time
 
+from six.moves import cPickle as pickle
+
 try:
     import ipyparallel
     # msgpack not working with IPython 4.0 ipyparallel
@@ -100,27 +103,95 @@ def _get_ipython_fn(fn_name, parallel):
                               fromlist=["ipythontasks"]),
                    import_fn_name)
 
-def zip_args(args, config=None):
-    """Compress arguments using msgpack.
+# ## Deduplicated transport of shared subtrees
+
+# Large parts of the world dictionary which are identical across samples
+_SHARED_KEYS = ("config", "reference", "genome_resources")
+_SHARED_REF = "__bcbio_shared__"
+# digest -> (shared directory, pickled subtree), on both the controller and engines
+_SHARED_CACHE = {}
+
+def _to_shared_ref(val, shared_dir):
+    """Replace a subtree with a content addressed reference.
+
+    The controller writes new subtrees once to a shared directory. Engines only
+    reference subtrees they already know about, returning modified ones inline.
+    References are keyed on the pickled subtree, so values only match when
+    they unpickle to the same types and contents.
+    """
+    pickled = pickle.dumps(val, pickle.HIGHEST_PROTOCOL)
+    digest = hashlib.sha1(pickled).hexdigest()
+    if digest not in _SHARED_CACHE and not shared_dir:
+        return val
+    elif shared_dir and _SHARED_CACHE.get(digest, [None])[0] != shared_dir:
+        out_file = os.path.join(shared_dir, "%s.pickle" % digest)
+        if not os.path.exists(out_file):
+            tx_out_file = "%s.%s.tmp" % (out_file, os.getpid())
+            with open(tx_out_file, "wb") as out_handle:
+                out_handle.write(pickled)
+            os.rename(tx_out_file, out_file)
+        _SHARED_CACHE[digest] = (shared_dir, pickled)
+    return {_SHARED_REF: [_SHARED_CACHE[digest][0], digest]}
+
+def _from_shared_ref(ref):
+    """Retrieve a fresh copy of a shared subtree, reading it once per process.
     """
+    shared_dir, digest = ref
+    if digest not in _SHARED_CACHE:
+        with open(os.path.join(shared_dir, "%s.pickle" % digest), "rb") as in_handle:
+            _SHARED_CACHE[digest] = (shared_dir, in_handle.read())
+    return pickle.loads(_SHARED_CACHE[digest][1])
+
+def _is_shared_ref(val):
+    return isinstance(val, dict) and len(val) == 1 and _SHARED_REF in val
+
+def _walk_shared(x, convert, depth=0):
+    """Apply conversion to shared subtrees of world dictionaries within arguments.
+    """
+    if isinstance(x, dict):
+        if any(k in x for k in _SHARED_KEYS):
+            x = dict(x)
+            for k in _SHARED_KEYS:
+                if isinstance(x.get(k), dict):
+                    x[k] = convert(x[k])
+        return x
+    elif isinstance(x, (list, tuple)) and depth < 3:
+        return type(x)(_walk_shared(y, convert, depth + 1) for y in x)
+    else:
+        return x
+
+def share_args(args, shared_dir=None):
+    """Replace shared subtrees in arguments with references, to send them once per engine.
+    """
+    return _walk_shared(args, lambda v: v if _is_shared_ref(v) else _to_shared_ref(v, shared_dir))
+
+def unshare_args(args):
+    """Restore shared subtrees from references.
+    """
+    return _walk_shared(args, lambda v: _from_shared_ref(v[_SHARED_REF]) if _is_shared_ref(v) else v)
+
+def zip_args(args, config=None, shared_dir=None):
+    """Compress arguments using msgpack, sending shared subtrees by reference.
+    """
+    args = [share_args(x, shared_dir) for x in args]
     if msgpack:
         return [msgpack.packb(x, use_single_float=True, use_bin_type=True) for x in args]
     else:
         return args
 
 def unzip_args(args):
-    """Uncompress arguments using msgpack.
+    """Uncompress arguments using msgpack, restoring shared subtrees.
     """
     if msgpack:
-        return [msgpack.unpackb(x) for x in args]
-    else:
-        return args
+        args = [msgpack.unpackb(x) for x in args]
+    return [unshare_args(x) for x in args]
 
 def runner(view, parallel, dirs, config):
     """Run a task on an ipython parallel cluster, allowing alternative queue types.
 
     view provides map-style access to an existing Ipython cluster.
     """
+    shared_dir = utils.safe_makedir(os.path.join(dirs["work"], get_log_dir(config), "ipython", "shared"))
     def run(fn_name, items):
         out = []
         fn, fn_name = (fn_name, fn_name.__name__) if callable(fn_name) else (_get_ipython_fn(fn_name, parallel), fn_name)
@@ -132,7 +203,7 @@ def runner(view, parallel, dirs, config):
             if "wrapper" in parallel:
                 wrap_parallel = {k: v for k, v in parallel.items() if k in set(["fresources"])}
                 items = [[fn_name] + parallel.get("wrapper_args", []) + [wrap_parallel] + list(x) for x in items]
-            items = zip_args([args for args in items])
+            items = zip_args([args for args in items], shared_dir=shared_dir)
             for data in view.map_sync(fn, items, track=False):
                 if data:
                     out.extend(unzip_args(data))
@@ -1,31 +1,50 @@
 """Run tasks in parallel on a single machine using multiple cores.
 """
+import collections
+import contextlib
 import functools
+import heapq
+import itertools
+import os
+import traceback
 
-try:
-    import joblib
-except ImportError:
-    joblib = False
-
+from bcbio import utils
 from bcbio.distributed import resources
 from bcbio.log import logger, setup_local_logging
 from bcbio.pipeline import config_utils
 from bcbio.provenance import diagnostics, system
 
+joblib = utils.lazy_import_optional("joblib")
+
 def runner(parallel, config):
     """Run functions, provided by string name, on multiple cores on the current machine.
+
+    The returned function also provides a `stream` attribute which submits the
+    same work but returns (index, outputs) pairs as each item completes.
     """
-    def run_parallel(fn_name, items):
-        items = [x for x in items if x is not None]
-        if len(items) == 0:
-            return []
+    def _prep_parallel(fn_name, items):
         items = diagnostics.track_parallel(items, fn_name)
         fn, fn_name = (fn_name, fn_name.__name__) if callable(fn_name) else (get_fn(fn_name, parallel), fn_name)
         logger.info("multiprocessing: %s" % fn_name)
         if "wrapper" in parallel:
             wrap_parallel = {k: v for k, v in parallel.items() if k in set(["fresources", "checkpointed"])}
             items = [[fn_name] + parallel.get("wrapper_args", []) + [wrap_parallel] + list(x) for x in items]
+        return fn, items
+
+    def run_parallel(fn_name, items):
+        items = [x for x in items if x is not None]
+        if len(items) == 0:
+            return []
+        fn, items = _prep_parallel(fn_name, items)
         return run_multicore(fn, items, config, parallel=parallel)
+
+    def run_parallel_stream(fn_name, items, priority=0):
+        items = [x for x in items if x is not None]
+        if len(items) == 0:
+            return iter([])
+        fn, items = _prep_parallel(fn_name, items)
+        return run_multicore_stream(fn, items, config, parallel=parallel, priority=priority)
+    run_parallel.stream = run_parallel_stream
     return run_parallel
 
 def get_fn(fn_name, parallel):
@@ -67,11 +86,182 @@ def zeromq_aware_logging(f):
         return out
     return wrapper
 
-def run_multicore(fn, items, config, parallel=None):
-    """Run the function using multiple cores on the given items to process.
+class MulticoreError(Exception):
+    """Failure in a function run on a multicore worker, with the remote traceback.
     """
-    if len(items) == 0:
-        return []
+    pass
+
+def _run_indexed(args):
+    """Run a function in a worker, tagging output with the input index.
+
+    Exceptions are returned as formatted tracebacks since arbitrary exception
+    classes do not reliably pickle back to the parent process. Also returns
+    the worker process and program lookups made by the task, so the parent
+    can report lookups across workers.
+    """
+    fn, i, x = args
+    start = config_utils.get_program_cache_stats()
+    try:
+        ok, out = True, fn(x)
+    except Exception:
+        ok, out = False, traceback.format_exc()
+    end = config_utils.get_program_cache_stats()
+    return i, ok, out, os.getpid(), dict((k, end[k] - start[k]) for k in end)
+
+def _check_indexed(result):
+    i, ok, out, pid, prog_stats = result
+    if pid != os.getpid():
+        config_utils.add_program_cache_stats(prog_stats)
+    if not ok:
+        raise MulticoreError("Multicore task %s failed:\n%s" % (i, out))
+    return i, out
+
+class _Stream(object):
+    """Results for one submitted batch of items, collected as they complete.
+    """
+    # work runs in the background, rather than finishing before results are returned
+    incremental = True
+
+    def __init__(self, pool, count):
+        self._pool = pool
+        self.remaining = count
+        self.done = collections.deque()
+        self.aborted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self.done:
+            if self.aborted:
+                raise MulticoreError("Multicore tasks aborted after failure of another task")
+            if self.remaining == 0:
+                raise StopIteration
+            self._pool.wait()
+        self.remaining -= 1
+        return self.done.popleft()
+    next = __next__
+
+class WorkerPool(object):
+    """Long lived pool of worker processes shared across multicore stages.
+
+    Avoids re-spawning processes and re-importing bcbio for every call to
+    `run_multicore`. The pool is resized when a stage requests a different
+    number of concurrent jobs; cores and memory for each job are passed in the
+    item configuration so do not require new workers. Multiple streams can
+    share the pool concurrently as long as they request the same size.
+
+    Tasks are held in the parent and dispatched only when a worker is free,
+    highest priority first, so work submitted later with a higher priority
+    (like combining finished split files) runs ahead of queued lower priority
+    work.
+
+    Workers come from a loky process executor rather than a
+    `multiprocessing.Pool`, since pool workers are daemonic: nested
+    `run_multicore` calls inside a task would otherwise fall back to running
+    serially.
+    """
+
+    def __init__(self):
+        self._pid = os.getpid()
+        self._pool = None
+        self._num_jobs = None
+        self._queue = []
+        self._running = []
+        self._streams = set()
+        self._counter = itertools.count()
+        self.stats = {"created": 0, "reused": 0}
+
+    def usable(self, num_jobs):
+        """Only the creating process submits work, without resizing a busy pool.
+        """
+        busy = any(s.remaining > 0 for s in self._streams)
+        return (os.getpid() == self._pid and num_jobs > 1 and
+                (not busy or self._num_jobs == num_jobs))
+
+    def _resize(self, num_jobs):
+        if self._pool is not None and self._num_jobs == num_jobs:
+            self.stats["reused"] += 1
+            return self._pool
+        self.close()
+        if not joblib:
+            raise ImportError("Need joblib for multiprocessing parallelization")
+        from joblib.externals import loky
+        self._pool = loky.ProcessPoolExecutor(max_workers=num_jobs)
+        self._num_jobs = num_jobs
+        self.stats["created"] += 1
+        return self._pool
+
+    def submit(self, fn, items, num_jobs, priority=0):
+        """Queue fn on all items, returning (index, result) pairs as they complete.
+        """
+        self._resize(num_jobs)
+        self._streams = set(s for s in self._streams if s.remaining > 0)
+        stream = _Stream(self, len(items))
+        self._streams.add(stream)
+        for i, x in enumerate(items):
+            heapq.heappush(self._queue, (-priority, next(self._counter), stream, (fn, i, x)))
+        self._dispatch()
+        return stream
+
+    def _dispatch(self):
+        while self._queue and len(self._running) < self._num_jobs:
+            _, _, stream, task = heapq.heappop(self._queue)
+            self._running.append((self._pool.submit(_run_indexed, task), stream))
+
+    def wait(self):
+        """Wait for at least one running task to finish, then refill free workers.
+        """
+        try:
+            from joblib.externals import loky
+            loky.wait([result for result, _ in self._running], return_when=loky.FIRST_COMPLETED)
+            finished = [x for x in self._running if x[0].done()]
+            for result, stream in finished:
+                self._running.remove((result, stream))
+                stream.done.append(_check_indexed(result.result()))
+            self._dispatch()
+        except:
+            self.close(terminate=True)
+            raise
+
+    def close(self, terminate=False):
+        if self._pool is not None:
+            try:
+                self._pool.shutdown(wait=True, kill_workers=terminate)
+            finally:
+                self._pool = None
+                self._num_jobs = None
+                self._queue = []
+                self._running = []
+                for stream in self._streams:
+                    if stream.remaining > len(stream.done):
+                        stream.aborted = True
+                self._streams = set()
+
+_POOL = None
+
+@contextlib.contextmanager
+def worker_pool():
+    """Provide a persistent worker pool for all `run_multicore` calls in this context.
+    """
+    global _POOL
+    if _POOL is not None:
+        yield _POOL
+    else:
+        _POOL = WorkerPool()
+        try:
+            yield _POOL
+        finally:
+            pool, _POOL = _POOL, None
+            logger.debug("Multicore worker pools created: %s, reused: %s" %
+                         (pool.stats["created"], pool.stats["reused"]))
+            pool.close()
+
+def _active_pool(num_jobs):
+    if _POOL is not None and _POOL.usable(num_jobs):
+        return _POOL
+
+def _prepare_multicore(items, config, parallel):
     if parallel is None or "num_jobs" not in parallel:
         if parallel is None:
             parallel = {"type": "local", "cores": config["algorithm"].get("num_cores", 1)}
@@ -80,10 +270,37 @@ def run_multicore(fn, items, config, parallel=None):
                                        parallel.get("multiplier", 1),
                                        max_multicore=int(parallel.get("max_multicore", sysinfo["cores"])))
     items = [config_utils.add_cores_to_config(x, parallel["cores_per_job"]) for x in items]
-    if joblib is None:
-        raise ImportError("Need joblib for multiprocessing parallelization")
+    return items, parallel
+
+def run_multicore_stream(fn, items, config, parallel=None, priority=0):
+    """Run the function using multiple cores, returning results as they complete.
+
+    Returns an iterator of (index, output) tuples where index is the position
+    of the input item, allowing callers to restore the original order when
+    needed. Work is submitted on call; with a persistent worker pool, queued
+    items with a higher priority are started first. Without a persistent
+    worker pool this runs all items before returning, in order.
+    """
+    if len(items) == 0:
+        return iter([])
+    items, parallel = _prepare_multicore(items, config, parallel)
+    pool = _active_pool(parallel["num_jobs"])
+    if pool:
+        return pool.submit(fn, items, parallel["num_jobs"], priority)
+    else:
+        if not joblib:
+            raise ImportError("Need joblib for multiprocessing parallelization")
+        return [_check_indexed(x) for x in
+                joblib.Parallel(parallel["num_jobs"], batch_size=1)(joblib.delayed(_run_indexed)((fn, i, x))
+                                                                    for i, x in enumerate(items))]
+
+def run_multicore(fn, items, config, parallel=None):
+    """Run the function using multiple cores on the given items to process.
+
+    Uses the persistent worker pool from `worker_pool` when available.
+    """
     out = []
-    for data in joblib.Parallel(parallel["num_jobs"], batch_size=1)(joblib.delayed(fn)(x) for x in items):
+    for _, data in sorted(run_multicore_stream(fn, items, config, parallel), key=lambda x: x[0]):
         if data:
             out.extend(data)
     return out
@@ -6,10 +6,12 @@ Amazon Web Services S3.
 
 import abc
 import collections
+from multiprocessing.pool import ThreadPool
 import os
 import re
 import subprocess
 import sys
+import threading
 import time
 import zlib
 
@@ -29,6 +31,153 @@ else:
     BIGNUM = sys.maxint
 
 
+# Default size and number of concurrent requests for ranged downloads
+DL_PART_SIZE = 16 * 1024 * 1024
+DL_CONCURRENCY = 8
+
+
+class RangeDownloader(object):
+
+    """Parallel download of byte ranges of a remote object.
+
+    Shared by the storage managers, which provide the object size and a
+    function retrieving an inclusive byte range. The fetch function is called
+    from multiple threads, so needs to use thread specific connections.
+    """
+
+    def __init__(self, size, fetch, part_size=DL_PART_SIZE,
+                 concurrency=DL_CONCURRENCY, retries=3, retry_wait=1):
+        self.size = int(size)
+        self._fetch = fetch
+        self.part_size = part_size
+        self.concurrency = max(1, concurrency)
+        self._retries = retries
+        self._retry_wait = retry_wait
+
+    def parts(self):
+        """Inclusive byte ranges for each part of the object."""
+        return [(start, min(start + self.part_size, self.size) - 1)
+                for start in range(0, self.size, self.part_size)]
+
+    def _fetch_part(self, part):
+        start, end = part
+        retries = self._retries
+        while True:
+            try:
+                data = self._fetch(start, end)
+                if len(data) != end - start + 1:
+                    raise IOError("Incomplete range %s-%s: %s bytes" % (start, end, len(data)))
+                return data
+            except Exception:
+                if retries > 0:
+                    retries -= 1
+                    time.sleep(self._retry_wait)
+                else:
+                    raise
+
+    def iter_parts(self, prefetch=None):
+        """Iterate over object contents in order, reading ahead concurrently."""
+        prefetch = prefetch or self.concurrency
+        pool = ThreadPool(self.concurrency)
+        pending = collections.deque()
+        parts = iter(self.parts())
+        try:
+            for part in parts:
+                pending.append(pool.apply_async(self._fetch_part, (part,)))
+                if len(pending) >= prefetch:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.terminate()
+
+    def to_file(self, out_file):
+        """Download to a file, resuming previous partial downloads.
+
+        Writes to a partial file, recording finished parts so an interrupted
+        download only retrieves missing parts, then moves into place.
+        """
+        partial_file = out_file + ".partial"
+        progress_file = partial_file + ".parts"
+        parts = self.parts()
+        done = set()
+        if os.path.exists(partial_file) and os.path.exists(progress_file):
+            with open(progress_file) as in_handle:
+                done = set(int(x) for x in in_handle if x.strip())
+        else:
+            utils.remove_safe(progress_file)
+            with open(partial_file, "wb"):
+                pass
+        todo = [i for i in range(len(parts)) if i not in done]
+        pool = ThreadPool(self.concurrency)
+        try:
+            with open(partial_file, "r+b") as out_handle:
+                out_handle.truncate(self.size)
+                with open(progress_file, "a") as progress_handle:
+                    fetched = pool.imap_unordered(lambda i: (i, self._fetch_part(parts[i])), todo)
+                    for i, data in fetched:
+                        out_handle.seek(parts[i][0])
+                        out_handle.write(data)
+                        out_handle.flush()
+                        progress_handle.write("%s\n" % i)
+                        progress_handle.flush()
+        finally:
+            pool.terminate()
+        os.rename(partial_file, out_file)
+        utils.remove_safe(progress_file)
+        return out_file
+
+
+def _thread_fetch(connect, fetch_range):
+    """Provide a range fetch function using a separate connection in each thread.
+
+    connect -- function creating a new connection
+    fetch_range -- function retrieving an inclusive range given (connection, start, end)
+    """
+    local = threading.local()
+
+    def fetch(start, end):
+        if not hasattr(local, "connection"):
+            local.connection = connect()
+        return fetch_range(local.connection, start, end)
+    return fetch
+
+
+class _RangeReader(object):
+
+    """File-like reads over in-order chunks from a ranged download."""
+
+    def __init__(self, downloader):
+        self._chunks = downloader.iter_parts()
+        self._buf = b""
+
+    def chunks(self):
+        if self._buf:
+            buf, self._buf = self._buf, b""
+            yield buf
+        for chunk in self._chunks:
+            yield chunk
+
+    def read(self, size=BIGNUM):
+        out = [self._buf]
+        have = len(self._buf)
+        while have < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            out.append(chunk)
+            have += len(chunk)
+        data = b"".join(out)
+        if have > size:
+            data, self._buf = data[:int(size)], data[int(size):]
+        else:
+            self._buf = b""
+        return data
+
+    def close(self):
+        self._chunks.close()
+
+
 @six.add_metaclass(abc.ABCMeta)
 class FileHandle(object):
 
@@ -106,9 +255,12 @@ class FileHandle(object):
 
 class S3Handle(FileHandle):
 
-    """File object for the Amazon S3 files."""
+    """File object for the Amazon S3 files.
 
-    def __init__(self, key):
+    Provide a connect function to read ahead using concurrent ranged requests.
+    """
+
+    def __init__(self, key, connect=None):
         super(S3Handle, self).__init__()
         self._key = key
         if self._key.name.endswith(".gz"):
@@ -116,16 +268,27 @@ class S3Handle(FileHandle):
             self._decompress = decompress.decompress
         else:
             self._decompress = lambda value: value
+        if connect and key.size:
+            bucket_name, key_name = key.bucket.name, key.name
+
+            def fetch_range(connection, start, end):
+                cur_key = connection.get_bucket(bucket_name, validate=False).get_key(key_name, validate=False)
+                return cur_key.get_contents_as_string(headers={"Range": "bytes=%s-%s" % (start, end)})
+            self._reader = _RangeReader(RangeDownloader(key.size, _thread_fetch(connect, fetch_range)))
+        else:
+            self._reader = None
 
     def _chunk_iter(self):
         """Iterator over the S3 file."""
-        for chunk in self._key:
+        for chunk in (self._reader.chunks() if self._reader else self._key):
             yield self._decompress(chunk)
 
     def read(self, size=BIGNUM):
         """Read at most size bytes from the file (less if the read hits EOF
         before obtaining size bytes).
         """
+        if self._reader:
+            return self._reader.read(size)
         return self._key.read(size)
 
     def next(self):
@@ -134,14 +297,19 @@ class S3Handle(FileHandle):
 
     def close(self):
         """Close the file handle."""
+        if self._reader:
+            self._reader.close()
         self._key.close(fast=True)
 
 
 class BlobHandle(FileHandle):
 
-    """File object for the Azure Blob files."""
+    """File object for the Azure Blob files.
 
-    def __init__(self, blob_service, container, blob, chunk_size):
+    Provide a connect function to read ahead using concurrent ranged requests.
+    """
+
+    def __init__(self, blob_service, container, blob, chunk_size, connect=None):
         super(BlobHandle, self).__init__()
         self._blob_service = blob_service
         self._container_name = container
@@ -149,6 +317,8 @@ class BlobHandle(FileHandle):
         self._chunk_size = chunk_size
         self._blob_properties = {}
         self._pointer = 0
+        self._connect = connect
+        self._reader = None
 
         if blob.endswith(".gz"):
             decompress = zlib.decompressobj(16 | zlib.MAX_WBITS)
@@ -167,19 +337,37 @@ class BlobHandle(FileHandle):
                 blob_name=self._blob_name)
         return self._blob_properties
 
+    def _range_reader(self):
+        """Concurrent read ahead of blob chunks, if we can make new connections."""
+        if self._reader is None and self._connect:
+            container, blob = self._container_name, self._blob_name
+
+            def fetch_range(blob_service, start, end):
+                return blob_service.get_blob(container_name=container, blob_name=blob,
+                                             x_ms_range="bytes={0}-{1}".format(start, end))
+            self._reader = _RangeReader(RangeDownloader(
+                int(self.blob_properties.get('content-length')),
+                _thread_fetch(self._connect, fetch_range), part_size=self._chunk_size))
+        return self._reader
+
     def _chunk_offsets(self):
         """Iterator over chunk offests."""
         index = 0
-        blob_size = self.blob_properties.get('content-length')
+        blob_size = int(self.blob_properties.get('content-length'))
         while index < blob_size:
             yield index
             index = index + self._chunk_size
 
     def _chunk_iter(self):
         """Iterator over the blob file."""
-        for chunk_offset in self._chunk_offsets():
-            yield self._download_chunk(chunk_offset=chunk_offset,
-                                       chunk_size=self._chunk_size)
+        reader = self._range_reader()
+        if reader:
+            for chunk in reader.chunks():
+                yield self._decompress(chunk)
+        else:
+            for chunk_offset in self._chunk_offsets():
+                yield self._decompress(self._download_chunk_with_retries(
+                    chunk_offset=chunk_offset, chunk_size=self._chunk_size))
 
     def _download_chunk_with_retries(self, chunk_offset, chunk_size,
                                      retries=3, retry_wait=1):
@@ -211,6 +399,9 @@ class BlobHandle(FileHandle):
         """Read at most size bytes from the file (less if the read hits EOF
         before obtaining size bytes).
         """
+        reader = self._range_reader()
+        if reader:
+            return reader.read(size)
         blob_size = int(self.blob_properties.get('content-length'))
         if self._pointer < blob_size:
             chunk = self._download_chunk_with_retries(
@@ -224,7 +415,8 @@ class BlobHandle(FileHandle):
 
     def close(self):
         """Close the file handle."""
-        pass
+        if self._reader:
+            self._reader.close()
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -456,7 +648,7 @@ class AmazonS3(StorageManager):
         s3_key = s3_bucket.get_key(file_info.key)
         if s3_key is None:
             raise ValueError("Did not find S3 key: %s" % filename)
-        return S3Handle(s3_key)
+        return S3Handle(s3_key, connect=lambda: cls.connect(filename))
 
 
 class AzureBlob(StorageManager):
@@ -511,12 +703,17 @@ class AzureBlob(StorageManager):
         out_file = os.path.join(dl_dir, os.path.basename(file_info.blob))
 
         if not utils.file_exists(out_file):
-            with file_transaction({}, out_file) as tx_out_file:
-                blob_service = cls.connect(filename)
-                blob_service.get_blob_to_path(
-                    container_name=file_info.container,
-                    blob_name=file_info.blob,
-                    file_path=tx_out_file)
+            blob_service = cls.connect(filename)
+            properties = blob_service.get_blob_properties(
+                container_name=file_info.container,
+                blob_name=file_info.blob)
+
+            def fetch_range(cur_service, start, end):
+                return cur_service.get_blob(container_name=file_info.container,
+                                            blob_name=file_info.blob,
+                                            x_ms_range="bytes={0}-{1}".format(start, end))
+            RangeDownloader(int(properties.get('content-length')),
+                            _thread_fetch(lambda: cls.connect(filename), fetch_range)).to_file(out_file)
         return out_file
 
     @classmethod
@@ -548,7 +745,8 @@ class AzureBlob(StorageManager):
         return BlobHandle(blob_service=blob_service,
                           container=file_info.container,
                           blob=file_info.blob,
-                          chunk_size=cls._BLOB_CHUNK_DATA_SIZE)
+                          chunk_size=cls._BLOB_CHUNK_DATA_SIZE,
+                          connect=lambda: cls.connect(filename))
 
 class ArvadosKeep:
     """Files stored in Arvados Keep. Partial implementation, integration in bcbio-vm.
@@ -2,6 +2,7 @@
 """
 import contextlib
 import os
+import time
 
 from bcbio import utils
 from bcbio.log import logger
@@ -50,6 +51,11 @@ def start(parallel, items, config, dirs=None, name=None, multiplier=1,
                 parallel["num_jobs"] = 1
                 parallel["checkpointed"] = True
                 yield multi.runner(parallel, config)
+            elif _CLUSTERS is not None and _CLUSTERS.available():
+                from bcbio.distributed import ipython
+                view = _CLUSTERS.acquire(parallel, dirs, config, name)
+                yield ipython.runner(view, parallel, dirs, config)
+                _CLUSTERS.release()
             else:
                 from bcbio.distributed import ipython
                 with ipython.create(parallel, dirs, config) as view:
@@ -58,8 +64,11 @@ def start(parallel, items, config, dirs=None, name=None, multiplier=1,
             yield multi.runner(parallel, config)
     except:
         if view is not None:
-            from bcbio.distributed import ipython
-            ipython.stop(view)
+            if _CLUSTERS is not None and _CLUSTERS.owns(view):
+                _CLUSTERS.discard()
+            else:
+                from bcbio.distributed import ipython
+                ipython.stop(view)
         raise
     else:
         for x in ["cores_per_job", "num_jobs", "mem"]:
@@ -67,3 +76,133 @@ def start(parallel, items, config, dirs=None, name=None, multiplier=1,
         if checkpoint_file:
             with open(checkpoint_file, "w") as out_handle:
                 out_handle.write("done\n")
+
+# ## Cluster re-use across stages
+
+_CLUSTERS = None
+# Re-use a running cluster unless a stage needs more than this factor of its
+# cores, or it would leave more than this fraction of cores idle
+GROW_FACTOR = 2.0
+SHRINK_FACTOR = 4.0
+
+@contextlib.contextmanager
+def reuse_clusters(parallel):
+    """Keep IPython clusters running across pipeline stages with compatible resources.
+
+    Enabled with `reuse_cluster` in the parallel configuration; otherwise each
+    stage starts and stops its own cluster.
+    """
+    global _CLUSTERS
+    if _CLUSTERS is not None or parallel.get("type") != "ipython" or not parallel.get("reuse_cluster"):
+        yield None
+    else:
+        _CLUSTERS = ClusterManager()
+        try:
+            yield _CLUSTERS
+        finally:
+            _CLUSTERS.close()
+            _CLUSTERS = None
+
+class ClusterManager(object):
+    """Run stages on a single long running IPython cluster, restarting only on resource changes.
+
+    Stages needing no more cores or memory per engine than a running cluster
+    re-use it, running each job on a whole engine. Stages needing many more or far
+    fewer total cores resize by restarting the cluster. Tracks time spent
+    waiting for clusters to start and engine time left idle between stages.
+    """
+    def __init__(self):
+        self._cluster = None
+        self._in_use = False
+        self.stages = []
+
+    def available(self):
+        return not self._in_use
+
+    def owns(self, view):
+        return self._cluster is not None and self._cluster["view"] is view
+
+    def acquire(self, parallel, dirs, config, name=None):
+        """Retrieve a view for running a stage, updating parallel to match the engines used.
+        """
+        stage = {"name": name or "stage %s" % (len(self.stages) + 1), "wait": 0.0, "idle": 0.0,
+                 "reused": False}
+        if self._cluster and self._fits(self._cluster, parallel):
+            stage["reused"] = True
+            stage["idle"] = self._idle_time()
+            # engines run one task at a time, so give each task a whole engine
+            for k in ["num_jobs", "cores_per_job", "mem"]:
+                parallel[k] = self._cluster["parallel"][k]
+        else:
+            self.stop()
+            from bcbio.distributed import ipython
+            key = _cluster_key(parallel)
+            start = time.time()
+            cluster = ipython.create(parallel, dirs, config)
+            view = cluster.__enter__()
+            stage["wait"] = time.time() - start
+            self._cluster = {"cluster": cluster, "view": view, "key": key, "released": None,
+                             "parallel": {k: parallel[k] for k in ["num_jobs", "cores_per_job", "mem"]}}
+        stage["engines"] = self._cluster["parallel"]["num_jobs"]
+        self.stages.append(stage)
+        self._in_use = True
+        return self._cluster["view"]
+
+    def release(self):
+        self._in_use = False
+        if self._cluster:
+            self._cluster["released"] = time.time()
+
+    def discard(self):
+        """Stop a cluster after failures, since engines may be in an inconsistent state.
+        """
+        self._in_use = False
+        if self._cluster:
+            cluster, self._cluster = self._cluster["cluster"], None
+            try:
+                cluster.__exit__(None, None, None)
+            except:
+                logger.exception("Did not stop IPython cluster correctly")
+
+    def stop(self):
+        if self._cluster:
+            if self.stages:
+                self.stages[-1]["idle"] += self._idle_time()
+            self._cluster["cluster"].__exit__(None, None, None)
+            self._cluster = None
+
+    def close(self):
+        self.stop()
+        self.report()
+
+    def report(self):
+        if self.stages:
+            logger.info("Cluster usage by stage: queue wait and idle engine time (engine hours)")
+            for stage in self.stages:
+                logger.info("  %s: %s engines%s, queue wait %.1f minutes, idle %.2f engine hours" %
+                            (stage["name"], stage["engines"], " (reused)" if stage["reused"] else "",
+                             stage["wait"] / 60.0, stage["idle"] / 3600.0))
+
+    def _idle_time(self):
+        """Engine seconds spent idle since the last stage finished.
+        """
+        if self._cluster and self._cluster["released"]:
+            return (time.time() - self._cluster["released"]) * self._cluster["parallel"]["num_jobs"]
+        return 0.0
+
+    def _fits(self, cluster, parallel):
+        cur = cluster["parallel"]
+        if cluster["key"] != _cluster_key(parallel):
+            return False
+        if cur["cores_per_job"] < parallel["cores_per_job"] or float(cur["mem"]) < float(parallel["mem"]):
+            return False
+        need_cores = parallel["num_jobs"] * parallel["cores_per_job"]
+        have_cores = cur["num_jobs"] * cur["cores_per_job"]
+        return need_cores <= have_cores * GROW_FACTOR and need_cores * SHRINK_FACTOR >= have_cores
+
+def _cluster_key(parallel):
+    """Scheduler settings which need to match to re-use a cluster.
+    """
+    return (parallel.get("scheduler"), parallel.get("queue"), parallel.get("tag"),
+            tuple(sorted(x for x in parallel.get("resources", []) if not x.startswith("mincores="))),
+            parallel.get("run_local"), parallel.get("local_controller"))
@@ -12,6 +12,9 @@ import collections
 
 from bcbio import utils
 
+# Combine steps jump ahead of queued split work when using a streaming runner
+COMBINE_PRIORITY = 10
+
 def grouped_parallel_split_combine(args, split_fn, group_fn, parallel_fn,
                                    parallel_name, combine_name,
                                    file_key, combine_arg_keys,
@@ -29,6 +32,10 @@ def grouped_parallel_split_combine(args, split_fn, group_fn, parallel_fn,
     grouped_args = group_fn(args)
     split_args, combine_map, finished_out, extras = _get_split_tasks(grouped_args, split_fn, file_key,
                                                                      split_outfile_i)
+    if hasattr(parallel_fn, "stream"):
+        final_args = _stream_split_combine(split_args, combine_map, parallel_fn, parallel_name,
+                                           combine_name, file_key, combine_arg_keys)
+        return finished_out + final_args + extras
     final_output = parallel_fn(parallel_name, split_args)
     combine_args, final_args = _organize_output(final_output, combine_map,
                                                 file_key, combine_arg_keys)
@@ -56,6 +63,10 @@ def parallel_split_combine(args, split_fn, parallel_fn,
     args = [x[0] for x in args]
     split_args, combine_map, finished_out, extras = _get_split_tasks(args, split_fn, file_key,
                                                                      split_outfile_i)
+    if isinstance(combiner, basestring) and hasattr(parallel_fn, "stream"):
+        final_args = _stream_split_combine(split_args, combine_map, parallel_fn, parallel_name,
+                                           combiner, file_key, combine_arg_keys)
+        return finished_out + final_args + extras
     split_output = parallel_fn(parallel_name, split_args)
     if isinstance(combiner, basestring):
         combine_args, final_args = _organize_output(split_output, combine_map,
@@ -65,6 +76,68 @@ def parallel_split_combine(args, split_fn, parallel_fn,
         final_args = combiner(split_output, combine_map, file_key)
     return finished_out + final_args + extras
 
+def _stream_split_combine(split_args, combine_map, parallel_fn, parallel_name,
+                          combiner, file_key, combine_arg_keys):
+    """Run split tasks, starting the combine for each file once all its parts finish.
+
+    Consumes split outputs as they complete from a streaming parallel function,
+    so finished files get combined while slower parts are still running.
+    Combines are submitted at a higher priority than the remaining split tasks,
+    so merging the first sample overlaps with splitting work for later ones.
+    When the runner finishes all split work before returning results, combines
+    are instead submitted together as a single parallel batch.
+    Returns final arguments in the same order as a non-streaming run.
+    """
+    parts_by_final = collections.defaultdict(set)
+    for part_file, final_file in combine_map.items():
+        parts_by_final[final_file].add(part_file)
+    seen_by_final = collections.defaultdict(set)
+    outputs_by_final = collections.defaultdict(list)
+    combined = set([])
+    extras = []
+    final_args = {}
+    combine_args = []
+    combines = []
+
+    def _combine_final(final_file):
+        combined.add(final_file)
+        outputs = sorted(outputs_by_final.pop(final_file), key=lambda x: x[0])
+        cur_combine_args, cur_final_args = _organize_output([d for _, d in outputs], combine_map,
+                                                            file_key, combine_arg_keys)
+        final_args[final_file] = (outputs[0][0], cur_final_args[0])
+        extras.extend(zip([k for k, _ in outputs[1:]], cur_final_args[1:]))
+        if incremental:
+            combines.append(parallel_fn.stream(combiner, cur_combine_args, priority=COMBINE_PRIORITY))
+        else:
+            combine_args.extend(cur_combine_args)
+
+    split_output = parallel_fn.stream(parallel_name, split_args)
+    incremental = getattr(split_output, "incremental", False)
+    for i, output in split_output:
+        finished = []
+        for j, data in enumerate(output):
+            cur_file = data.get(file_key)
+            if not cur_file:
+                extras.append(((i, j), [data]))
+            else:
+                final_file = combine_map[cur_file]
+                outputs_by_final[final_file].append(((i, j), data))
+                seen_by_final[final_file].add(cur_file)
+                finished.append(final_file)
+        # check after recording all outputs for this part, which may return multiple items
+        for final_file in finished:
+            if final_file not in combined and seen_by_final[final_file] >= parts_by_final[final_file]:
+                _combine_final(final_file)
+    for final_file in [x for x in outputs_by_final.keys() if x not in combined]:
+        _combine_final(final_file)
+    if combine_args:
+        combines.append(parallel_fn.stream(combiner, combine_args, priority=COMBINE_PRIORITY))
+    for combine in combines:
+        for _ in combine:
+            pass
+    return ([x for _, x in sorted(final_args.values(), key=lambda x: x[0])] +
+            [x for _, x in sorted(extras, key=lambda x: x[0])])
+
 def _get_extra_args(extra_args, arg_keys):
     """Retrieve extra arguments to pass along to combine function.
 
@@ -6,14 +6,18 @@ This ensures output files will be complete independent of method of
 interruption.
 """
 import contextlib
+import errno
 import os
 import shutil
+import socket
 import tempfile
+import time
 
 import toolz as tz
 
 from bcbio import utils
 from bcbio.log import logger
+from bcbio.provenance import diagnostics
 
 
 DEFAULT_TMP = 'bcbiotx'
@@ -58,7 +62,11 @@ def file_transaction(*data_and_files):
     The initial argument can be the world descriptive `data` dictionary, or
     a `config` dictionary. This is used to identify global settings for
     temporary directories to create transactional files in.
+
+    Transactional files go on the same filesystem as their final location
+    when possible, so finishing is a rename instead of a copy.
     """
+    data, _ = _normalize_args(data_and_files)
     with _flatten_plus_safe(data_and_files) as (safe_names, orig_names):
         # remove any half-finished transactions
         map(utils.remove_safe, safe_names)
@@ -72,10 +80,10 @@ def file_transaction(*data_and_files):
 
         for safe, orig in zip(safe_names, orig_names):
             if os.path.exists(safe):
-                _move_tmp_files(safe, orig)
+                _move_tmp_files(safe, orig, data)
 
 
-def _move_tmp_files(safe, orig):
+def _move_tmp_files(safe, orig, data=None):
     exts = {
         ".vcf": ".idx",
         ".bam": ".bai",
@@ -89,26 +97,45 @@ def _move_tmp_files(safe, orig):
     if os.path.isdir(orig) and os.path.isdir(safe):
         utils.remove_safe(orig)
 
-    _move_file_with_sizecheck(safe, orig)
+    _move_file_with_sizecheck(safe, orig, data)
     # Move additional, associated files in the same manner
     for check_ext, check_idx in exts.items():
         if not safe.endswith(check_ext):
             continue
         safe_idx = safe + check_idx
         if os.path.exists(safe_idx):
-            _move_file_with_sizecheck(safe_idx, orig + check_idx)
+            _move_file_with_sizecheck(safe_idx, orig + check_idx, data)
 
 
-def _move_file_with_sizecheck(tx_file, final_file):
+def _move_file_with_sizecheck(tx_file, final_file, data=None):
     """Move transaction file to final location,
        with size checks avoiding failed transfers.
 
+       Renames files on the same filesystem and copies single files across
+       filesystems with a size check. Directories and other cases use
+       shutil.move with size checks.
+
        Creates an empty file with '.bcbiotmp' extention in the destination
        location, which serves as a flag. If a file like that is present,
        it means that transaction didn't finish successfully.
     """
 
     #logger.debug("Moving %s to %s" % (tx_file, final_file))
+    start = time.time()
+    if _same_filesystem(tx_file, os.path.dirname(os.path.abspath(final_file))):
+        size = os.path.getsize(tx_file) if not os.path.isdir(tx_file) else None
+        try:
+            os.rename(tx_file, final_file)
+            diagnostics.record_commit(data, final_file, size, time.time() - start, "rename")
+            return
+        # bind mounts and some network filesystems share a device but not renames
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    if not os.path.isdir(tx_file) and os.path.exists(tx_file):
+        size = _copy_with_sizecheck(tx_file, final_file)
+        diagnostics.record_commit(data, final_file, size, time.time() - start, "copy")
+        return
 
     tmp_file = final_file + ".bcbiotmp"
     open(tmp_file, 'wb').close()
@@ -125,6 +152,42 @@ def _move_file_with_sizecheck(tx_file, final_file):
             tx_file, want_size, final_file, transfer_size)
     )
     utils.remove_safe(tmp_file)
+    diagnostics.record_commit(data, final_file, transfer_size, time.time() - start, "move")
+
+
+def _same_filesystem(path, other):
+    """Check if two existing paths are on the same filesystem.
+    """
+    try:
+        return os.stat(path).st_dev == os.stat(other).st_dev
+    except OSError:
+        return False
+
+
+def _copy_with_sizecheck(tx_file, final_file, chunk_size=16 * 1024 * 1024):
+    """Stream a file to another filesystem, checking the size of the synced copy.
+
+    Copies into the '.bcbiotmp' flag file, renaming into place once the
+    copy is flushed to disk with the expected size. Returns the number of
+    bytes copied.
+    """
+    tmp_file = final_file + ".bcbiotmp"
+    want_size = os.path.getsize(tx_file)
+    with open(tx_file, 'rb') as in_handle:
+        with open(tmp_file, 'wb') as out_handle:
+            shutil.copyfileobj(in_handle, out_handle, chunk_size)
+            out_handle.flush()
+            os.fsync(out_handle.fileno())
+            transfer_size = os.fstat(out_handle.fileno()).st_size
+    assert want_size == transfer_size, (
+        'distributed.transaction.file_transaction: File copy error: '
+        'file on temporary storage ({}) size {} bytes does not equal size '
+        'after transfer to {} size {} bytes'.format(
+            tx_file, want_size, final_file, transfer_size))
+    shutil.copystat(tx_file, tmp_file)
+    os.rename(tmp_file, final_file)
+    utils.remove_safe(tx_file)
+    return transfer_size
 
 
 @contextlib.contextmanager
@@ -133,9 +196,61 @@ def _flatten_plus_safe(data_and_files):
     """
     data, rollback_files = _normalize_args(data_and_files)
     with tx_tmpdir(data) as tmpdir:
-        tx_files = [os.path.join(tmpdir, os.path.basename(f))
-                    for f in rollback_files]
-        yield tx_files, rollback_files
+        tx_files = []
+        local_tmpdirs = []
+        for f in rollback_files:
+            cur_tmpdir = tmpdir
+            local_tmpdir = _local_tmpdir(tmpdir, os.path.dirname(os.path.abspath(f)), data)
+            if local_tmpdir:
+                local_tmpdirs.append(local_tmpdir)
+                cur_tmpdir = local_tmpdir
+            tx_files.append(os.path.join(cur_tmpdir, os.path.basename(f)))
+        try:
+            yield tx_files, rollback_files
+        finally:
+            for local_tmpdir in local_tmpdirs:
+                utils.remove_safe(local_tmpdir)
+
+
+def _local_tmpdir(tmpdir, out_dir, data=None):
+    """Create a transactional directory on the same filesystem as an output.
+
+    Prefers the work directory's bcbiotx directory, falling back to a hidden
+    directory next to the output. Returns None if the temporary directory is
+    on the same filesystem as the output or we cannot write to the output
+    directory.
+    """
+    if (os.path.isdir(out_dir) and os.access(out_dir, os.W_OK) and
+          not _same_filesystem(tmpdir, out_dir) and os.path.exists(tmpdir)):
+        work_dir = tz.get_in(["dirs", "work"], data) or os.getcwd()
+        work_tmpdir = os.path.join(work_dir, DEFAULT_TMP)
+        if _same_filesystem(work_dir, out_dir) and os.access(work_dir, os.W_OK):
+            return tempfile.mkdtemp(dir=utils.safe_makedir(work_tmpdir))
+        _remove_stale_local_tmpdirs(out_dir)
+        return tempfile.mkdtemp(dir=out_dir, prefix="%s%s-" % (_local_tmpdir_prefix(), os.getpid()))
+
+
+def _local_tmpdir_prefix():
+    return ".%s-%s-" % (DEFAULT_TMP, socket.gethostname())
+
+
+def _remove_stale_local_tmpdirs(out_dir):
+    """Remove hidden transactional directories left by exited processes on this host.
+    """
+    prefix = _local_tmpdir_prefix()
+    for fname in os.listdir(out_dir):
+        if fname.startswith(prefix):
+            pid = fname[len(prefix):].split("-")[0]
+            if pid.isdigit() and not _pid_running(int(pid)):
+                utils.remove_safe(os.path.join(out_dir, fname))
+
+
+def _pid_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
 
 
 def _normalize_args(data_and_files):
@@ -9,7 +9,6 @@ import operator
 import os
 import subprocess
 
-import joblib
 import yaml
 
 from bcbio import utils
@@ -19,6 +18,8 @@ from bcbio.illumina import flowcell
 from bcbio.pipeline.run_info import clean_name
 from bcbio.workflow import template
 
+joblib = utils.LazyImport("joblib")
+
 def prep_samples_and_config(run_folder, ldetails, fastq_dir, config):
     """Prepare sample fastq files and provide global sample configuration for the flowcell.
 
@@ -3,11 +3,41 @@ import glob
 import gzip
 import math
 import os.path
-import re
+from bcbio import utils
+from bcbio.log import logger
+
+np = utils.LazyImport("numpy")
+pd = utils.LazyImport("pandas")
+joblib = utils.lazy_import_optional("joblib")
+
+
+CPU_FIELDS = ['user', 'nice', 'sys', 'idle', 'wait', 'irq', 'soft', 'steal']
+DISK_FIELDS = ['num_reads', 'reads_merged',
+               'sectors_read', 'msec_spent_reading',
+               'num_writes', 'writes_merged',
+               'sectors_written', 'msec_spent_writing',
+               'iops_in_progress', 'msec_spent_on_iops',
+               'weighted_msec_spent_on_iops']
+NET_FIELDS = ['rbyte', 'rpkt', 'rerr', 'rdrop',
+              'rfifo', 'rframe', 'rcomp', 'rmulti',
+              'tbyte', 'tpkt', 'terr', 'tdrop',
+              'tfifo', 'tcoll', 'tcarrier', 'tcomp']
+MEM_FIELDS = ['total', 'free', 'buffers', 'cached']
+_MEM_LINES = {'MemTotal:': 0, 'MemFree:': 1, 'Buffers:': 2, 'Cached:': 3}
+
+def _header_value(line, key):
+    """Retrieve the integer following `key` in a collectl header line.
+    """
+    parts = line.split()
+    if key in parts[:-1]:
+        return int(parts[parts.index(key) + 1])
 
-import pandas as pd
+def _parse_raw(fp):
+    """Parse a raw collectl file into per-timestamp data for each subsystem.
 
-def _parse_raw(fp, start_tstamp, end_tstamp):
+    Dispatches on line prefixes and accumulates values in columns, building
+    DataFrames once at the end rather than per sample.
+    """
     import progressbar
     widgets = [
         os.path.basename(fp.name), ': ',
@@ -24,75 +54,24 @@ def _parse_raw(fp, start_tstamp, end_tstamp):
 
     tstamp = 0
     hardware = {}
-    data = {}
+    cpu_t, cpu_v = [], []
+    disk_t, disk_n, disk_v = [], [], []
+    net_t, net_n, net_v = [], [], []
+    mem = {}
     for line in fp:
-        matches = re.search(r'^>>> (\d+).\d+ <<<', line)
-        if matches:
-            try:
-                bar.update(fp.tell())
-            except AssertionError:
-                pass
-
-            tstamp = int(matches.group(1))
-            if (tstamp >= start_tstamp) or (tstamp <= end_tstamp):
-                data[tstamp] = {
-                    'disk': {},
-                    'mem': {},
-                    'net': {},
-                    'proc': {},
-                }
-            continue
-
-        if line.startswith('# SubSys: '):
-            matches = re.search(r'\sNumCPUs: (\d+)\s+', line)
-            if matches:
-                hardware['num_cpus'] = int(matches.group(1))
-            continue
-        if line.startswith('# Kernel: '):
-            matches = re.search(r'\sMemory: (\d+)\s+kB', line)
-            if matches:
-                hardware['memory'] = int(math.ceil(float(matches.group(1)) / math.pow(1024.0, 2.0)))
-            continue
-
-        if (tstamp < start_tstamp) or (tstamp > end_tstamp):
-            continue
-
-        if line.startswith('cpu '):
+        head = line[:4]
+        if head == 'cpu ':
             # Don't know what the last two fields are, but they
             # always seem to be 0, and collectl doesn't parse them
             # in formatit::dataAnalyze().
-            (title, user, nice, sys, idle, wait, irq,
-             soft, steal) = line.split()[:9]
-            data[tstamp]['cpu'] = {
-                 'user': user,
-                 'nice': nice,
-                 'sys': sys,
-                 'idle': idle,
-                 'wait': wait,
-                 'irq': irq,
-                 'soft': soft,
-                 'steal': steal,
-            }
-        elif line.startswith('disk '):
-            (title, major, minor, node,
-             num_reads, reads_merged, sectors_read, msec_spent_reading,
-             num_writes, writes_merged, sectors_written, msec_spent_writing,
-             iops_in_progress, msec_spent_on_iops,
-             weighted_msec_spent_on_iops) = line.split()
-            data[tstamp]['disk'][node] = {
-                'num_reads': num_reads,
-                'reads_merged': reads_merged,
-                'sectors_read': sectors_read,
-                'msec_spent_reading': msec_spent_reading,
-                'num_writes': num_writes,
-                'writes_merged': writes_merged,
-                'sectors_written': sectors_written,
-                'msec_spent_writing': msec_spent_writing,
-                'iops_in_progress': iops_in_progress,
-                'msec_spent_on_iops': msec_spent_on_iops,
-                'weighted_msec_spent_on_iops': weighted_msec_spent_on_iops,
-            }
-        elif line.startswith('Net '):
+            cpu_t.append(tstamp)
+            cpu_v.append(line.split()[1:9])
+        elif head == 'disk' and line.startswith('disk '):
+            parts = line.split()
+            disk_t.append(tstamp)
+            disk_n.append(parts[3])
+            disk_v.append(parts[4:15])
+        elif head == 'Net ':
             # Older kernel versions don't have whitespace after
             # the interface colon:
             #
@@ -101,65 +80,57 @@ def _parse_raw(fp, start_tstamp, end_tstamp):
             # unlike newer kernels:
             #
             #   Net   eth0: 415699541
-            line = re.sub(r'^(Net\s+[^:]+):', r'\1: ', line)
-
-            (title, iface,
-             rbyte, rpkt, rerr, rdrop, rfifo,
-             rframe, rcomp, rmulti,
-             tbyte, tpkt, terr, tdrop, tfifo,
-             tcoll, tcarrier, tcomp) = line.split()
-            iface = iface.replace(':', '')
-            data[tstamp]['net'][iface] = {
-                 'rbyte': rbyte,
-                 'rpkt': rpkt,
-                 'rerr': rerr,
-                 'rdrop': rdrop,
-                 'rfifo': rfifo,
-                 'rframe': rframe,
-                 'rcomp': rcomp,
-                 'rmulti': rmulti,
-                 'tbyte': tbyte,
-                 'tpkt': tpkt,
-                 'terr': terr,
-                 'tdrop': tdrop,
-                 'tfifo': tfifo,
-                 'tcoll': tcoll,
-                 'tcarrier': tcarrier,
-                 'tcomp': tcomp,
-            }
-        elif line.startswith('MemTotal:'):
-            title, amount, unit = line.split()
-            data[tstamp]['mem']['total'] = amount
-        elif line.startswith('MemFree:'):
-            title, amount, unit = line.split()
-            data[tstamp]['mem']['free'] = amount
-        elif line.startswith('Buffers:'):
-            title, amount, unit = line.split()
-            data[tstamp]['mem']['buffers'] = amount
-        elif line.startswith('Cached:'):
-            title, amount, unit = line.split()
-            data[tstamp]['mem']['cached'] = amount
+            iface, values = line[4:].split(':', 1)
+            net_t.append(tstamp)
+            net_n.append(iface.strip())
+            net_v.append(values.split()[:16])
+        elif head in ('MemT', 'MemF', 'Buff', 'Cach'):
+            title, amount = line.split()[:2]
+            if title in _MEM_LINES:
+                if tstamp not in mem:
+                    mem[tstamp] = [np.nan] * len(MEM_FIELDS)
+                mem[tstamp][_MEM_LINES[title]] = amount
+        elif head == '>>> ':
+            try:
+                bar.update(fp.tell())
+            except AssertionError:
+                pass
+            tstamp = int(line[4:].split('.', 1)[0])
+        elif line.startswith('# SubSys: '):
+            num_cpus = _header_value(line, 'NumCPUs:')
+            if num_cpus is not None:
+                hardware['num_cpus'] = num_cpus
+        elif line.startswith('# Kernel: '):
+            memory = _header_value(line, 'Memory:')
+            if memory is not None:
+                hardware['memory'] = int(math.ceil(float(memory) / math.pow(1024.0, 2.0)))
         # We don't currently do anything with process data,
         # so don't bother parsing it.
-        elif False and line.startswith('proc:'):
-            title_pid, rest = line.split(None, 1)
-            title, pid = title_pid.split(':')
-
-            if pid not in data[tstamp]['proc']:
-                data[tstamp]['proc'][pid] = {}
+    bar.finish()
 
-            if rest.startswith('cmd '):
-                title, cmd = rest.split(None, 1)
-                data[tstamp]['proc'][pid]['cmd'] = cmd
-            elif rest.startswith('io read_bytes: '):
-                value = rest.split(':')[1].strip()
-                data[tstamp]['proc'][pid]['read_bytes'] = value
-            elif rest.startswith('io write_bytes: '):
-                value = rest.split(':')[1].strip()
-                data[tstamp]['proc'][pid]['write_bytes'] = value
+    cpu = pd.DataFrame(np.array(cpu_v, dtype=float).reshape(len(cpu_v), len(CPU_FIELDS)),
+                       index=cpu_t, columns=['cpu_{}'.format(x) for x in CPU_FIELDS])
+    mem = pd.DataFrame(np.array(list(mem.values()), dtype=float).reshape(len(mem), len(MEM_FIELDS)),
+                       index=list(mem.keys()), columns=['mem_{}'.format(x) for x in MEM_FIELDS]).dropna()
+    df = cpu[~cpu.index.duplicated(keep='last')].join(mem, how='inner')
+    for tstamps, names, values, fields in [(disk_t, disk_n, disk_v, DISK_FIELDS),
+                                           (net_t, net_n, net_v, NET_FIELDS)]:
+        if tstamps:
+            df = df.join(_instances_to_frame(tstamps, names, values, fields), how='left')
+    df = df.fillna(0)
+    df.index.name = 'tstamp'
+    return df, hardware
 
-    bar.finish()
-    return hardware, data
+def _instances_to_frame(tstamps, names, values, fields):
+    """Convert values for multiple instances (disks, network interfaces) into
+    a wide DataFrame with `<instance>_<field>` columns.
+    """
+    df = pd.DataFrame(np.array(values, dtype=float), columns=fields)
+    df['tstamp'] = tstamps
+    df['name'] = names
+    df = df.drop_duplicates(['tstamp', 'name'], keep='last').set_index(['tstamp', 'name']).unstack('name')
+    df.columns = ['{}_{}'.format(name, field) for field, name in df.columns]
+    return df[['{}_{}'.format(name, field) for name in sorted(set(names)) for field in fields]]
 
 
 class _CollectlGunzip(gzip.GzipFile):
@@ -172,141 +143,68 @@ class _CollectlGunzip(gzip.GzipFile):
         return
 
 
-def load_collectl(pattern, start_time, end_time):
+def _load_raw(path):
+    """Parse a raw collectl file, re-using cached results if the file is unchanged.
+
+    Caches the parsed data next to the raw file, keyed by its modification time,
+    since graphing commonly re-reads the same raw files from long runs.
+    """
+    cache_file = path + '.npz'
+    mtime = os.path.getmtime(path)
+    if os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as cache:
+                if float(cache['mtime']) == mtime:
+                    df = pd.DataFrame(cache['values'], index=cache['tstamps'],
+                                      columns=[str(x) for x in cache['columns']])
+                    df.index.name = 'tstamp'
+                    return df, dict(zip([str(x) for x in cache['hardware_keys']],
+                                        [int(x) for x in cache['hardware_values']]))
+        except (IOError, OSError, KeyError, ValueError):
+            pass
+    df, hardware = _parse_raw(_CollectlGunzip(path, 'r'))
+    tx_cache_file = cache_file + '.tmp.npz'
+    try:
+        np.savez(tx_cache_file, mtime=mtime, values=df.values, tstamps=df.index.values,
+                 columns=np.array(list(df.columns)),
+                 hardware_keys=np.array(list(hardware.keys())),
+                 hardware_values=np.array(list(hardware.values()), dtype=int))
+        os.rename(tx_cache_file, cache_file)
+    except (IOError, OSError) as e:
+        # Cannot write next to read-only raw files, parse again next time
+        logger.info("Could not cache parsed collectl data for %s: %s" % (path, e))
+        utils.remove_safe(tx_cache_file)
+    return df, hardware
+
+
+def load_collectl(pattern, start_time, end_time, cores=1):
     """Read data from collectl data files into a pandas DataFrame.
-        :pattern: Absolute path to raw collectl files
+        :pattern: Absolute path to raw collectl files, or a list of files
+        :cores: Number of raw files to parse in parallel
     """
     start_tstamp = calendar.timegm(start_time.utctimetuple())
     end_tstamp = calendar.timegm(end_time.utctimetuple())
 
-    cols = []
-    rows = []
+    paths = pattern if isinstance(pattern, (list, tuple)) else sorted(glob.glob(pattern))
+    if cores > 1 and len(paths) > 1 and joblib:
+        parsed = joblib.Parallel(min(cores, len(paths)))(joblib.delayed(_load_raw)(p) for p in paths)
+    else:
+        parsed = [_load_raw(p) for p in paths]
 
-    for path in glob.glob(pattern):
-        hardware, raw = _parse_raw(
-            _CollectlGunzip(path, 'r'), start_tstamp, end_tstamp)
-
-        if not cols:
-            instances = {
-                'disk': set(),
-                'net': set(),
-                'proc': set(),
-            }
-            for tstamp, sample in raw.items():
-                for group, items in sample.items():
-                    if group == 'disk':
-                        instances['disk'] = instances['disk'].union(
-                            items.keys())
-                    elif group == 'net':
-                        instances['net'] = instances['net'].union(
-                            items.keys())
-                    elif group == 'proc':
-                        instances['proc'] = instances['proc'].union(
-                            items.keys())
-
-            cols = ['tstamp']
-            cols.extend([
-                'cpu_{}'.format(var)
-                for var
-                 in ['user', 'nice', 'sys', 'idle', 'wait',
-                     'irq', 'soft', 'steal']
-                 ])
-            for node in instances['disk']:
-                cols.extend([
-                    '{}_{}'.format(node, var)
-                    for var
-                     in ['num_reads', 'reads_merged',
-                         'sectors_read', 'msec_spent_reading',
-                         'num_writes', 'writes_merged',
-                         'sectors_written', 'msec_spent_writing',
-                         'iops_in_progress', 'msec_spent_on_iops',
-                         'weighted_msec_spent_on_iops']
-                     ])
-            cols.extend([
-                'mem_{}'.format(var)
-                for var
-                 in ['total', 'free', 'buffers', 'cached']
-                 ])
-            for iface in instances['net']:
-                cols.extend([
-                    '{}_{}'.format(iface, var)
-                    for var
-                     in ['rbyte', 'rpkt', 'rerr', 'rdrop',
-                         'rfifo', 'rframe', 'rcomp', 'rmulti',
-                         'tbyte', 'tpkt', 'terr', 'tdrop',
-                         'tfifo', 'tcoll', 'tcarrier', 'tcomp']
-                     ])
-            for pid in instances['proc']:
-                cols.extend([
-                    '{}_{}'.format(pid, var)
-                    for var
-                     in ['name', 'read_bytes', 'write_bytes']
-                     ])
-
-        for tstamp, sample in raw.items():
-            if ('cpu' not in sample or
-                'disk' not in sample or
-                'mem' not in sample):
-                # Skip incomplete samples; there might be a truncated
-                # sample on the end of the file.
-                continue
-
-            values = [tstamp]
-            values.extend([
-                sample['cpu']['user'], sample['cpu']['nice'],
-                sample['cpu']['sys'], sample['cpu']['idle'],
-                sample['cpu']['wait'], sample['cpu']['irq'],
-                sample['cpu']['soft'], sample['cpu']['steal'],
-            ])
-            for node in instances['disk']:
-                data = sample['disk'].get(node, {})
-                values.extend([
-                    data.get('num_reads', 0),
-                    data.get('reads_merged', 0),
-                    data.get('sectors_read', 0),
-                    data.get('msec_spent_reading', 0),
-                    data.get('num_writes', 0),
-                    data.get('writes_merged', 0),
-                    data.get('sectors_written', 0),
-                    data.get('msec_spent_writing', 0),
-                    data.get('iops_in_progress', 0),
-                    data.get('msec_spent_on_iops', 0),
-                    data.get('weighted_msec_spent_on_iops', 0),
-                ])
-            values.extend([
-                sample['mem']['total'], sample['mem']['free'],
-                sample['mem']['buffers'], sample['mem']['cached'],
-            ])
-            for iface in instances['net']:
-                data = sample['net'].get(iface, {})
-                values.extend([
-                    data.get('rbyte', 0), data.get('rpkt', 0),
-                    data.get('rerr', 0), data.get('rdrop', 0),
-                    data.get('rfifo', 0), data.get('rframe', 0),
-                    data.get('rcomp', 0), data.get('rmulti', 0),
-                    data.get('tbyte', 0), data.get('tpkt', 0),
-                    data.get('terr', 0), data.get('tdrop', 0),
-                    data.get('tfifo', 0), data.get('tcoll', 0),
-                    data.get('tcarrier', 0), data.get('tcomp', 0),
-                ])
-            if 'proc' in sample:
-                for pid in instances['proc']:
-                    data = sample['proc'].get(pid, {})
-                    values.extend([
-                        data.get('cmd', ''),
-                        data.get('read_bytes', 0),
-                        data.get('write_bytes', 0),
-                    ])
-
-            rows.append(values)
-
-    if len(rows) == 0:
-        return pd.DataFrame(columns=cols), {}
-
-    df = pd.DataFrame(rows, columns=cols)
-    df = df.convert_objects(convert_numeric=True)
-    df['tstamp'] = df['tstamp'].astype('datetime64[s]')
-    df.set_index('tstamp', inplace=True)
+    hardware = {}
+    frames = []
+    for df, cur_hardware in parsed:
+        hardware.update(cur_hardware)
+        df = df[(df.index >= start_tstamp) & (df.index <= end_tstamp)]
+        if len(df) > 0:
+            frames.append(df)
+
+    if len(frames) == 0:
+        return pd.DataFrame(), {}
+
+    df = pd.concat(frames).fillna(0) if len(frames) > 1 else frames[0]
+    df.index = pd.to_datetime(df.index, unit='s')
+    df.index.name = 'tstamp'
     df = df.tz_localize('UTC')
 
     return df, hardware
@@ -9,12 +9,13 @@ import pytz
 import re
 import socket
 
-import pandas as pd
 import cPickle as pickle
 
 from bcbio import utils
 from bcbio.graph.collectl import load_collectl
 
+pd = utils.LazyImport("pandas")
+
 mpl = utils.LazyImport("matplotlib")
 plt = utils.LazyImport("matplotlib.pyplot")
 pylab = utils.LazyImport("pylab")
@@ -316,7 +317,7 @@ def rawfile_within_timeframe(rawfile, timeframe):
     return ftime.date() >= timeframe[0].date() and ftime.date() <= timeframe[1].date()
 
 
-def resource_usage(bcbio_log, cluster, rawdir, verbose):
+def resource_usage(bcbio_log, cluster, rawdir, verbose, cores=1):
     """Generate system statistics from bcbio runs.
 
     Parse the obtained files and put the information in
@@ -326,6 +327,7 @@ def resource_usage(bcbio_log, cluster, rawdir, verbose):
     :param cluster:
     :param rawdir:      directory to put raw data files
     :param verbose:     increase verbosity
+    :param cores:       number of raw files to parse in parallel
 
     :return: a tuple with three dictionaries, the first one contains
              an instance of :pandas.DataFrame: for each host, the second one
@@ -337,27 +339,26 @@ def resource_usage(bcbio_log, cluster, rawdir, verbose):
     hardware_info = {}
     time_frame = log_time_frame(bcbio_log)
 
+    host_files = collections.OrderedDict()
     for collectl_file in sorted(os.listdir(rawdir)):
         if not collectl_file.endswith('.raw.gz'):
             continue
 
         # Only load filenames within sampling timerange (gathered from bcbio_log time_frame)
         if rawfile_within_timeframe(collectl_file, time_frame):
+            host = re.sub(r'-\d{8}-\d{6}\.raw\.gz$', '', collectl_file)
+            host_files.setdefault(host, []).append(os.path.join(rawdir, collectl_file))
 
-            collectl_path = os.path.join(rawdir, collectl_file)
-            data, hardware = load_collectl(
-                collectl_path, time_frame.start, time_frame.end)
+    for host, collectl_paths in host_files.items():
+        data, hardware = load_collectl(
+            collectl_paths, time_frame.start, time_frame.end, cores)
 
-            if len(data) == 0:
-                #raise ValueError("No data present in collectl file %s, mismatch in timestamps between raw collectl and log file?", collectl_path)
-                continue
+        if len(data) == 0:
+            #raise ValueError("No data present in collectl file %s, mismatch in timestamps between raw collectl and log file?", collectl_path)
+            continue
 
-            host = re.sub(r'-\d{8}-\d{6}\.raw\.gz$', '', collectl_file)
-            hardware_info[host] = hardware
-            if host not in data_frames:
-                data_frames[host] = data
-            else:
-                data_frames[host] = pd.concat([data_frames[host], data])
+        hardware_info[host] = hardware
+        data_frames[host] = data
 
     return (data_frames, hardware_info, time_frame.steps)
 
@@ -448,8 +449,19 @@ def add_subparser(subparsers):
     parser.add_argument(
         "-r", "--rawdir", default="monitoring/collectl", required=True,
         help="Directory to put raw collectl data files.")
+    parser.add_argument(
+        "-n", "--cores", type=int, default=1,
+        help="Number of raw collectl files to parse in parallel.")
     parser.add_argument(
         "-v", "--verbose", action="store_true", default=False,
         help="Emit verbose output")
 
     return parser
+
+def bootstrap(args):
+    """Generate graphs and serialized plot data from command line arguments."""
+    data, hardware, steps = resource_usage(args.log, None, args.rawdir, args.verbose,
+                                           cores=args.cores)
+    utils.safe_makedir(args.outdir)
+    collectl_info = generate_graphs(data, hardware, steps, args.outdir, verbose=args.verbose)
+    serialize_plot_data(collectl_info, (data, hardware, steps), args.outdir)
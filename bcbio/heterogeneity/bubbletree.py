@@ -10,8 +10,6 @@ import os
 import re
 import subprocess
 
-import numpy as np
-import pysam
 import toolz as tz
 
 from bcbio import utils
@@ -21,7 +19,10 @@ from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do
 from bcbio.heterogeneity import chromhacks
 from bcbio.structural import shared
-from bcbio.variation import bedutils
+from bcbio.variation import bedutils, vcfstats
+
+np = utils.LazyImport("numpy")
+pysam = utils.LazyImport("pysam")
 
 population_keys = ['AC_AFR', 'AC_AMR', 'AC_EAS', 'AC_FIN', 'AC_NFE', 'AC_OTH', 'AC_SAS']
 
@@ -213,27 +214,26 @@ def _predict_states(freqs):
 
 def _freqs_by_chromosome(in_file, params, somatic_info):
     """Retrieve frequencies across each chromosome as inputs to HMM.
+
+    Uses pre-collected VCF statistics, grouping biallelic SNPs passing filters
+    on autosomes into runs by chromosome, then keeping tumor non-reference
+    calls with sufficient depth.
     """
-    freqs = []
-    coords = []
-    cur_chrom = None
-    with pysam.VariantFile(in_file) as bcf_in:
-        for rec in bcf_in:
-            if _is_biallelic_snp(rec) and _passes_plus_germline(rec) and chromhacks.is_autosomal(rec.chrom):
-                if cur_chrom is None or rec.chrom != cur_chrom:
-                    if cur_chrom and len(freqs) > 0:
-                        yield cur_chrom, freqs, coords
-                    cur_chrom = rec.chrom
-                    freqs = []
-                    coords = []
-                stats = _tumor_normal_stats(rec, somatic_info)
-                if tz.get_in(["tumor", "depth"], stats, 0) > params["min_depth"]:
-                    # not a ref only call
-                    if len(rec.samples) == 0 or sum(rec.samples[somatic_info.tumor_name].allele_indices) > 0:
-                        freqs.append(tz.get_in(["tumor", "freq"], stats))
-                        coords.append(rec.start)
-        if cur_chrom and len(freqs) > 0:
-            yield cur_chrom, freqs, coords
+    stats = vcfstats.get_stats(in_file, [somatic_info.tumor_name])
+    chroms = stats["chrom"]
+    keep = stats.has_flags(vcfstats.SNP | vcfstats.BIALLELIC | vcfstats.PASS_OR_REJECT)
+    autosomal = np.array([chromhacks.is_autosomal(c) for c in stats.chrom_names], dtype=bool)
+    if len(autosomal) > 0:
+        keep &= autosomal[chroms]
+    idx = np.flatnonzero(keep)
+    depths, freqs = stats.sample_values(somatic_info.tumor_name)
+    # not a ref only call
+    use = (depths[idx] > params["min_depth"]) & stats.sample_nonref(somatic_info.tumor_name)[idx]
+    breaks = np.flatnonzero(chroms[idx][1:] != chroms[idx][:-1]) + 1
+    for run in np.split(np.arange(len(idx)), breaks):
+        cur = idx[run[use[run]]]
+        if len(cur) > 0:
+            yield stats.chrom_names[chroms[cur[0]]], freqs[cur].tolist(), (stats["pos"][cur] - 1).tolist()
 
 def _create_subset_file(in_file, het_region_bed, work_dir, data):
     """Subset the VCF to a set of pre-calculated smaller regions.
@@ -330,29 +330,7 @@ def is_population_germline(rec):
                 return True
     return False
 
-def sample_alt_and_depth(rec, sample):
-    """Flexibly get ALT allele and depth counts, handling FreeBayes, MuTect and other cases.
-    """
-    if sample and "AD" in sample:
-        all_counts = [int(x) for x in sample["AD"]]
-        alt_counts = sum(all_counts[1:])
-        depth = sum(all_counts)
-    elif sample and "AO" in sample and sample.get("RO") is not None:
-        alts = sample["AO"]
-        if not isinstance(alts, (list, tuple)):
-            alts = [alts]
-        alt_counts = sum([int(x) for x in alts])
-        depth = alt_counts + int(sample["RO"])
-    elif "DP" in rec.info and "AF" in rec.info:
-        af = rec.info["AF"][0] if isinstance(rec.info["AF"], (tuple, list)) else rec.info["AF"]
-        return None, rec.info["DP"], af
-    else:
-        alt_counts = None
-    if alt_counts is None or depth is None or depth == 0:
-        return None, None, None
-    else:
-        freq = float(alt_counts) / float(depth)
-        return alt_counts, depth, freq
+sample_alt_and_depth = vcfstats.sample_alt_and_depth
 
 def _cur_workdir(data):
     return utils.safe_makedir(os.path.join(data["dirs"]["work"], "heterogeneity",
@@ -11,8 +11,6 @@ import collections
 import os
 import sys
 
-import pybedtools
-from pysam import VariantFile
 
 from bcbio import utils
 from bcbio.bam import ref
@@ -22,6 +20,9 @@ from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do
 from bcbio.structural import annotate
 
+pybedtools = utils.LazyImport("pybedtools")
+pysam = utils.LazyImport("pysam")
+
 def run(vrn_info, cnvs_by_name, somatic_info):
     """Run PhyloWGS given variant calls, CNVs and tumor/normal information.
     """
@@ -220,13 +221,13 @@ def _prep_vrn_file(in_file, vcaller, work_dir, somatic_info, ignore_file, config
         with file_transaction(somatic_info.tumor_data, out_file) as tx_out_file:
             tx_out_file_raw = "%s-raw%s" % utils.splitext_plus(tx_out_file)
             # Filter inputs
-            with VariantFile(in_file) as bcf_in:
+            with pysam.VariantFile(in_file) as bcf_in:
                 depths = [_sample_depth(rec, somatic_info.tumor_name) for rec in
                           filter(check_fn, bcf_in)]
                 depths.sort(reverse=True)
                 depth_thresh = depths[:config["sample_size"]][-1] if depths else 0
-            with VariantFile(in_file) as bcf_in:
-                with VariantFile(tx_out_file_raw, "w", header=bcf_in.header) as bcf_out:
+            with pysam.VariantFile(in_file) as bcf_in:
+                with pysam.VariantFile(tx_out_file_raw, "w", header=bcf_in.header) as bcf_out:
                     for rec in bcf_in:
                         if (check_fn(rec) and
                               (depth_thresh < 5 or _sample_depth(rec, somatic_info.tumor_name) >= depth_thresh)):
@@ -9,8 +9,6 @@ import os
 import sys
 import subprocess
 
-import pybedtools
-import pysam
 import toolz as tz
 
 from bcbio import utils
@@ -21,6 +19,9 @@ from bcbio.variation import vcfutils
 from bcbio.provenance import do
 from bcbio.structural import convert
 
+pybedtools = utils.LazyImport("pybedtools")
+pysam = utils.LazyImport("pysam")
+
 def run(vrn_info, cnvs_by_name, somatic_info):
     """Run THetA analysis given output from CNV caller on a tumor/normal pair.
     """
@@ -8,7 +8,6 @@ import operator
 import subprocess
 from xml.etree.ElementTree import ElementTree
 
-import requests
 import yaml
 
 from bcbio import utils
@@ -16,6 +15,8 @@ from bcbio.log import setup_local_logging
 from bcbio.illumina import demultiplex, samplesheet, transfer
 from bcbio.galaxy import nglims
 
+requests = utils.LazyImport("requests")
+
 # ## bcbio-nextgen integration
 
 def check_and_postprocess(args):
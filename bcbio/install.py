@@ -17,7 +17,6 @@ import subprocess
 import sys
 import glob
 
-import requests
 from six.moves import urllib
 import toolz as tz
 import yaml
@@ -28,6 +27,8 @@ from bcbio.variation import effects
 from bcbio.distributed.transaction import file_transaction
 from bcbio.pipeline import datadict as dd
 
+requests = utils.LazyImport("requests")
+
 REMOTES = {
     "requirements": "https://raw.githubusercontent.com/chapmanb/bcbio-nextgen/master/requirements-conda.txt",
     "gitrepo": "https://github.com/chapmanb/bcbio-nextgen.git",
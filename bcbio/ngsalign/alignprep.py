@@ -1,10 +1,12 @@
 """Prepare read inputs (fastq, gzipped fastq and BAM) for parallel NGS alignment.
 """
+import bisect
 import collections
 import copy
 import glob
 import os
 import shutil
+import struct
 import subprocess
 
 import toolz as tz
@@ -19,14 +21,14 @@ from bcbio.distributed.transaction import file_transaction
 from bcbio.ngsalign import rtg
 from bcbio.pipeline import config_utils, tools
 from bcbio.pipeline import datadict as dd
-from bcbio.provenance import do
+from bcbio.provenance import diagnostics, do
 
 def create_inputs(data):
     """Index input reads and prepare groups of reads to process concurrently.
 
     Allows parallelization of alignment beyond processors available on a single
-    machine. Prepares a bgzip and grabix indexed file for retrieving sections
-    of files.
+    machine. Prepares a bgzip file plus a read offset index for retrieving
+    sections of files.
     """
     from bcbio.pipeline import sample
     data = cwlutils.normalize_missing(data)
@@ -44,8 +46,8 @@ def create_inputs(data):
     data["config"]["algorithm"]["quality_format"] = "standard"
     # Handle any necessary trimming
     data = utils.to_single_data(sample.trim_sample(data)[0])
-    _prep_grabix_indexes(data["files"], data)
     data = _set_align_split_size(data)
+    _prep_grabix_indexes(data["files"], data)
     out = []
     if tz.get_in(["config", "algorithm", "align_split_size"], data):
         splits = _find_read_splits(data["files"][0], data["config"]["algorithm"]["align_split_size"])
@@ -123,12 +125,41 @@ def split_namedpipe_cls(pair1_file, pair2_file, data):
         out = []
         for in_file in pair1_file, pair2_file:
             if in_file:
-                assert os.path.exists(in_file + ".gbi"), "Need grabix index for %s" % in_file
-                out.append("<(grabix grab {in_file} {start} {end})".format(**locals()))
+                index = read_offset_index(in_file)
+                gbi_file = in_file + ".gbi"
+                if start and not (index and "voffsets" in index) and not utils.file_exists(gbi_file):
+                    # grabix indexes are no longer built by default, so rebuild a missing read index
+                    _read_index(in_file, data["config"])
+                    index = read_offset_index(in_file)
+                if start and index and "voffsets" in index:
+                    out.append("<(%s)" % _read_index_pipe_cl(in_file, start, end, index, data))
+                else:
+                    if not utils.file_exists(gbi_file):
+                        raise ValueError("Splitting %s requires a read offset index (%s) or grabix index (%s)"
+                                         % (in_file, in_file + READ_INDEX_EXT, gbi_file))
+                    out.append("<(grabix grab {in_file} {start} {end})".format(**locals()))
             else:
                 out.append(None)
         return out
 
+def _read_index_pipe_cl(in_file, start, end, index, data):
+    """Stream reads in a 1-based inclusive line range, seeking directly with the read offset index.
+
+    Splits start on read index points, so we jump to the BGZF block holding the
+    first read, decompress from there and trim to the uncompressed size of the shard.
+    """
+    step = index["step"]
+    start_read, end_read = (start - 1) // 4, end // 4
+    assert start_read % step == 0, "Split start %s not on read index for %s" % (start, in_file)
+    voffset = index["voffsets"][start_read // step]
+    coffset, within_offset = voffset >> 16, voffset & 0xFFFF
+    bgzip = config_utils.get_program("bgzip", data["config"])
+    cmd = "tail -c +{0} {1} | {2} -dc | tail -c +{3}".format(coffset + 1, in_file, bgzip, within_offset + 1)
+    if end_read < index["reads"]:
+        assert end_read % step == 0, "Split end %s not on read index for %s" % (end, in_file)
+        cmd += " | head -c %s" % (index["offsets"][end_read // step] - index["offsets"][start_read // step])
+    return cmd
+
 def _seqtk_fastq_prep_cl(data, in_file=None, read_num=0):
     """Provide a commandline for prep of fastq inputs with seqtk.
 
@@ -263,14 +294,23 @@ def _save_fastq_space(items):
 
 # ## determine file sections
 
+def total_reads(in_file):
+    """Retrieve total reads in a fastq file from the read offset or grabix index.
+    """
+    index = read_offset_index(in_file)
+    if index:
+        return index["reads"]
+    else:
+        return total_reads_from_grabix(in_file)
+
 def total_reads_from_grabix(in_file):
     """Retrieve total reads in a fastq file from grabix index.
     """
     gbi_file = in_file + ".gbi"
     if utils.file_exists(gbi_file):
         with open(gbi_file) as in_handle:
-            in_handle.next()  # throw away
-            num_lines = int(in_handle.next().strip())
+            next(in_handle)  # throw away
+            num_lines = int(next(in_handle).strip())
         assert num_lines % 4 == 0, "Expected lines to be multiple of 4"
         return num_lines // 4
     else:
@@ -280,9 +320,14 @@ def _find_read_splits(in_file, split_size):
     """Determine sections of fastq files to process in splits.
 
     Assumes a 4 line order to input files (name, read, name, quality).
-    grabix is 1-based inclusive, so return coordinates in that format.
+    grabix is 1-based inclusive, so return coordinates in that format. With a
+    read offset index, split sizes round to the index step.
     """
-    num_lines = total_reads_from_grabix(in_file) * 4
+    index = read_offset_index(in_file)
+    if index:
+        # split on read index points so shards can seek directly to their start
+        split_size = max(1, int(round(float(split_size) / index["step"]))) * index["step"]
+    num_lines = total_reads(in_file) * 4
     assert num_lines, num_lines
     split_lines = split_size * 4
     chunks = []
@@ -293,6 +338,157 @@ def _find_read_splits(in_file, split_size):
         last = new + 1
     return ["%s-%s" % (s, e) for s, e in chunks]
 
+# ## read offset index
+
+READ_INDEX_EXT = ".fqi"
+READ_INDEX_STEP = 1000  # reads between offset index points
+
+class _ReadOffsetIndexer(object):
+    """Track uncompressed byte offsets of every `step` reads in a streamed fastq file.
+
+    Works on arbitrary chunks of input so we can index while passing data on to
+    bgzip, avoiding a second read through the file.
+    """
+    def __init__(self, step=READ_INDEX_STEP):
+        self.step = step
+        self.lines = 0
+        self.size = 0
+        self.offsets = [0]
+        self._next_line = step * 4
+        self._last = b""
+
+    def add(self, chunk):
+        if not chunk:
+            return
+        lengths = [len(x) for x in chunk.split(b"\n")]
+        newlines = len(lengths) - 1
+        i, pos = 0, 0
+        while self.lines + newlines >= self._next_line:
+            k = self._next_line - self.lines
+            pos += sum(lengths[i:k]) + (k - i)
+            i = k
+            self.offsets.append(self.size + pos)
+            self._next_line += self.step * 4
+        self.lines += newlines
+        self.size += len(chunk)
+        self._last = chunk[-1:]
+
+    def write(self, out_file, bgzip_file=None):
+        lines = self.lines + (1 if self.size and self._last != b"\n" else 0)
+        assert lines % 4 == 0, "Expected lines to be multiple of 4: %s" % lines
+        offsets = [x for x in self.offsets if x < self.size]
+        return _write_read_index(out_file, lines // 4, self.step, offsets, bgzip_file)
+
+def _write_read_index(out_file, reads, step, offsets, bgzip_file=None):
+    """Write a read offset index, adding BGZF virtual offsets if we have the bgzipped file.
+    """
+    voffsets = _bgzf_virtual_offsets(bgzip_file, offsets) if bgzip_file else None
+    with open(out_file, "w") as out_handle:
+        out_handle.write("#reads\t%s\n#step\t%s\n" % (reads, step))
+        for i, offset in enumerate(offsets):
+            out_handle.write("%s\n" % ("\t".join(str(x) for x in [offset, voffsets[i]])
+                                       if voffsets else offset))
+    return out_file
+
+def _bgzf_virtual_offsets(bgzip_file, offsets):
+    """Convert uncompressed offsets into BGZF virtual offsets.
+
+    Reads only the header and footer of each BGZF block to map compressed to
+    uncompressed positions, without decompressing.
+    """
+    coffsets, uoffsets = [], []
+    coffset, uoffset = 0, 0
+    with open(bgzip_file, "rb") as in_handle:
+        while True:
+            in_handle.seek(coffset)
+            header = in_handle.read(18)
+            if not header:
+                break
+            if len(header) < 18 or header[:4] != b"\x1f\x8b\x08\x04" or header[12:14] != b"BC":
+                raise ValueError("Expected BGZF block at offset %s of %s" % (coffset, bgzip_file))
+            block_size = struct.unpack("<H", header[16:18])[0] + 1
+            in_handle.seek(coffset + block_size - 4)
+            isize = struct.unpack("<I", in_handle.read(4))[0]
+            if isize:
+                coffsets.append(coffset)
+                uoffsets.append(uoffset)
+            coffset += block_size
+            uoffset += isize
+    out = []
+    for offset in offsets:
+        i = bisect.bisect_right(uoffsets, offset) - 1
+        assert i >= 0 and offset - uoffsets[i] < 65536, (offset, bgzip_file)
+        out.append((coffsets[i] << 16) | (offset - uoffsets[i]))
+    return out
+
+def read_offset_index(in_file):
+    """Retrieve total reads and offsets of every `step` reads in a bgzipped fastq.
+
+    Includes uncompressed `offsets` and, for indexes built against the final
+    bgzipped file, BGZF `voffsets`. Returns None if the input has no read offset index.
+    """
+    index_file = in_file + READ_INDEX_EXT
+    if not utils.file_exists(index_file):
+        return None
+    out = {"offsets": [], "voffsets": []}
+    with open(index_file) as in_handle:
+        for line in in_handle:
+            if line.startswith("#"):
+                key, val = line[1:].strip().split("\t")
+                out[key] = int(val)
+            elif line.strip():
+                parts = [int(x) for x in line.strip().split("\t")]
+                out["offsets"].append(parts[0])
+                if len(parts) > 1:
+                    out["voffsets"].append(parts[1])
+    if len(out["voffsets"]) != len(out["offsets"]) or not out["offsets"]:
+        del out["voffsets"]
+    return out
+
+def _stream_with_read_index(in_cmd, index_file, out_cmd=None, descr="", data=None, bgzip_file=None):
+    """Stream fastq output of a command, building a read offset index in the same pass.
+
+    The output is passed on to `out_cmd` (usually bgzip) if provided, otherwise
+    we only index. `bgzip_file` is the bgzipped version of the stream, used to
+    add virtual offsets once it is complete.
+    """
+    chunk_size = 4 * 1024 * 1024
+    cmd = "%s | %s" % (in_cmd, out_cmd or "[read index]")
+    logger.debug(descr)
+    cmd_id = diagnostics.start_cmd(cmd, descr, data)
+    in_p = subprocess.Popen(in_cmd, shell=True, executable=do.find_bash(), stdout=subprocess.PIPE)
+    out_p = (subprocess.Popen(out_cmd, shell=True, executable=do.find_bash(), stdin=subprocess.PIPE)
+             if out_cmd else None)
+    indexer = _ReadOffsetIndexer()
+    write_error = None
+    try:
+        for chunk in iter(lambda: in_p.stdout.read(chunk_size), b""):
+            indexer.add(chunk)
+            if out_p:
+                out_p.stdin.write(chunk)
+    except IOError as e:
+        # output command exited early, reported below with its exit code
+        write_error = e
+    finally:
+        # Close pipes so neither command blocks, then always reap both
+        in_p.stdout.close()
+        if out_p:
+            try:
+                out_p.stdin.close()
+            except IOError:
+                pass
+        exitcodes = [p.wait() for p in [in_p, out_p] if p]
+        if write_error:
+            # the input command fails on the closed pipe, report the output command
+            exitcode = next((x for x in reversed(exitcodes) if x), 0) or 1
+        else:
+            exitcode = next((x for x in exitcodes if x), 0)
+        diagnostics.end_cmd(cmd_id, exitcode == 0, {"exitcode": exitcode})
+    if exitcode:
+        raise subprocess.CalledProcessError(exitcode, cmd)
+    # index virtual offsets only once the bgzipped output is complete
+    return indexer.write(index_file, bgzip_file)
+
 # ## bgzip and grabix
 
 def _is_bam_input(in_files):
@@ -335,9 +531,15 @@ def _prep_fastq_inputs(in_files, data):
     return out
 
 def _prep_grabix_indexes(in_files, data):
-    """Parallel preparation of grabix indexes for files.
+    """Parallel preparation of read offset and grabix indexes for files.
+
+    grabix indexes are only needed for CWL runs, which pass them as secondary
+    files. Otherwise the read offset index handles counting reads and seeking
+    to alignment splits.
     """
-    items = [[{"bgzip_file": x, "config": copy.deepcopy(data["config"])}] for x in in_files if x]
+    needs_grabix = "cwl_keys" in data
+    items = [[{"bgzip_file": x, "config": copy.deepcopy(data["config"]), "needs_grabix": needs_grabix}]
+             for x in in_files if x]
     run_multicore(_grabix_index, items, data["config"])
     return data
 
@@ -533,12 +735,15 @@ def _grabix_index(data):
     """Create grabix index of bgzip input file.
 
     grabix does not allow specification of output file, so symlink the original
-    file into a transactional directory.
+    file into a transactional directory. Skipped if we don't need grabix and can
+    use the read offset index instead, which we build if missing.
     """
     in_file = data["bgzip_file"]
     config = data["config"]
-    grabix = config_utils.get_program("grabix", config)
     gbi_file = in_file + ".gbi"
+    if not data.get("needs_grabix") and not utils.file_exists(gbi_file):
+        return [_read_index(in_file, config)]
+    grabix = config_utils.get_program("grabix", config)
     # We always build grabix input so we can use it for counting reads and doing downsampling
     if not utils.file_exists(gbi_file) or _is_partial_index(gbi_file):
         utils.remove_safe(gbi_file)
@@ -549,6 +754,23 @@ def _grabix_index(data):
     assert utils.file_exists(gbi_file)
     return [gbi_file]
 
+def _read_index(in_file, config):
+    """Build a read offset index for an existing bgzipped fastq file.
+
+    Adds virtual offsets to indexes lacking them without re-reading the input.
+    """
+    index_file = in_file + READ_INDEX_EXT
+    index = read_offset_index(in_file)
+    if not index or ("voffsets" not in index and index["offsets"]):
+        with file_transaction(config, index_file) as tx_index_file:
+            if index:
+                _write_read_index(tx_index_file, index["reads"], index["step"], index["offsets"], in_file)
+            else:
+                _stream_with_read_index("%s -dc %s" % (tools.get_bgzip_cmd(config), in_file), tx_index_file,
+                                        descr="Index input reads: %s" % os.path.basename(in_file),
+                                        bgzip_file=in_file)
+    return index_file
+
 def _is_partial_index(gbi_file):
     """Check for truncated output since grabix doesn't write to a transactional directory.
     """
@@ -601,11 +823,14 @@ def _bgzip_from_fastq(data):
 
 def _bgzip_file(in_file, config, work_dir, needs_bgzip, needs_gunzip, needs_convert, data):
     """Handle bgzip of input file, potentially gunzipping an existing file.
+
+    Writes a read offset index alongside the bgzipped output while compressing.
     """
     out_file = os.path.join(work_dir, os.path.basename(in_file).replace(".bz2", "") +
                             (".gz" if not in_file.endswith(".gz") else ""))
+    index_file = out_file + READ_INDEX_EXT
     if not utils.file_exists(out_file):
-        with file_transaction(config, out_file) as tx_out_file:
+        with file_transaction(config, out_file, index_file) as (tx_out_file, tx_index_file):
             bgzip = tools.get_bgzip_cmd(config)
             is_remote = objectstore.is_remote(in_file)
             in_file = objectstore.cl_input(in_file, unpack=needs_gunzip or needs_convert
@@ -614,19 +839,17 @@ def _bgzip_file(in_file, config, work_dir, needs_bgzip, needs_gunzip, needs_conv
                 in_file = fastq_convert_pipe_cl(in_file, data)
             if needs_gunzip and not (needs_convert or dd.get_trim_ends(data)):
                 if in_file.endswith(".bz2"):
-                    gunzip_cmd = "bunzip2 -c {in_file} |".format(**locals())
+                    in_cmd = "bunzip2 -c {in_file}".format(**locals())
                 else:
-                    gunzip_cmd = "gunzip -c {in_file} |".format(**locals())
-                bgzip_in = "/dev/stdin"
+                    in_cmd = "gunzip -c {in_file}".format(**locals())
             else:
-                gunzip_cmd = ""
-                bgzip_in = in_file
-            if needs_bgzip:
-                do.run("{gunzip_cmd} {bgzip} -c {bgzip_in} > {tx_out_file}".format(**locals()),
-                       "bgzip input file")
+                in_cmd = "cat {in_file}".format(**locals())
+            if needs_bgzip or (is_remote and (needs_convert or dd.get_trim_ends(data))):
+                # bgzip and index reads in a single pass through the input
+                _stream_with_read_index(in_cmd, tx_index_file, "{bgzip} -c > {tx_out_file}".format(**locals()),
+                                        "bgzip input file", data, bgzip_file=tx_out_file)
             elif is_remote:
-                bgzip = "| bgzip -c" if (needs_convert or dd.get_trim_ends(data)) else ""
-                do.run("cat {in_file} {bgzip} > {tx_out_file}".format(**locals()), "Get remote input")
+                do.run("cat {in_file} > {tx_out_file}".format(**locals()), "Get remote input")
             else:
                 raise ValueError("Unexpected inputs: %s %s %s %s" % (in_file, needs_bgzip,
                                                                      needs_gunzip, needs_convert))
@@ -8,8 +8,6 @@ import sys
 import glob
 import subprocess
 
-import numpy
-import pysam
 
 from bcbio.pipeline import config_utils
 from bcbio.ngsalign import bowtie, bowtie2
@@ -19,6 +17,10 @@ from bcbio.provenance import do
 from bcbio import bam
 from bcbio import broad
 import bcbio.pipeline.datadict as dd
+from bcbio import utils
+
+numpy = utils.LazyImport("numpy")
+pysam = utils.LazyImport("pysam")
 
 
 def _set_quality_flag(options, data):
@@ -3,6 +3,7 @@
 import copy
 import collections
 import glob
+import json
 import math
 import os
 import pprint
@@ -167,12 +168,22 @@ def get_resources(name, config):
     return tz.get_in(["resources", name], config,
                      tz.get_in(["resources", "default"], config, {}))
 
+# Resolved program commands and directories, keyed by program, configuration and PATH
+_PROGRAM_CACHE = {}
+_PROGRAM_CACHE_STATS = {"lookups": 0, "hits": 0, "checks_saved": 0}
+# Lookups reported by multicore worker processes
+_WORKER_CACHE_STATS = {"lookups": 0, "hits": 0, "checks_saved": 0, "programs": 0}
+
 def get_program(name, config, ptype="cmd", default=None):
     """Retrieve program information from the configuration.
 
     This handles back compatible location specification in input
     YAML. The preferred location for program information is in
     `resources` but the older `program` tag is also supported.
+
+    Resolved locations are cached for the lifetime of the process, avoiding
+    repeated filesystem checks. Changes to the program configuration or PATH
+    result in a new lookup.
     """
     # support taking in the data dictionary
     config = config.get("config", config)
@@ -186,34 +197,67 @@ def get_program(name, config, ptype="cmd", default=None):
         for key in ["dir", "cmd"]:
             if not key in pconfig:
                 pconfig[key] = old_config
+    if ptype not in ["cmd", "dir"]:
+        raise ValueError("Don't understand program type: %s" % ptype)
+    key = (name, ptype, json.dumps(pconfig, sort_keys=True, default=str), default,
+           config.get("bcbio_system"), sys.executable, os.environ.get("PATH"))
+    _PROGRAM_CACHE_STATS["lookups"] += 1
+    if key in _PROGRAM_CACHE:
+        val, checks = _PROGRAM_CACHE[key]
+        _PROGRAM_CACHE_STATS["hits"] += 1
+        _PROGRAM_CACHE_STATS["checks_saved"] += checks
+        return val
     if ptype == "cmd":
-        return _get_program_cmd(name, pconfig, config, default)
-    elif ptype == "dir":
-        return _get_program_dir(name, pconfig)
+        val, checks = _get_program_cmd(name, pconfig, config, default)
     else:
-        raise ValueError("Don't understand program type: %s" % ptype)
+        val, checks = _get_program_dir(name, pconfig), 0
+    _PROGRAM_CACHE[key] = (val, checks)
+    return val
+
+def get_program_cache_stats():
+    """Summarize program lookups and filesystem checks avoided by caching.
+
+    Includes lookups in this process and those reported from worker processes
+    with `add_program_cache_stats`. programs counts lookups resolved on the
+    filesystem, summed across processes.
+    """
+    out = dict(_PROGRAM_CACHE_STATS, programs=len(_PROGRAM_CACHE))
+    for k, v in _WORKER_CACHE_STATS.items():
+        out[k] += v
+    return out
+
+def add_program_cache_stats(stats):
+    """Add program lookup statistics from a worker process to the totals for this process.
+    """
+    for k in _WORKER_CACHE_STATS:
+        _WORKER_CACHE_STATS[k] += stats.get(k, 0)
 
 def _get_check_program_cmd(fn):
+    """Find the full path to a program, returning it with the number of filesystem checks needed.
+    """
     def wrap(name, pconfig, config, default):
-        is_ok = lambda f: os.path.isfile(f) and os.access(f, os.X_OK)
+        checks = [0]
+        def is_ok(f):
+            checks[0] += 1
+            return os.path.isfile(f) and os.access(f, os.X_OK)
         bcbio_system = config.get("bcbio_system", None)
         if bcbio_system:
             system_bcbio_path = os.path.join(os.path.dirname(bcbio_system),
                                              os.pardir, "anaconda", "bin", name)
             if is_ok(system_bcbio_path):
-                return system_bcbio_path
+                return system_bcbio_path, checks[0]
         # support bioconda installed programs
         if is_ok(os.path.join(os.path.dirname(sys.executable), name)):
-            return (os.path.join(os.path.dirname(sys.executable), name))
+            return (os.path.join(os.path.dirname(sys.executable), name)), checks[0]
         # find system bioconda installed programs if using private code install
         program = expand_path(fn(name, pconfig, config, default))
         if is_ok(program):
-            return program
+            return program, checks[0]
         # search the PATH now
         for adir in os.environ['PATH'].split(":"):
             if is_ok(os.path.join(adir, program)):
-                return os.path.join(adir, program)
-        raise CmdNotFound(" ".join(map(repr, (fn.func_name, name, pconfig, default))))
+                return os.path.join(adir, program), checks[0]
+        raise CmdNotFound(" ".join(map(repr, (fn.__name__, name, pconfig, default))))
     return wrap
 
 @_get_check_program_cmd
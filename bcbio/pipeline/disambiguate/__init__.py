@@ -17,7 +17,9 @@ import shutil
 from bcbio import utils
 from bcbio.distributed.transaction import file_transaction
 from bcbio.pipeline.disambiguate.run import main as disambiguate_main
+from bcbio.pipeline.disambiguate import pdxfilter
 from bcbio.pipeline.disambiguate.pdxfilter import PDXFilter
+from bcbio.distributed.multi import run_multicore, zeromq_aware_logging
 from bcbio.pipeline import datadict as dd
 from bcbio.pipeline import config_utils, merge, run_info
 from bcbio.provenance import do
@@ -221,17 +223,21 @@ def run(items, config):
             logger.info('Disambiguate run with sorted prep work bam a {} and tx out dir {}'.format(work_bam_a_nsorted, tx_out_dir))
             tmp_base_name = os.path.join(tx_out_dir, os.path.basename(base_name))
             logger.info('Disambiguate run with sorted prep work bam a {} and tmp_base_name {}'.format(work_bam_a_nsorted, tmp_base_name))
-            pdx_filter = PDXFilter(work_bam_a, work_bam_b,
-                                   "%s.human.bam" % tmp_base_name,
-                                   # Must be bam else it will not be merged
-                                   "%s.explant.bam" % tmp_base_name,
-                                   # Must be bam else it will not be merged
-                                   "%s.ambiguous.bam" % tmp_base_name,
-                                   # Must be bam else it will not be merged
-                                   "%s_summary.txt" % tmp_base_name,
-                                   hard_filter=True,
-                                   debug=True)
-            pdx_filter.run()
+            cores = config["algorithm"].get("num_cores", 1)
+            if cores > 1:
+                _run_pdx_filter_sharded(work_bam_a, work_bam_b, tmp_base_name, cores, config)
+            else:
+                pdx_filter = PDXFilter(work_bam_a, work_bam_b,
+                                       "%s.human.bam" % tmp_base_name,
+                                       # Must be bam else it will not be merged
+                                       "%s.explant.bam" % tmp_base_name,
+                                       # Must be bam else it will not be merged
+                                       "%s.ambiguous.bam" % tmp_base_name,
+                                       # Must be bam else it will not be merged
+                                       "%s_summary.txt" % tmp_base_name,
+                                       hard_filter=True,
+                                       debug=True)
+                pdx_filter.run()
 
         # Perhaps this can be removed since it has been fixed in bcbio
         if data_a.get("align_split"):
@@ -284,3 +290,24 @@ def run(items, config):
         pass
 
     return [[data_a]]
+
+def _run_pdx_filter_sharded(work_bam_a, work_bam_b, tmp_base_name, cores, config):
+    """Disambiguate query name sorted BAMs in shards across multiple cores.
+
+    Uses twice as many shards as cores to even out differences in the
+    number of reads aligning to both organisms between shards.
+    """
+    parallel = {"type": "local", "num_jobs": cores, "cores_per_job": 1}
+    def _map_shards(xs):
+        return run_multicore(_pdx_filter_shard, [[x, config] for x in xs], config, parallel)
+    return pdxfilter.run_sharded(work_bam_a, work_bam_b,
+                                 "%s.human.bam" % tmp_base_name,
+                                 "%s.explant.bam" % tmp_base_name,
+                                 "%s.ambiguous.bam" % tmp_base_name,
+                                 "%s_summary.txt" % tmp_base_name,
+                                 hard_filter=True, num_shards=cores * 2, map_fn=_map_shards)
+
+@utils.map_wrap
+@zeromq_aware_logging
+def _pdx_filter_shard(args, config):
+    return [pdxfilter.run_shard(args)]
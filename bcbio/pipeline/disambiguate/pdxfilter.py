@@ -2,13 +2,17 @@
 import time
 import re
 import sys
-import pysam
 import logging
 import os
 import errno
+import struct
+import zlib
 from operator import itemgetter
 from argparse import ArgumentParser, RawTextHelpFormatter
 from collections import defaultdict
+from bcbio import utils
+
+pysam = utils.LazyImport("pysam")
 
 logging_formater = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger           = logging.getLogger()
@@ -60,12 +64,362 @@ def greater_lexicographic(name_1, name_2):
     return name_1 > name_2
 
 
+def lexicographic_key(string):
+    return string
+
+
+# Comparison and sort key functions for each supported query name ordering
+SORT_ORDERS = {'natural': (greater_natural, convert_alphanumeric),
+               'lexicographic': (greater_lexicographic, lexicographic_key)}
+
+
+def infer_sort_order(names):
+    """ Infer the ordering of a sequence of query names, preferring natural
+        (samtools) over lexicographic (sambamba) sort. Returns None if the
+        names follow neither ordering.
+    """
+
+    natural_sort       = True
+    lexicographic_sort = True
+    current_name       = None
+    current_key        = None
+
+    for name in names:
+
+        if current_name is None:
+            current_name = name
+            current_key  = convert_alphanumeric(name)
+
+        elif name != current_name:
+
+            key = convert_alphanumeric(name)
+
+            if natural_sort and not key > current_key:
+                natural_sort = False
+
+            if lexicographic_sort and not name > current_name:
+                lexicographic_sort = False
+
+            if not natural_sort and not lexicographic_sort:
+                return None
+
+            current_name = name
+            current_key  = key
+
+    return 'natural' if natural_sort else 'lexicographic'
+
+
+# BGZF block header: gzip magic with the FEXTRA flag and a 'BC' block size subfield
+BGZF_HEADER     = re.compile(b'\x1f\x8b\x08\x04.{6}\x06\x00BC\x02\x00', re.DOTALL)
+BGZF_MAX_BLOCK  = 65536
+BAM_FIXED       = struct.Struct('<iiiBBHHHiiii')
+# Valid SAM query name characters, [!-?A-~]
+QNAME_CHARS     = frozenset(range(0x21, 0x40)) | frozenset(range(0x41, 0x7f))
+
+
+def bgzf_block_size(header):
+    return struct.unpack('<H', header[16:18])[0] + 1
+
+
+def find_bgzf_block(handle, offset, file_size):
+    """ Return the compressed offset of the first BGZF block starting at or
+        after offset, or None past the last block. Candidate headers must be
+        followed by another block header or the end of the file.
+    """
+
+    while offset < file_size:
+        handle.seek(offset)
+        data = handle.read(2 * BGZF_MAX_BLOCK)
+        for match in BGZF_HEADER.finditer(data):
+            start      = offset + match.start()
+            next_start = start + bgzf_block_size(data[match.start():match.start() + 18])
+            if next_start == file_size:
+                return start
+            handle.seek(next_start)
+            if BGZF_HEADER.match(handle.read(18)):
+                return start
+        if offset + len(data) >= file_size:
+            break
+        # overlap reads so headers spanning a read boundary are found
+        offset += len(data) - 17
+    return None
+
+
+def read_bgzf_block(handle, offset):
+    """ Decompress the BGZF block at a compressed offset, returning the data
+        and the offset of the following block.
+    """
+
+    handle.seek(offset)
+    header = handle.read(18)
+    size   = bgzf_block_size(header)
+    data   = handle.read(size - 18)
+    return zlib.decompress(data[:-8], -15), offset + size
+
+
+def valid_alignments(data, start, num_references, check=2):
+    """ Check that uncompressed BAM data holds consistent alignment records
+        from start, up to check records or the end of the data.
+    """
+
+    # fixed length fields following block_size, which excludes itself
+    fixed = BAM_FIXED.size - 4
+    found = 0
+    while found < check and start + BAM_FIXED.size <= len(data):
+        (block_size, ref_id, pos, l_read_name, _, _, n_cigar_op, _, l_seq,
+         next_ref_id, next_pos, _) = BAM_FIXED.unpack_from(data, start)
+        if l_read_name < 2 or l_seq < 0 or \
+                not -1 <= ref_id < num_references or not -1 <= next_ref_id < num_references or \
+                pos < -1 or next_pos < -1 or \
+                fixed + l_read_name + 4 * n_cigar_op + (l_seq + 1) // 2 + l_seq > block_size:
+            return False
+        name_start = start + BAM_FIXED.size
+        name       = bytearray(data[name_start:name_start + l_read_name])
+        if len(name) < l_read_name:
+            break
+        if name[-1] != 0 or not all(c in QNAME_CHARS for c in name[:-1]):
+            return False
+        found += 1
+        start += 4 + block_size
+    return found > 0
+
+
+def find_alignment_start(handle, offset, file_size, num_references):
+    """ Return the virtual offset of the first alignment starting in a BGZF
+        block at or after a compressed offset, or None if there is none.
+
+        Records usually start blocks, but may span them, so each position in
+        the block is checked for a run of consistent alignment records.
+    """
+
+    block_start = find_bgzf_block(handle, offset, file_size)
+    while block_start is not None and block_start < file_size:
+        block, next_start = read_bgzf_block(handle, block_start)
+        data = block
+        # include following blocks so records spanning them can be checked
+        follow = next_start
+        while follow < file_size and len(data) < len(block) + 2 * BGZF_MAX_BLOCK:
+            extra, follow = read_bgzf_block(handle, follow)
+            if not extra:
+                break
+            data += extra
+        for i in range(len(block)):
+            if valid_alignments(data, i, num_references):
+                return (block_start << 16) | i
+        block_start = next_start
+    return None
+
+
+def next_query(in_bam):
+    """ Read from the current position of a query name sorted BAM to the start
+        of the next query, returning its virtual offset and name. Returns
+        (None, None) at the end of the file.
+    """
+
+    current_name = None
+    while True:
+        offset = in_bam.tell()
+        try:
+            alignment = next(in_bam)
+        except StopIteration:
+            return None, None
+        if current_name is not None and alignment.qname != current_name:
+            return offset, alignment.qname
+        current_name = alignment.qname
+
+
+def find_query_start(in_bam, handle, key, sort_key, lower, file_size):
+    """ Find the virtual offset of the first query sorting at or after key,
+        searching from a virtual offset known to precede it.
+
+        Bisects on compressed offsets, re-synchronising to alignment records
+        at each step, then reads forward over the remaining few blocks.
+    """
+
+    low, high = lower >> 16, file_size
+    while high - low > 4 * BGZF_MAX_BLOCK:
+        middle = (low + high) // 2
+        start  = find_alignment_start(handle, middle, file_size, in_bam.nreferences)
+        name   = None
+        if start is not None and start > lower:
+            in_bam.seek(start)
+            try:
+                name = next(in_bam).qname
+            except StopIteration:
+                pass
+        if name is None or sort_key(name) >= key:
+            high = middle
+        else:
+            low, lower = middle, start
+
+    in_bam.seek(lower)
+    while True:
+        offset = in_bam.tell()
+        try:
+            alignment = next(in_bam)
+        except StopIteration:
+            return offset
+        if sort_key(alignment.qname) >= key:
+            return offset
+
+
+def find_shards(human_sam_path, explant_sam_path, num_shards, check_first=10000):
+    """ Split a pair of query name sorted BAM files into aligned shards for
+        parallel disambiguation.
+
+        Shard boundaries in the human file are placed at the first query name
+        change after evenly spaced compressed file positions, seeking to each
+        position rather than reading the whole file. The explant file is split
+        at the first query sorting at or after each boundary name, found by
+        bisection. All alignments of a query therefore fall in the same shard
+        of both files. Returns the sort order and a list of shards, each a
+        dictionary of (start, end) BGZF virtual offsets for the human and
+        explant files.
+    """
+
+    with pysam.AlignmentFile(human_sam_path, 'rb', check_sq=False) as in_bam, \
+            open(human_sam_path, 'rb') as handle:
+        first_offset = in_bam.tell()
+        names        = []
+        for alignment in in_bam:
+            if not names or alignment.qname != names[-1]:
+                if len(names) >= check_first:
+                    break
+                names.append(alignment.qname)
+
+        sort_order = infer_sort_order(names)
+        if sort_order is None:
+            raise RuntimeError('Disambiguation: SAM/BAM file does not appear to be ordered by query name: {}'.format(human_sam_path))
+
+        file_size     = os.path.getsize(human_sam_path)
+        boundaries    = []
+        human_offsets = [first_offset]
+        for i in range(num_shards - 1):
+            target = file_size * (i + 1) // num_shards
+            if target <= (first_offset >> 16):
+                continue
+            start = find_alignment_start(handle, target, file_size, in_bam.nreferences)
+            if start is None:
+                break
+            in_bam.seek(max(start, human_offsets[-1]))
+            offset, name = next_query(in_bam)
+            if offset is None:
+                break
+            if offset > human_offsets[-1]:
+                human_offsets.append(offset)
+                boundaries.append(name)
+
+        human_offsets.append(None)
+
+    sort_key = SORT_ORDERS[sort_order][1]
+
+    with pysam.AlignmentFile(explant_sam_path, 'rb', check_sq=False) as in_bam, \
+            open(explant_sam_path, 'rb') as handle:
+        file_size       = os.path.getsize(explant_sam_path)
+        explant_offsets = [in_bam.tell()]
+        for name in boundaries:
+            explant_offsets.append(find_query_start(in_bam, handle, sort_key(name), sort_key,
+                                                    explant_offsets[-1], file_size))
+        explant_offsets.append(None)
+
+    shards = []
+    for i in range(len(boundaries) + 1):
+        shards.append({'human': (human_offsets[i], human_offsets[i + 1]),
+                       'explant': (explant_offsets[i], explant_offsets[i + 1])})
+
+    return sort_order, shards
+
+
+def write_summary(summary_path, sample_name, human_count, explant_count, ambiguous_count):
+
+    with open(summary_path, 'w') as summary_file:
+
+        header = ['sample', 'unique species A pairs',
+                  'unique species B pairs', 'ambiguous pairs']
+        summary_file.write('\t'.join(header) + '\n')
+
+        content = [sample_name,
+                   human_count,
+                   explant_count,
+                   ambiguous_count]
+
+        summary_file.write('\t'.join(map(str, content)) + '\n')
+
+
+def run_shard(args):
+    """ Disambiguate a single shard from find_shards, returning the human,
+        explant and ambiguous counts. Takes a single argument list for use
+        with multiprocessing map functions.
+    """
+
+    (human_sam_path, explant_sam_path, output_human_sam_path, output_explant_sam_path,
+     output_ambiguous_sam_path, sort_order, shard, hard_filter) = args
+
+    pdx_filter = PDXFilter(human_sam_path, explant_sam_path,
+                           output_human_sam_path, output_explant_sam_path,
+                           output_ambiguous_sam_path,
+                           hard_filter=hard_filter,
+                           sort_order=sort_order,
+                           human_region=shard['human'],
+                           explant_region=shard['explant'])
+    return pdx_filter.run()
+
+
+def run_sharded(human_sam_path, explant_sam_path,
+                output_human_sam_path, output_explant_sam_path,
+                output_ambiguous_sam_path, summary_path=None,
+                hard_filter=True, num_shards=1, map_fn=None):
+    """ Disambiguate shards of a pair of query name sorted BAM files in
+        parallel, merging the outputs and summary counts.
+
+        map_fn takes run_shard arguments for each shard and returns a list of
+        counts; by default shards run serially. Outputs are concatenated in
+        shard order so they retain the query name ordering of the inputs.
+    """
+
+    outputs = [output_human_sam_path, output_explant_sam_path, output_ambiguous_sam_path]
+    for output in outputs:
+        if not output.endswith('.bam'):
+            raise ValueError('Disambiguation: sharded runs require BAM output files: {}'.format(output))
+        mkdir(output)
+
+    sort_order, shards = find_shards(human_sam_path, explant_sam_path, num_shards)
+
+    shard_outputs = [['{}.shard{}.bam'.format(os.path.splitext(output)[0], i)
+                      for output in outputs]
+                     for i in range(len(shards))]
+    if map_fn is None:
+        map_fn = lambda xs: [run_shard(x) for x in xs]
+    counts = map_fn([[human_sam_path, explant_sam_path] + shard_outputs[i] +
+                     [sort_order, shard, hard_filter]
+                     for i, shard in enumerate(shards)])
+
+    for i, output in enumerate(outputs):
+        in_files = [x[i] for x in shard_outputs]
+        if len(in_files) == 1:
+            os.rename(in_files[0], output)
+        else:
+            pysam.cat('-o', output, *in_files)
+            for in_file in in_files:
+                os.remove(in_file)
+
+    human_count, explant_count, ambiguous_count = [sum(x) for x in zip(*counts)]
+
+    if summary_path:
+        mkdir(summary_path)
+        sample_name = os.path.splitext(os.path.basename(human_sam_path))[0]
+        write_summary(summary_path, sample_name, human_count, explant_count, ambiguous_count)
+
+    return (human_count, explant_count, ambiguous_count)
+
+
 class PDXFilter(object):
 
     def __init__(self, human_sam_path, explant_sam_path,
                  output_human_sam_path, output_explant_sam_path,
                  output_ambiguous_sam_path, summary_path=None,
-                 hard_filter=True, debug=False):
+                 hard_filter=True, debug=False, sort_order=None,
+                 human_region=None, explant_region=None):
 
         self.input_human_sam_path   = human_sam_path
         self.input_explant_sam_path = explant_sam_path
@@ -82,8 +436,17 @@ class PDXFilter(object):
         # go to human while all other alignments go to ambiguous.
         self.hard_filter = hard_filter
 
-        # Ordering scheme of the SAM/BAM files
-        self.greater = None
+        # Ordering scheme of the SAM/BAM files, inferred from the first
+        # alignments unless specified
+        self.greater  = None
+        self.sort_key = None
+        if sort_order:
+            self.greater, self.sort_key = SORT_ORDERS[sort_order]
+
+        # Optional (start, end) BGZF virtual offsets restricting processing
+        # to a shard of the input files, as produced by find_shards
+        self.human_region   = human_region
+        self.explant_region = explant_region
 
         # Set output paths
         self.output_human_sam_path      = output_human_sam_path
@@ -129,90 +492,84 @@ class PDXFilter(object):
 
     def set_sort_order(self, alignments):
 
-        natural_sort       = True
-        lexicographic_sort = True
-        current_name       = None
-
-        for alignment in alignments:
-
-            # Set first query name
-            if not current_name:
-
-                current_name = alignment.qname
-                continue
-
-            elif current_name != alignment.qname:
-
-                # Check for natural sort order
-                if not greater_natural(alignment.qname, current_name):
-                    natural_sort = False
-
-                # Check for lexicographic sort order
-                if not greater_lexicographic(alignment.qname, current_name):
-                    lexicographic_sort = False
-
-                if not natural_sort and not lexicographic_sort:
-                    break
-
-                current_name = alignment.qname
+        sort_order = infer_sort_order(alignment.qname for alignment in alignments)
 
         # We prefer natural sort since use of samtools is more common
-        if natural_sort:
+        if sort_order == 'natural':
             logging.info('Disambiguation: Assuming natural (mixed) sort order of both input SAM/BAM files.')
-            self.greater = greater_natural
 
-        elif lexicographic_sort:
+        elif sort_order == 'lexicographic':
             logging.info('Disambiguation: Assuming lexicographic sort order of both input SAM/BAM files.')
-            self.greater = greater_lexicographic
 
         # If the ordering does not correspond to any known order
         else:
             raise RuntimeError('Disambiguation: SAM/BAM file does not appear to be ordered by query name. Using human alignment {} and explant alignment {}.'.format(self.input_human_sam_path, self.input_explant_sam_path))
 
-    def iter_sam_file(self, sam_file, check_first=10000):
+        self.greater, self.sort_key = SORT_ORDERS[sort_order]
+
+    def iter_region(self, sam_file, region):
+        """ Iterate over alignments between two virtual offsets, with an end
+            of None reading to the end of the file.
+        """
+
+        if region is None:
+            for alignment in sam_file.fetch(until_eof=True,
+                                            multiple_iterators=False):
+                yield alignment
+
+        else:
+            start, end = region
+            sam_file.seek(start)
+            while end is None or sam_file.tell() < end:
+                try:
+                    alignment = next(sam_file)
+                except StopIteration:
+                    break
+                yield alignment
+
+    def iter_sam_file(self, sam_file, check_first=10000, region=None):
 
         alignments = []
         num_alignments = 0
         try:
-		    for i, alignment in enumerate(sam_file.fetch(until_eof=True,
-		                                                 multiple_iterators=False)):
-
-		        num_alignments += 1
-
-		        # If we know the sort order, we continue
-		        if self.greater:
-		            yield(alignment)
-		            continue
-
-		        # Else w cache the first N alignments
-		        elif i < check_first:
-		            alignments.append(alignment)
-		            continue
-
-		        # Or infer the sort order baed on the cache
-		        else:
-		            self.set_sort_order(alignments)
-
-		            # We can yield the stored alignments now that the sort order is inferred
-		            for cached_alignment in alignments:
-		                yield cached_alignment
-		            alignments = []
-		            yield alignment
-
-		    # If we had less than check_first alignments in the file, we have to determine
-		    # sort order based on that
-		    if not self.greater:
-		        self.set_sort_order(alignments)
-		        for cached_alignment in alignments:
-		            yield cached_alignment
-
-		    logging.info('Disambiguation: a SAM file resulted in {} alignments'.format(num_alignments))
-		    
+            for i, alignment in enumerate(self.iter_region(sam_file, region)):
+
+                num_alignments += 1
+
+                # If we know the sort order, we continue
+                if self.greater:
+                    yield(alignment)
+                    continue
+
+                # Else w cache the first N alignments
+                elif i < check_first:
+                    alignments.append(alignment)
+                    continue
+
+                # Or infer the sort order baed on the cache
+                else:
+                    self.set_sort_order(alignments)
+
+                    # We can yield the stored alignments now that the sort order is inferred
+                    for cached_alignment in alignments:
+                        yield cached_alignment
+                    alignments = []
+                    yield alignment
+
+            # If we had less than check_first alignments in the file, we have to determine
+            # sort order based on that
+            if not self.greater:
+                self.set_sort_order(alignments)
+                for cached_alignment in alignments:
+                    yield cached_alignment
+
+            logging.info('Disambiguation: a SAM file resulted in {} alignments'.format(num_alignments))
+
         except:
             logging.error('Disambiguation: Error with human alignment {} and/or explant alignment {}.'.format(self.input_human_sam_path, self.input_explant_sam_path))
             raise
 
-    def get_query_bundles(self, sam_file):
+    def get_query_bundles(self, sam_file, region=None):
         """ Generatator that bundles multiple (multimapping) alignment of the
             same query read. Does not seperate paired ends within the bundles,
             i.e. bundles contain paired ends in an arbitrary order.
@@ -222,8 +579,9 @@ class PDXFilter(object):
         num_alignments = 0
         bundle       = []
         current_name = None
+        current_key  = None
 
-        for alignment in self.iter_sam_file(sam_file):
+        for alignment in self.iter_sam_file(sam_file, region=region):
 
             num_alignments += 1
 
@@ -231,6 +589,7 @@ class PDXFilter(object):
             if current_name is None:
 
                 current_name = alignment.qname
+                current_key  = self.sort_key(current_name)
                 bundle       = [alignment]
                 continue
 
@@ -241,8 +600,11 @@ class PDXFilter(object):
             # A new bundle (alignments with another read name) begins
             else:
 
+                # Sort keys are computed once per query name rather than per comparison
+                key = self.sort_key(alignment.qname)
+
                 # Fall back to lexicographic ordering
-                if not self.greater(alignment.qname, current_name):
+                if not key > current_key:
 
                     message = 'Disambiguation: SAM/BAM file does not appear to be ordered by'\
                               ' query name ({} is not greater {})'\
@@ -254,7 +616,8 @@ class PDXFilter(object):
 
                     if self.greater is greater_natural and \
                             greater_lexicographic(alignment.qname, current_name):
-                        self.greater = greater_lexicographic
+                        self.greater, self.sort_key = SORT_ORDERS['lexicographic']
+                        key = self.sort_key(alignment.qname)
                         logging.warn(message + ' Falling back to lexicographic ordering.')
                     else:
                         raise ValueError(message)
@@ -268,6 +631,7 @@ class PDXFilter(object):
 
                 # Rewrite information with new bundle
                 current_name = alignment.qname
+                current_key  = key
                 bundle       = [alignment]
 
         if not bundle:
@@ -281,9 +645,11 @@ class PDXFilter(object):
         if num_bundles == 0:
             logging.warn('Disambiguation: Did not receive any alignment bundles from either human SAM {} or explant SAM {}'.format(self.input_human_sam_path, self.input_explant_sam_path))
 
-        yield (current_name, bundle)
+        # Shards of the explant file can be empty, so only return non-empty bundles
+        if bundle:
+            yield (current_name, bundle)
 
-    def get_paired_query_bundles(self, sam_file):
+    def get_paired_query_bundles(self, sam_file, region=None):
         """ Generatator that bundles multiple (multimapping) alignment of the
             same query read. Seperates paired ends within the bundles,
             i.e. bundles contain tuples of paired ends. Note that paired ends
@@ -292,7 +658,7 @@ class PDXFilter(object):
             ends manually across the whole query bundle.
         """
 
-        for name, bundle in self.get_query_bundles(sam_file):
+        for name, bundle in self.get_query_bundles(sam_file, region):
 
             # Do sanity check on query names
             query_names = set([alignment.qname for alignment in bundle])
@@ -377,10 +743,13 @@ class PDXFilter(object):
 
     def get_matched_query_bundles(self):
 
-        human_queries   = iter(self.get_paired_query_bundles(self.human_sam_file))
-        explant_queries = iter(self.get_paired_query_bundles(self.explant_sam_file))
+        human_queries   = iter(self.get_paired_query_bundles(self.human_sam_file,
+                                                              self.human_region))
+        explant_queries = iter(self.get_paired_query_bundles(self.explant_sam_file,
+                                                              self.explant_region))
 
         last_explant_name          = None
+        last_explant_key           = None
         last_explant_paired_bundle = None
 
         for human_name, human_paired_bundle in human_queries:
@@ -391,6 +760,14 @@ class PDXFilter(object):
                 yield (human_paired_bundle, last_explant_paired_bundle)
                 continue
 
+            human_key = self.sort_key(human_name)
+
+            # The over-stepped record is still ahead of this human record,
+            # so keep it for a later match
+            if last_explant_name is not None and last_explant_key > human_key:
+                yield (human_paired_bundle, None)
+                continue
+
             # Seek to matching explant query record
             while True:
 
@@ -411,9 +788,12 @@ class PDXFilter(object):
 
                 # We sought one step too far without finding a matching record,
                 # producing one over-stepped record
-                elif self.greater(explant_name, human_name):
+                explant_key = self.sort_key(explant_name)
+
+                if explant_key > human_key:
 
                     last_explant_name          = explant_name
+                    last_explant_key           = explant_key
                     last_explant_paired_bundle = explant_paired_bundle
 
                     # Also, we can directly return the human record since it
@@ -651,22 +1031,20 @@ class PDXFilter(object):
         self.output_ambiguous_sam_file.close()
         self.output_explant_sam_file.close()
 
-        if self.summary_path:
-
-            with open(self.summary_path, 'w') as summary_file:
+        self.human_sam_file.close()
+        self.explant_sam_file.close()
 
-                header = ['sample', 'unique species A pairs',
-                          'unique species B pairs', 'ambiguous pairs']
-                summary_file.write('\t'.join(header) + '\n')
-
-                sample_name = os.path.splitext(os.path.basename(self.input_human_sam_path))[0]
+        if self.summary_path:
 
-                content = [sample_name,
-                           self.human_bundles_count,
-                           self.explant_bundles_count,
-                           self.ambiguous_bundles_count]
+            sample_name = os.path.splitext(os.path.basename(self.input_human_sam_path))[0]
+            write_summary(self.summary_path, sample_name,
+                          self.human_bundles_count,
+                          self.explant_bundles_count,
+                          self.ambiguous_bundles_count)
 
-                summary_file.write('\t'.join(map(str, content)) + '\n')
+        return (self.human_bundles_count,
+                self.explant_bundles_count,
+                self.ambiguous_bundles_count)
 
 if __name__ == '__main__':
 
@@ -701,16 +1079,38 @@ if __name__ == '__main__':
                         help='Enable debug output')
     parser.add_argument('--summary_path', default='',
                         help='Output to text-delimited text file with filtering statistics')
+    parser.add_argument('--cores', type=int, default=1,
+                        help='Disambiguate shards of BAM inputs in parallel on this many cores')
     args = parser.parse_args()
 
     hard_filter = not args.soft_filter
 
-    pdx_filter = PDXFilter(args.human_sam_path,
-                           args.explant_sam_path,
-                           args.output_human_sam_path,
-                           args.output_explant_sam_path,
-                           args.output_ambiguous_sam_path,
-                           args.summary_path,
-                           hard_filter=hard_filter,
-                           debug=args.debug)
-    pdx_filter.run()
+    if args.cores > 1:
+
+        import multiprocessing
+        pool = multiprocessing.Pool(args.cores)
+        try:
+            run_sharded(args.human_sam_path,
+                        args.explant_sam_path,
+                        args.output_human_sam_path,
+                        args.output_explant_sam_path,
+                        args.output_ambiguous_sam_path,
+                        args.summary_path,
+                        hard_filter=hard_filter,
+                        num_shards=args.cores,
+                        map_fn=lambda xs: pool.map(run_shard, xs, chunksize=1))
+        finally:
+            pool.close()
+            pool.join()
+
+    else:
+
+        pdx_filter = PDXFilter(args.human_sam_path,
+                               args.explant_sam_path,
+                               args.output_human_sam_path,
+                               args.output_explant_sam_path,
+                               args.output_ambiguous_sam_path,
+                               args.summary_path,
+                               hard_filter=hard_filter,
+                               debug=args.debug)
+        pdx_filter.run()
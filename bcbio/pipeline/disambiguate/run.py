@@ -26,17 +26,35 @@ Included in bcbio-nextgen from: https://github.com/mjafin/disambiguate
 
 
 from __future__ import print_function
-import sys, re, pysam
+import sys, re
 from array import array
 from os import path, makedirs
 from argparse import ArgumentParser, RawTextHelpFormatter
 
+from bcbio import utils
+
+pysam = utils.LazyImport("pysam")
+
+PATTERN_INTEGER = re.compile('([0-9]+)')
+_natural_keys = {}
+
+# split string to piecewise strings and string numbers, converting numbers to int.
+# the main loop compares the current human and mouse names many times, so keys
+# for recently seen names are kept rather than re-splitting on every comparison
+def natural_key(name):
+    key = _natural_keys.get(name)
+    if key is None:
+        if len(_natural_keys) > 10000:
+            _natural_keys.clear()
+        key = [int(c) if c.isdigit() else c for c in PATTERN_INTEGER.split(name)]
+        _natural_keys[name] = key
+    return key
+
 # "natural comparison" for strings
 def nat_cmp(a, b):
-    convert = lambda text: int(text) if text.isdigit() else text # lambda function to convert text to int if number present
-    alphanum_key = lambda key: [ convert(c) for c in re.split('([0-9]+)', key) ] # split string to piecewise strings and string numbers
-    #return cmp(alphanum_key(a), alphanum_key(b)) # use internal cmp to compare piecewise strings and numbers
-    return (alphanum_key(a) > alphanum_key(b))-(alphanum_key(a) < alphanum_key(b))
+    ka = natural_key(a)
+    kb = natural_key(b)
+    return (ka > kb)-(ka < kb)
 
 # read reads into a list object for as long as the read qname is constant (sorted file). Return the first read with new qname or None
 def read_next_reads(fileobject, listobject):
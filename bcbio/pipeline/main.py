@@ -12,7 +12,7 @@ import tempfile
 
 from bcbio import log, heterogeneity, hla, structural, utils
 from bcbio.cwl.inspect import initialize_watcher
-from bcbio.distributed import prun
+from bcbio.distributed import multi, prun
 from bcbio.distributed.transaction import tx_tmpdir
 from bcbio.log import logger, DEFAULT_LOG_DIR
 from bcbio.ngsalign import alignprep
@@ -82,9 +82,15 @@ def _run_toplevel(config, config_file, work_dir, parallel,
     system.write_info(dirs, parallel, config)
     with tx_tmpdir(config if parallel.get("type") == "local" else None) as tmpdir:
         tempfile.tempdir = tmpdir
-        for pipeline, samples in pipelines.items():
-            for xs in pipeline(config, run_info_yaml, parallel, dirs, samples):
-                pass
+        with multi.worker_pool(), prun.reuse_clusters(parallel):
+            for pipeline, samples in pipelines.items():
+                for xs in pipeline(config, run_info_yaml, parallel, dirs, samples):
+                    pass
+    prog_stats = config_utils.get_program_cache_stats()
+    logger.debug("Program lookups across local processes: %s, %s resolved on the filesystem, "
+                 "%s from cache avoiding %s filesystem checks" %
+                 (prog_stats["lookups"], prog_stats["programs"], prog_stats["hits"],
+                  prog_stats["checks_saved"]))
 
 # ## Generic pipeline framework
 
@@ -3,7 +3,9 @@
 Handle splitting and analysis of files from chromosomal subsets separated by
 no-read regions.
 """
+import bisect
 import collections
+import math
 import os
 
 import toolz as tz
@@ -34,6 +36,104 @@ def to_safestr(region):
     else:
         return "_".join([str(x) for x in region])
 
+# ## Region costs
+#
+# Estimated run time of a region is its length multiplied by the mean coverage
+# from mosdepth.
+
+# depth file -> ((mtime, size), per-chromosome depths), also kept in pool workers
+_DEPTH_CACHE = {}
+
+def _read_region_depths(depth_file):
+    """Read mosdepth region depths into per-chromosome sorted start, end, depth lists.
+
+    Cached by file, re-reading files changed since the last read.
+    """
+    stat = os.stat(depth_file)
+    file_key = (stat.st_mtime, stat.st_size)
+    cached = _DEPTH_CACHE.get(depth_file)
+    if cached is None or cached[0] != file_key:
+        by_chrom = collections.defaultdict(list)
+        with utils.open_gzipsafe(depth_file) as in_handle:
+            for line in in_handle:
+                parts = line.rstrip().split("\t")
+                if len(parts) >= 4 and not parts[0].startswith(("track", "browser", "#")):
+                    by_chrom[parts[0]].append((int(parts[1]), int(parts[2]), float(parts[-1])))
+        out = {}
+        for chrom, intervals in by_chrom.items():
+            intervals.sort()
+            out[chrom] = tuple(list(xs) for xs in zip(*intervals))
+        cached = (file_key, out)
+        _DEPTH_CACHE[depth_file] = cached
+    return cached[1]
+
+def _mean_depth(region, depths):
+    """Length weighted mean depth of a region from sorted mosdepth intervals.
+    """
+    chrom, start, end = region
+    if chrom not in depths:
+        return None
+    starts, ends, vals = depths[chrom]
+    i = max(bisect.bisect_right(starts, start) - 1, 0)
+    covered = 0
+    total = 0.0
+    while i < len(starts) and starts[i] < end:
+        overlap = min(end, ends[i]) - max(start, starts[i])
+        if overlap > 0:
+            covered += overlap
+            total += overlap * vals[i]
+        i += 1
+    return total / covered if covered else None
+
+def _get_region_depths(data):
+    depth_file = tz.get_in(["depth", "variant_regions", "regions"], data)
+    if depth_file and os.path.exists(depth_file):
+        return _read_region_depths(depth_file)
+    return {}
+
+def region_cost(region, data, depths=None):
+    """Estimate relative cost of processing a region: length x mean depth.
+    """
+    chrom, start, end = region[:3]
+    depths = _get_region_depths(data) if depths is None else depths
+    depth = _mean_depth((chrom, start, end), depths) if depths else None
+    return float(end - start) * (depth if depth else 1.0)
+
+def sort_by_cost(regions, data, key=None):
+    """Sort regions by estimated cost, most expensive first, to avoid lagging runs at the end.
+
+    key retrieves the (chrom, start, end) region from each item, for sorting
+    items carrying additional information.
+    """
+    depths = _get_region_depths(data)
+    key = key or (lambda x: x)
+    return sorted(regions, key=lambda x: region_cost(key(x), data, depths), reverse=True)
+
+def partition_by_cost(regions, num_blocks, data):
+    """Partition ordered regions into contiguous blocks of balanced estimated cost.
+
+    Blocks remain in genome order since region block outputs get concatenated
+    in order. A single expensive region ends a block instead of being grouped
+    with other work.
+    """
+    if num_blocks <= 1 or len(regions) <= 1:
+        return [regions] if regions else []
+    depths = _get_region_depths(data)
+    costs = [region_cost(r, data, depths) for r in regions]
+    target = sum(costs) / num_blocks
+    out = []
+    cur = []
+    cum = 0.0
+    for region, cost in zip(regions, costs):
+        if cur and cum + cost / 2.0 > target * (len(out) + 1):
+            out.append(cur)
+            cur = []
+        cur.append(region)
+        cum += cost
+    if cur:
+        out.append(cur)
+    return out
+
 # ## Split and delayed BAM combine
 
 def _split_by_regions(dirname, out_ext, in_key):
@@ -42,11 +142,7 @@ def _split_by_regions(dirname, out_ext, in_key):
     def _do_work(data):
         # XXX Need to move retrieval of regions into preparation to avoid
         # need for files when running in non-shared filesystems
-        regions = _get_parallel_regions(data)
-        def _sort_by_size(region):
-            _, start, end = region
-            return end - start
-        regions.sort(key=_sort_by_size, reverse=True)
+        regions = sort_by_cost(_get_parallel_regions(data), data)
         bam_file = data[in_key]
         if bam_file is None:
             return None, []
@@ -92,9 +188,10 @@ def get_parallel_regions_block(batch):
     samples = [utils.to_single_data(d) for d in batch]
     regions = _get_parallel_regions(samples[0])
     out = []
-    # Currently don't have core information here so aim for about 10 items per partition
-    n = 10
-    for region_block in tz.partition_all(n, regions):
+    # Aim for at least 10 items per partition, or enough to occupy all cores of a block
+    n = max(10, dd.get_num_cores(samples[0]))
+    num_blocks = int(math.ceil(float(len(regions)) / n))
+    for region_block in partition_by_cost(regions, num_blocks, samples[0]):
         out.append({"region_block": ["%s:%s-%s" % (c, s, e) for c, s, e in region_block]})
     return out
 
@@ -441,6 +441,7 @@ ALGORITHM_KEYS = set(["platform", "aligner", "bam_clean", "bam_sort",
                       "peakcaller", "chip_method",
                       "effects", "effects_transcripts", "mark_duplicates",
                       "svcaller", "svvalidate", "svprioritize",
+                      "max_breakpoint_distance", "min_reciprocal_overlap",
                       "hlacaller", "hlavalidate",
                       "sv_regions", "hetcaller", "recalibrate", "realign",
                       "phasing", "validate",
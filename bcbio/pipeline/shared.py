@@ -5,8 +5,6 @@ from contextlib import contextmanager
 import functools
 import tempfile
 
-import pybedtools
-import pysam
 import toolz as tz
 
 from bcbio import bam, broad, utils
@@ -17,6 +15,9 @@ from bcbio.utils import file_exists, save_diskspace
 from bcbio.distributed.transaction import file_transaction, tx_tmpdir
 from bcbio.provenance import do
 
+pybedtools = utils.LazyImport("pybedtools")
+pysam = utils.LazyImport("pysam")
+
 # ## Split/Combine helpers
 
 def combine_bam(in_files, out_file, config):
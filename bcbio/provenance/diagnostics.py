@@ -1,44 +1,231 @@
 """Provide logging and diagnostics of running pipelines.
 
-This wraps the BioLite diagnostics database format to provide
-tracking of command lines, run times and inspection into run progress.
-The goal is to allow traceability and reproducibility of pipelines.
-
-https://bitbucket.org/caseywdunn/biolite
+Tracks command lines, run times and resource usage in a local SQLite
+database in the provenance directory, allowing inspection into run progress
+and identification of slow steps. The goal is to allow traceability and
+reproducibility of pipelines.
 
 Also interfaces with Galaxy's history export format, to provide
 a set of metadata that could be imported into object stores.
 """
+import itertools
 import os
+import re
+import shlex
+import socket
+import sqlite3
+import time
 import uuid
 
 import toolz as tz
-try:
-    import biolite, biolite.config, biolite.database
-except ImportError:
-    biolite = None
 
 from bcbio import utils
+from bcbio.log import logger
+
+DB_NAME = "commands.db"
+# Seconds to wait on a busy database before dropping a record
+_WRITE_TIMEOUT = 2.0
+# Database for the current run, used for commands run without sample information
+_RUN_DB = None
+
+_SCHEMA = ["""CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, start REAL, work_dir TEXT)""",
+           """CREATE TABLE IF NOT EXISTS stages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, label TEXT, start REAL, end REAL)""",
+           """CREATE TABLE IF NOT EXISTS commands (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, program TEXT, command TEXT,
+                description TEXT, sample TEXT, region TEXT, entity TEXT, host TEXT, pid INTEGER,
+                start REAL, end REAL, exitcode INTEGER, succeeded INTEGER,
+                maxrss_kb INTEGER, cpu_user REAL, cpu_sys REAL)""",
+           """CREATE TABLE IF NOT EXISTS commits (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT, method TEXT, bytes INTEGER,
+                start REAL, seconds REAL)""",
+           "CREATE INDEX IF NOT EXISTS commands_start ON commands (start)"]
+
+def get_db(work_dir):
+    return os.path.join(work_dir, "provenance", DB_NAME)
+
+def _connect(db_file, timeout):
+    return sqlite3.connect(db_file, timeout=timeout)
+
+def _create_schema(conn):
+    for stmt in _SCHEMA:
+        conn.execute(stmt)
+
+def _write(db_file, sql, vals):
+    """Write a record to the diagnostics database, never failing the calling process.
+
+    Records are dropped if the database stays busy, so many concurrent
+    workers do not block on diagnostics.
+    """
+    try:
+        conn = _connect(db_file, _WRITE_TIMEOUT)
+        try:
+            with conn:
+                conn.execute(sql, vals)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.debug("Dropped diagnostics record in %s: %s" % (db_file, e))
+
+def _get_db_from_data(data):
+    """Retrieve the database to record to, from sample information or the current run.
+
+    Without a database from data, falls back to the database from
+    `initialize`, then to one in the current work directory if present.
+    """
+    db_file = None
+    if data:
+        db_file = tz.get_in(["provenance", "db"], data)
+        if not db_file and tz.get_in(["dirs", "work"], data):
+            db_file = get_db(data["dirs"]["work"])
+    if not db_file:
+        db_file = _RUN_DB or get_db(os.getcwd())
+    if os.path.exists(os.path.dirname(db_file)):
+        return db_file
+
+_SHELL_SETUP = set(["export", "unset", "set", "cd", "ulimit", "source", "."])
+
+def _program_name(cmd):
+    """Retrieve the name of the main program run from a command line.
 
-def start_cmd(cmd, descr, data):
+    Skips shell setup like environmental variable exports, returning the first
+    program in a pipeline.
+    """
+    if not isinstance(cmd, basestring):
+        return os.path.basename(str(cmd[0])) if len(cmd) > 0 else ""
+    for part in re.split(r"[;&|()]+", cmd):
+        try:
+            words = shlex.split(part)
+        except ValueError:
+            words = part.split()
+        words = list(itertools.dropwhile(lambda x: re.match(r"^\w+=", x), words))
+        if words and words[0] not in _SHELL_SETUP:
+            return os.path.basename(words[0])
+    return ""
+
+def start_cmd(cmd, descr, data, region=None):
     """Retain details about starting a command, returning a command identifier.
     """
-    if data and "provenance" in data:
-        entity_id = tz.get_in(["provenance", "entity"], data)
+    db_file = _get_db_from_data(data)
+    if db_file:
+        return {"db": db_file, "program": _program_name(cmd),
+                "command": " ".join(str(x) for x in cmd) if not isinstance(cmd, basestring) else cmd,
+                "description": descr, "sample": _get_sample_name(data),
+                "region": str(region) if region else None,
+                "entity": tz.get_in(["provenance", "entity"], data),
+                "start": time.time()}
+
+def _get_sample_name(data):
+    if data:
+        return tz.get_in(["rgnames", "sample"], data) or data.get("description")
+
+def end_cmd(cmd_id, succeeded=True, stats=None):
+    """Mark a command as finished with success or failure, recording timing and resource usage.
 
-def end_cmd(cmd_id, succeeded=True):
-    """Mark a command as finished with success or failure.
+    stats contains the exit code, peak memory and CPU times of the finished process.
     """
-    pass
+    if cmd_id:
+        stats = stats or {}
+        _write(cmd_id["db"],
+               "INSERT INTO commands (program, command, description, sample, region, entity, host, pid, "
+               "start, end, exitcode, succeeded, maxrss_kb, cpu_user, cpu_sys) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+               (cmd_id["program"], cmd_id["command"], cmd_id["description"], cmd_id["sample"],
+                cmd_id["region"], cmd_id["entity"], socket.gethostname(), os.getpid(),
+                cmd_id["start"], time.time(), stats.get("exitcode"), int(bool(succeeded)),
+                stats.get("maxrss_kb"), stats.get("cpu_user"), stats.get("cpu_sys")))
+
+def record_stage(dirs, label, start, end):
+    """Record start and end times for a labeled stage of the pipeline.
+    """
+    if dirs and dirs.get("work"):
+        db_file = get_db(dirs["work"])
+        if os.path.exists(os.path.dirname(db_file)):
+            _write(db_file, "INSERT INTO stages (label, start, end) VALUES (?, ?, ?)", (label, start, end))
+
+def record_commit(data, path, nbytes, seconds, method):
+    """Record time spent moving a finished transactional file into its final location.
+
+    method is how the file was committed: rename, copy or move. data can be a
+    sample or configuration dictionary, or None to use the current run database.
+    """
+    db_file = _get_db_from_data(data)
+    if not db_file:
+        return
+    _write(db_file, "INSERT INTO commits (path, method, bytes, start, seconds) VALUES (?, ?, ?, ?, ?)",
+           (path, method, nbytes, time.time() - seconds, seconds))
 
 def initialize(dirs):
-    """Initialize the biolite database to load provenance information.
+    """Initialize the diagnostics database, recording the start of a new run.
+
+    Creates the database tables, so later writes only insert records. Also
+    sets the database used for commands run without sample information.
     """
-    if biolite and dirs.get("work"):
+    global _RUN_DB
+    if dirs.get("work"):
         base_dir = utils.safe_makedir(os.path.join(dirs["work"], "provenance"))
-        p_db = os.path.join(base_dir, "biolite.db")
-        biolite.config.resources["database"] = p_db
-        biolite.database.connect()
+        p_db = os.path.join(base_dir, DB_NAME)
+        try:
+            conn = _connect(p_db, timeout=120)
+            try:
+                with conn:
+                    _create_schema(conn)
+                    conn.execute("INSERT INTO runs (start, work_dir) VALUES (?, ?)",
+                                 (time.time(), dirs["work"]))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.info("Could not initialize diagnostics database %s: %s" % (p_db, e))
+        _RUN_DB = p_db
+        return p_db
+
+def summarize(db_file, top_n=10, run_id=None):
+    """Retrieve slowest programs and stages for a run, defaulting to the latest run.
+
+    Returns a dictionary with the run details and lists of programs and stages
+    as (name, count, total seconds, max seconds, max memory in Gb) tuples.
+    Transactional file commits are summarized by method as
+    (method, count, total seconds, max seconds, total Gb) tuples. Unknown
+    run identifiers return a start of None and the available runs.
+    """
+    conn = _connect(db_file, timeout=120)
+    try:
+        _create_schema(conn)
+        runs = conn.execute("SELECT id, start FROM runs ORDER BY start").fetchall()
+        start, end = 0.0, time.time() + 1
+        run_ids = [x[0] for x in runs]
+        if run_id is not None and run_id not in run_ids:
+            return {"run": run_id, "start": None, "runs": run_ids,
+                    "programs": [], "stages": [], "commits": []}
+        if runs:
+            if run_id is None:
+                run_id = runs[-1][0]
+            starts = [x[1] for x in runs]
+            run_i = run_ids.index(run_id)
+            start = starts[run_i]
+            if run_i + 1 < len(starts):
+                end = starts[run_i + 1]
+        programs = conn.execute(
+            "SELECT program, COUNT(*), SUM(end - start), MAX(end - start), MAX(maxrss_kb) "
+            "FROM commands WHERE start >= ? AND start < ? GROUP BY program "
+            "ORDER BY SUM(end - start) DESC LIMIT ?", (start, end, top_n)).fetchall()
+        stages = conn.execute(
+            "SELECT label, COUNT(*), SUM(end - start), MAX(end - start), NULL "
+            "FROM stages WHERE start >= ? AND start < ? GROUP BY label "
+            "ORDER BY SUM(end - start) DESC LIMIT ?", (start, end, top_n)).fetchall()
+        commits = conn.execute(
+            "SELECT method, COUNT(*), SUM(seconds), MAX(seconds), SUM(bytes) "
+            "FROM commits WHERE start >= ? AND start < ? GROUP BY method "
+            "ORDER BY SUM(seconds) DESC", (start, end)).fetchall()
+    finally:
+        conn.close()
+    def _finalize(xs):
+        return [(name, count, total, maxtime, (float(mem) / (1024 * 1024)) if mem else None)
+                for name, count, total, maxtime, mem in xs]
+    return {"run": run_id, "start": start, "runs": run_ids, "programs": _finalize(programs), "stages": _finalize(stages),
+            "commits": [(method, count, total, maxtime, float(nbytes or 0) / 1e9)
+                        for method, count, total, maxtime, nbytes in commits]}
 
 def store_entity(data):
     fc_name = tz.get_in(["upload", "fn_name"], data)
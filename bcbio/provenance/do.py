@@ -3,6 +3,8 @@
 import collections
 import os
 import subprocess
+import threading
+import time
 
 from bcbio import utils
 from bcbio.log import logger, logger_cl, logger_stdout
@@ -17,17 +19,18 @@ def run(cmd, descr=None, data=None, checks=None, region=None, log_error=True,
     if descr:
       descr = _descr_str(descr, data, region)
       logger.debug(descr)
-    cmd_id = diagnostics.start_cmd(cmd, descr or "", data)
+    cmd_id = diagnostics.start_cmd(cmd, descr or "", data, region)
+    stats = {}
     try:
         logger_cl.debug(" ".join(str(x) for x in cmd) if not isinstance(cmd, basestring) else cmd)
-        _do_run(cmd, checks, log_stdout, env=env)
+        _do_run(cmd, checks, log_stdout, env=env, stats=stats)
     except:
-        diagnostics.end_cmd(cmd_id, False)
+        diagnostics.end_cmd(cmd_id, False, stats)
         if log_error:
             logger.exception()
         raise
-    finally:
-        diagnostics.end_cmd(cmd_id)
+    else:
+        diagnostics.end_cmd(cmd_id, True, stats)
 
 def _descr_str(descr, data, region):
     """Add additional useful information from data to description string.
@@ -68,9 +71,111 @@ def _normalize_cmd_args(cmd):
     else:
         return [str(x) for x in cmd], False, None
 
-def _do_run(cmd, checks, log_stdout=False, env=None):
+def _wait_with_usage(s, stats):
+    """Wait for process completion, capturing exit code and resource usage.
+
+    Reaps the child with wait4 to retrieve peak memory and CPU time for the
+    process and any children it waited on.
+    """
+    if s.returncode is None:
+        try:
+            pid, status, rusage = os.wait4(s.pid, 0)
+        except OSError:
+            s.wait()
+        else:
+            s.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+            stats["maxrss_kb"] = rusage.ru_maxrss
+            stats["cpu_user"] = rusage.ru_utime
+            stats["cpu_sys"] = rusage.ru_stime
+    stats["exitcode"] = s.returncode
+    return s.returncode
+
+class _OutputPump(object):
+    """Drain process output in a background thread, logging in batches from the caller.
+
+    The reader thread only splits output into lines, since logging handlers
+    are bound to the calling thread. Lines waiting to be logged are held in a
+    bounded buffer and logging is rate limited, so chatty tools neither block
+    on a full pipe nor flood the debug log. The last lines are always retained
+    for error reporting.
+    """
+    chunk_size = 65536
+    flush_interval = 0.5
+    max_pending = 10000
+    max_lines_per_sec = 1000
+    tail_size = 100
+
+    def __init__(self, handle, log_fn):
+        self._handle = handle
+        self._log_fn = log_fn
+        self._pending = collections.deque(maxlen=self.max_pending)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._read)
+        self._thread.daemon = True
+        self.tail = collections.deque(maxlen=self.tail_size)
+        self.seen = 0
+        self.logged = 0
+
+    def _add(self, lines):
+        with self._lock:
+            self._pending.extend(lines)
+            self.seen += len(lines)
+        self._ready.set()
+
+    def _read(self):
+        fd = self._handle.fileno()
+        partial = b""
+        try:
+            while True:
+                chunk = os.read(fd, self.chunk_size)
+                if not chunk:
+                    break
+                lines = (partial + chunk).split(b"\n")
+                partial = lines.pop()
+                if lines:
+                    self._add(lines)
+        finally:
+            if partial:
+                self._add([partial])
+            self._ready.set()
+
+    def _flush(self, allowed):
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+            self._ready.clear()
+        lines = [x for x in (l.rstrip() for l in lines) if x]
+        self.tail.extend(lines)
+        to_log = lines[:max(allowed, 0)]
+        if to_log:
+            self._log_fn("\n".join(to_log))
+            self.logged += len(to_log)
+        return len(to_log)
+
+    def run(self):
+        """Read until the process closes its output, logging batches as they arrive.
+        """
+        self._thread.start()
+        window_start = time.time()
+        window_logged = 0
+        while self._thread.is_alive():
+            self._ready.wait(self.flush_interval)
+            if time.time() - window_start >= 1.0:
+                window_start = time.time()
+                window_logged = 0
+            window_logged += self._flush(self.max_lines_per_sec - window_logged)
+        self._thread.join()
+        self._flush(self.max_lines_per_sec)
+        if self.seen > self.logged:
+            self._log_fn("Output rate limited: logged %s of %s lines" % (self.logged, self.seen))
+
+def _do_run(cmd, checks, log_stdout=False, env=None, stats=None):
     """Perform running and check results, raising errors for issues.
+
+    stats is filled in with the exit code and resource usage of the process.
     """
+    stats = {} if stats is None else stats
     cmd, shell_arg, executable_arg = _normalize_cmd_args(cmd)
     s = subprocess.Popen(
         cmd,
@@ -81,30 +186,23 @@ def _do_run(cmd, checks, log_stdout=False, env=None):
         close_fds=True,
         env=env,
     )
-    debug_stdout = collections.deque(maxlen=100)
-    while 1:
-        line = s.stdout.readline()
-        if line.rstrip():
-            debug_stdout.append(line)
-            if log_stdout:
-                logger_stdout.debug(line.rstrip())
-            else:
-                logger.debug(line.rstrip())
-        exitcode = s.poll()
-        if exitcode is not None:
-            for line in s.stdout:
-                debug_stdout.append(line)
-            if exitcode is not None and exitcode != 0:
-                error_msg = " ".join(cmd) if not isinstance(cmd, basestring) else cmd
-                error_msg += "\n"
-                error_msg += "".join(debug_stdout)
-                s.communicate()
-                s.stdout.close()
-                raise subprocess.CalledProcessError(exitcode, error_msg)
-            else:
-                break
-    s.communicate()
-    s.stdout.close()
+    pump = _OutputPump(s.stdout, logger_stdout.debug if log_stdout else logger.debug)
+    try:
+        pump.run()
+    except:
+        # avoid leaving the command running, or a zombie, when interrupted
+        if s.poll() is None:
+            s.kill()
+        s.wait()
+        raise
+    finally:
+        s.stdout.close()
+    exitcode = _wait_with_usage(s, stats)
+    if exitcode != 0:
+        error_msg = " ".join(cmd) if not isinstance(cmd, basestring) else cmd
+        error_msg += "\n"
+        error_msg += "\n".join(pump.tail)
+        raise subprocess.CalledProcessError(exitcode, error_msg)
     # Check for problems not identified by shell return codes
     if checks:
         for check in checks:
@@ -1,12 +1,55 @@
 """Profiling of system resources (CPU, memory, disk, filesystem IO) during
 pipeline runs.
 """
+from __future__ import print_function
 import contextlib
+import os
+import time
 
 from bcbio.log import logger
+from bcbio.provenance import diagnostics
 
 @contextlib.contextmanager
 def report(label, dirs):
     """Log timing information for later graphing of resource usage."""
     logger.info("Timing: %s" % label)
+    start = time.time()
     yield None
+    diagnostics.record_stage(dirs, label, start, time.time())
+
+def summarize(args):
+    """Print the slowest programs and stages of a run from the diagnostics database.
+    """
+    db_file = diagnostics.get_db(os.path.abspath(args.workdir))
+    if not os.path.exists(db_file):
+        raise IOError("Did not find command timing database: %s" % db_file)
+    info = diagnostics.summarize(db_file, args.top, args.run)
+    if info["start"] is None:
+        print("Unknown run %s. Available runs: %s" % (info["run"], ", ".join(str(x) for x in info["runs"])))
+        return
+    print("Run %s started %s" % (info["run"], time.strftime("%Y-%m-%d %H:%M:%S",
+                                                           time.localtime(info["start"]))))
+    for name, key in [("Programs", "programs"), ("Stages", "stages")]:
+        print("\n%s by total time" % name)
+        print("%-30s %8s %12s %12s %10s" % ("name", "count", "total (s)", "max (s)", "max mem (Gb)"))
+        for label, count, total, maxtime, mem in info[key]:
+            print("%-30s %8d %12.1f %12.1f %10s" % (label, count, total, maxtime,
+                                                    "%.1f" % mem if mem is not None else "-"))
+    if info["commits"]:
+        print("\nTransactional file commits by method")
+        print("%-30s %8s %12s %12s %10s" % ("method", "count", "total (s)", "max (s)", "size (Gb)"))
+        for method, count, total, maxtime, size in info["commits"]:
+            print("%-30s %8d %12.1f %12.1f %10.1f" % (method, count, total, maxtime, size))
+
+def add_subparser(subparsers):
+    """Add command line option for summarizing command and stage timings.
+    """
+    parser = subparsers.add_parser("profile",
+                                   help="Summarize slowest programs and stages from a bcbio run")
+    parser.add_argument("--workdir", default=os.getcwd(),
+                        help="bcbio work directory with provenance/%s" % diagnostics.DB_NAME)
+    parser.add_argument("-n", "--top", default=10, type=int,
+                        help="Number of programs and stages to report")
+    parser.add_argument("--run", default=None, type=int,
+                        help="Run identifier to report on. Defaults to the latest run")
+    return parser
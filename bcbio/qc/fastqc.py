@@ -5,7 +5,6 @@ http://www.bioinformatics.babraham.ac.uk/projects/fastqc/
 import os
 import shutil
 
-import pandas as pd
 try:
     from fadapa import Fadapa
 except ImportError:
@@ -18,6 +17,8 @@ from bcbio.provenance import do
 from bcbio.pipeline import datadict as dd
 from bcbio.pipeline import config_utils
 
+pd = utils.LazyImport("pandas")
+
 def run(bam_file, data, fastqc_out):
     """Run fastqc, generating report in specified directory and parsing metrics.
 
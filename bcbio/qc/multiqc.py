@@ -7,11 +7,8 @@ import glob
 import json
 import mimetypes
 import os
-import pandas as pd
 import shutil
-import numpy as np
 
-import pybedtools
 import toolz as tz
 import yaml
 
@@ -28,6 +25,10 @@ from bcbio.variation import bedutils
 from bcbio.qc.variant import get_active_vcinfo
 from bcbio.upload import get_all_upload_paths_from_sample
 
+pd = utils.LazyImport("pandas")
+np = utils.LazyImport("numpy")
+pybedtools = utils.LazyImport("pybedtools")
+
 def summary(*samples):
     """Summarize all quality metrics together"""
     samples = list(utils.flatten(samples))
@@ -7,7 +7,6 @@ for future experiments (for higher or lower input correspondingly).
 """
 import os
 import math
-import pybedtools
 import toolz as tz
 
 from bcbio import utils
@@ -20,6 +19,8 @@ from bcbio.bam import ref, readstats
 from bcbio.variation import coverage as cov
 from bcbio.qc import samtools
 
+pybedtools = utils.LazyImport("pybedtools")
+
 
 def run(bam_file, data, out_dir):
     out = {}
@@ -7,7 +7,6 @@ import shutil
 import subprocess
 import xml.etree.ElementTree as ET
 
-import pysam
 import toolz as tz
 
 from bcbio import bam, utils
@@ -17,6 +16,8 @@ from bcbio.provenance import do
 from bcbio.pipeline import datadict as dd
 from bcbio.pipeline import config_utils
 
+pysam = utils.LazyImport("pysam")
+
 def run(bam_file, data, out_dir):
     """ Run SignatureGenerator to create normalize vcf that later will be input of qsignature_summary
 
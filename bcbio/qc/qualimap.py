@@ -6,8 +6,6 @@ import glob
 import os
 import shutil
 
-import pandas as pd
-import pybedtools
 import toolz as tz
 import toolz.dicttoolz as dtz
 
@@ -21,6 +19,9 @@ from bcbio.distributed.transaction import file_transaction
 from bcbio.rnaseq import gtf
 from bcbio.variation import bedutils
 
+pd = utils.LazyImport("pandas")
+pybedtools = utils.LazyImport("pybedtools")
+
 # ## Standard Qualimap
 
 def run(bam_file, data, out_dir):
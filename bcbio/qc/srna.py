@@ -3,13 +3,14 @@ Create log files to be parsed by multiqc
 """
 
 import os
-import pandas as pd
 
 from bcbio import utils
 from bcbio.provenance.programs import get_version_manifest
 from bcbio.distributed.transaction import file_transaction
 from bcbio.pipeline import datadict as dd
 
+pd = utils.LazyImport("pandas")
+
 def run(bam_file, data, out_dir):
     """Create several log files"""
     _mirbase_stats(data, out_dir)
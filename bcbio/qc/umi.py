@@ -4,13 +4,14 @@ import collections
 import math
 import os
 
-import numpy as np
-import pysam
 import yaml
 
 from bcbio import bam, utils
 from bcbio.pipeline import datadict as dd
 
+np = utils.LazyImport("numpy")
+pysam = utils.LazyImport("pysam")
+
 def run(_, data, out_dir):
     stats_file = os.path.join(utils.safe_makedir(out_dir), "%s_umi_stats.yaml" % dd.get_sample_name(data))
     if not utils.file_uptodate(stats_file, dd.get_align_bam(data)):
@@ -2,17 +2,25 @@
 count number of reads mapping to features of transcripts
 
 """
+import hashlib
 import os
-import pandas as pd
-from collections import defaultdict
-import gffutils
 from bcbio.log import logger
 
 from bcbio.utils import file_exists
+from bcbio import utils
+from bcbio.distributed.transaction import file_transaction
 
-def combine_count_files(files, out_file=None, ext=".fpkm"):
+pd = utils.LazyImport("pandas")
+np = utils.LazyImport("numpy")
+gffutils = utils.LazyImport("gffutils")
+
+def combine_count_files(files, out_file=None, ext=".fpkm", binary=False):
     """
     combine a set of count files into a single combined file
+
+    Streams each file into a numeric column, checking that all files share
+    the same row names by comparing hashes. binary writes the combined matrix,
+    with row and column names, to a compressed numpy file (out_file + ".npz").
     """
     assert all([file_exists(x) for x in files]), \
         "Some count files in %s do not exist." % files
@@ -26,27 +34,71 @@ def combine_count_files(files, out_file=None, ext=".fpkm"):
     if file_exists(out_file):
         return out_file
     logger.info("Combining count files into %s." % out_file)
-    row_names = []
-    col_vals = defaultdict(list)
-    for i, f in enumerate(files):
-        vals = []
-        if i == 0:
-            with open(f) as in_handle:
-                for line in in_handle:
-                    rname, val = line.strip().split("\t")
-                    row_names.append(rname)
-                    vals.append(val)
-        else:
-            with open(f) as in_handle:
-                for line in in_handle:
-                    _, val = line.strip().split("\t")
-                    vals.append(val)
-        col_vals[col_names[i]] = vals
-
-    df = pd.DataFrame(col_vals, index=row_names)
-    df.to_csv(out_file, sep="\t", index_label="id")
+    # sorted, unique column names with later files taking precedence
+    col_files = dict(zip(col_names, files))
+    col_names = sorted(col_files.keys())
+    row_names, row_digest = _read_count_names(files[0])
+    matrix = np.zeros((len(row_names), len(col_names)), dtype=np.float64)
+    is_int = []
+    for j, col_name in enumerate(col_names):
+        cur_digest, cur_int = _read_count_column(col_files[col_name], matrix[:, j])
+        if cur_digest != row_digest:
+            raise ValueError("Row names in %s do not match those in %s" % (col_files[col_name], files[0]))
+        is_int.append(cur_int)
+    with file_transaction(out_file) as tx_out_file:
+        with open(tx_out_file, "w") as out_handle:
+            out_handle.write("\t".join(["id"] + col_names) + "\n")
+            row_fmt = "\t".join(["%s"] + ["%d" if x else "%r" for x in is_int]) + "\n"
+            missing = np.isnan(matrix).any(axis=1)
+            for i, rname in enumerate(row_names):
+                if missing[i]:
+                    out_handle.write("\t".join([rname] + [_format_count(v, cur_int)
+                                                          for v, cur_int in zip(matrix[i], is_int)]) + "\n")
+                else:
+                    out_handle.write(row_fmt % tuple([rname] + matrix[i].tolist()))
+    if binary:
+        with file_transaction(out_file + ".npz") as tx_out_file:
+            with open(tx_out_file, "wb") as out_handle:
+                np.savez_compressed(out_handle, matrix=matrix, rownames=np.array(row_names),
+                                    colnames=np.array(col_names))
     return out_file
 
+def _read_count_file(in_file):
+    """Read row names and typed values from a single count file.
+    """
+    df = pd.read_csv(in_file, sep="\t", header=None, names=["id", "val"], usecols=[0, 1],
+                     dtype={"id": str}, keep_default_na=False,
+                     na_values={"val": ["", "NA", "nan", "NaN"]})
+    names = df["id"].tolist()
+    digest = hashlib.sha1("\n".join(names).encode("utf-8")).hexdigest()
+    return names, df["val"], digest
+
+def _read_count_names(in_file):
+    """Retrieve row names from a count file, along with a digest for comparison to other files.
+    """
+    names, _, digest = _read_count_file(in_file)
+    return names, digest
+
+def _read_count_column(in_file, column):
+    """Read values from a count file into a numpy column.
+
+    Returns a digest of the row names and whether all values are integers.
+    Only keeps names and values for a single file in memory.
+    """
+    _, vals, digest = _read_count_file(in_file)
+    if len(vals) != len(column):
+        return None, False
+    column[:] = pd.to_numeric(vals, errors="coerce").values
+    return digest, vals.dtype.kind in "iu"
+
+def _format_count(val, is_int):
+    if np.isnan(val):
+        return "NA"
+    elif is_int:
+        return "%d" % val
+    else:
+        return repr(float(val))
+
 def annotate_combined_count_file(count_file, gtf_file, out_file=None):
     dbfn = gtf_file + ".db"
     if not file_exists(dbfn):
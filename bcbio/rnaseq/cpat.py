@@ -2,7 +2,6 @@
 run the Coding Potential Assessment Tool (CPAT)
 http://nar.oxfordjournals.org/content/early/2013/01/17/nar.gkt006.full
 """
-import numpy
 import shutil
 import tempfile
 import os
@@ -15,6 +14,8 @@ from bcbio.provenance import do
 from bcbio.bam import fasta
 from bcbio.pipeline import config_utils
 
+numpy = utils.LazyImport("numpy")
+
 def classify_with_cpat(assembled_gtf, ref_gtf, ref_fasta, data):
     cpat_cmd = config_utils.get_program("cpat.py", data)
     if not cpat_cmd:
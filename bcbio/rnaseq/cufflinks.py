@@ -5,13 +5,15 @@ http://cufflinks.cbcb.umd.edu/manual.html
 import os
 import shutil
 import tempfile
-import pandas as pd
 from bcbio.utils import get_in, file_exists, safe_makedir
 from bcbio.distributed.transaction import file_transaction
 from bcbio.log import logger
 from bcbio.pipeline import config_utils
 from bcbio.provenance import do
 from bcbio.rnaseq import gtf, annotate_gtf
+from bcbio import utils
+
+pd = utils.LazyImport("pandas")
 
 
 def run(align_file, ref_file, data):
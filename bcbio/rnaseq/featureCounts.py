@@ -7,11 +7,9 @@ from bcbio.bam import is_paired
 from bcbio.provenance import do
 from bcbio.distributed.transaction import file_transaction
 import bcbio.pipeline.datadict as dd
+from bcbio import utils
 
-try:
-    import pandas as pd
-except ImportError:
-    pd = None
+pd = utils.lazy_import_optional("pandas")
 
 def count(data):
     """
@@ -1,4 +1,3 @@
-import gffutils
 import tempfile
 import os
 import random
@@ -9,6 +8,8 @@ from bcbio.distributed.transaction import file_transaction
 from bcbio.provenance import do
 from bcbio.log import logger
 
+gffutils = utils.LazyImport("gffutils")
+
 def guess_infer_extent(gtf_file):
     """
     guess if we need to use the gene extent option when making a gffutils
@@ -4,7 +4,6 @@ kallisto
 https://github.com/pachterlab/kallisto
 """
 import os
-import pandas as pd
 
 import bcbio.pipeline.datadict as dd
 from bcbio.rnaseq import sailfish
@@ -14,6 +13,9 @@ from bcbio.provenance import do
 from bcbio.pipeline import config_utils
 from bcbio.rnaseq import umi
 from bcbio.bam import fasta
+from bcbio import utils
+
+pd = utils.LazyImport("pandas")
 
 def run_kallisto_rnaseq(data):
     samplename = dd.get_sample_name(data)
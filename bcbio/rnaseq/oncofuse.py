@@ -6,7 +6,6 @@ Supported:
 """
 from __future__ import print_function
 import os
-import pysam
 
 from bcbio.utils import file_exists
 from bcbio.distributed.transaction import file_transaction
@@ -14,6 +13,9 @@ from bcbio.pipeline import config_utils
 from bcbio.provenance import do
 import bcbio.pipeline.datadict as dd
 from bcbio.log import logger
+from bcbio import utils
+
+pysam = utils.LazyImport("pysam")
 
 # ## oncofuse fusion trancript detection
 
@@ -16,9 +16,10 @@ from bcbio.rnaseq import kallisto, sailfish, gtf
 from bcbio.provenance import do
 from bcbio.utils import file_exists, safe_makedir
 
+np = utils.LazyImport("numpy")
+pd = utils.LazyImport("pandas")
+
 h5py = utils.LazyImport("h5py")
-import numpy as np
-import pandas as pd
 
 def get_fragment_length(data):
     """
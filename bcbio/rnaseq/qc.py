@@ -1,13 +1,10 @@
 """Run Broad's RNA-SeqQC tool and handle reporting of useful summary metrics.
 """
-# soft imports
-try:
-    import pandas as pd
-    import statsmodels.formula.api as sm
-except ImportError:
-    pd, sm = None, None
+from bcbio import bam, utils
 
-from bcbio import bam
+# soft imports
+pd = utils.lazy_import_optional("pandas")
+sm = utils.lazy_import_optional("statsmodels.formula.api")
 
 def starts_by_depth(bam_file, data, sample_size=10000000):
     """
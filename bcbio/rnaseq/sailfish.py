@@ -1,6 +1,5 @@
 import os
 from collections import namedtuple
-import pandas as pd
 
 import bcbio.pipeline.datadict as dd
 import bcbio.rnaseq.gtf as gtf
@@ -10,6 +9,9 @@ from bcbio.utils import (file_exists, safe_makedir, is_gzipped,
                          R_package_path, Rscript_cmd)
 from bcbio.pipeline import config_utils, disambiguate
 from bcbio.bam import fastq
+from bcbio import utils
+
+pd = utils.LazyImport("pandas")
 
 def run_sailfish(data):
     samplename = dd.get_sample_name(data)
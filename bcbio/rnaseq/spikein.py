@@ -1,6 +1,5 @@
 """Function to counts on the fly the spike in sequences given as a parameter in the yaml file"""
 import os
-import pandas as pd
 
 # from bcbio.rnaseq import sailfish
 import bcbio.pipeline.datadict as dd
@@ -14,6 +13,8 @@ from bcbio.bam import fastq
 from bcbio.log import logger
 # from bcbio import bam
 
+pd = utils.LazyImport("pandas")
+
 def run_counts_spikein(data):
     return [[counts_spikein(data)]]
 
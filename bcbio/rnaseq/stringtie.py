@@ -7,7 +7,6 @@ manual: http://ccb.jhu.edu/software/stringtie/#contact
 """
 
 import os
-import pandas as pd
 import subprocess
 import contextlib
 from distutils.version import LooseVersion
@@ -17,6 +16,9 @@ from bcbio.utils import file_exists
 from bcbio.distributed.transaction import file_transaction
 from bcbio.pipeline import config_utils
 import bcbio.pipeline.datadict as dd
+from bcbio import utils
+
+pd = utils.LazyImport("pandas")
 
 def _stringtie_expression(bam, data, out_dir="."):
     """
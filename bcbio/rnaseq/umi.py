@@ -4,12 +4,12 @@ Most of this either uses Valentine Svennson's umis repository or adapts
 code written from it.
 https://github.com/vals/umis
 """
-import pandas as pd
-import scipy.io
 import os
 import copy
 import glob
+import struct
 import sys
+import zipfile
 from itertools import repeat
 
 import bcbio.pipeline.datadict as dd
@@ -20,6 +20,12 @@ from bcbio.distributed.transaction import file_transaction
 from bcbio.bam.fastq import open_fastq
 from bcbio.log import logger
 from bcbio.rnaseq import gtf
+from bcbio import utils
+
+np = utils.LazyImport("numpy")
+pd = utils.LazyImport("pandas")
+scipy_io = utils.LazyImport("scipy.io")
+scipy_sparse = utils.LazyImport("scipy.sparse")
 
 class SparseMatrix(object):
 
@@ -33,44 +39,134 @@ class SparseMatrix(object):
                                               len(self.colnames),
                                               type(self.matrix))
 
-    def read(self, filename, rowprefix=None, colprefix=None, delim=":"):
+    def read(self, filename, rowprefix=None, colprefix=None, delim=":", mmap=True):
         """read a sparse matrix, loading row and column name files. if
-        specified, will add a prefix to the row or column names"""
-
-        self.matrix = scipy.io.mmread(filename)
-        with open(filename + ".rownames") as in_handle:
-            self.rownames = [x.strip() for x in in_handle]
-            if rowprefix:
-                self.rownames = [rowprefix + delim + x for x in self.rownames]
-        with open(filename + ".colnames") as in_handle:
-            self.colnames = [x.strip() for x in in_handle]
-            if colprefix:
-                self.colnames = [colprefix + delim + x for x in self.colnames]
+        specified, will add a prefix to the row or column names. binary .npz
+        matrices are memory mapped unless mmap is False"""
+        if filename.endswith(".npz"):
+            self.matrix, self.rownames, self.colnames = _read_npz(filename, mmap)
+        else:
+            self.matrix = scipy_io.mmread(filename)
+            with open(filename + ".rownames") as in_handle:
+                self.rownames = [x.strip() for x in in_handle]
+            with open(filename + ".colnames") as in_handle:
+                self.colnames = [x.strip() for x in in_handle]
+        if rowprefix:
+            self.rownames = [rowprefix + delim + x for x in self.rownames]
+        if colprefix:
+            self.colnames = [colprefix + delim + x for x in self.colnames]
 
     def write(self, filename):
-        """read a sparse matrix, loading row and column name files"""
+        """write a sparse matrix, along with row and column name files. a
+        .npz filename writes a single binary file with embedded names"""
         if file_exists(filename):
             return filename
+        if filename.endswith(".npz"):
+            with file_transaction(filename) as tx_out_file:
+                _write_npz(tx_out_file, self.matrix, self.rownames, self.colnames)
+            return filename
         out_files = [filename, filename + ".rownames", filename + ".colnames"]
         with file_transaction(out_files) as tx_out_files:
             with open(tx_out_files[0], "w") as out_handle:
-                scipy.io.mmwrite(out_handle, scipy.sparse.csr_matrix(self.matrix))
+                scipy_io.mmwrite(out_handle, scipy_sparse.csr_matrix(self.matrix))
             pd.Series(self.rownames).to_csv(tx_out_files[1], index=False)
             pd.Series(self.colnames).to_csv(tx_out_files[2], index=False)
         return filename
 
     def cat(self, newsm, byrow=False):
+        """concatenate a single matrix onto this one. to combine many
+        matrices use SparseMatrix.concatenate, which copies the data once"""
         if self.matrix is None:
             self.matrix = newsm.matrix
             self.colnames = newsm.colnames
             self.rownames = newsm.rownames
         else:
-            catter = scipy.sparse.vstack if byrow else scipy.sparse.hstack
-            self.matrix = catter((self.matrix, newsm.matrix))
-            if byrow:
-                self.rownames = self.rownames + newsm.rownames
+            combined = SparseMatrix.concatenate([self, newsm], byrow)
+            self.matrix = combined.matrix
+            self.rownames = combined.rownames
+            self.colnames = combined.colnames
+
+    @classmethod
+    def concatenate(cls, parts, byrow=False):
+        """concatenate a list of SparseMatrix objects in a single pass.
+
+        calling cat once per matrix copies the accumulated matrix each time,
+        which is quadratic in the number of matrices.
+        """
+        parts = [x for x in parts if x.matrix is not None]
+        if not parts:
+            return cls()
+        if len(parts) == 1:
+            return cls(parts[0].matrix, parts[0].rownames, parts[0].colnames)
+        if byrow:
+            matrix = scipy_sparse.vstack([x.matrix for x in parts], format="csr")
+            rownames = [name for x in parts for name in x.rownames]
+            colnames = parts[0].colnames
+        else:
+            matrix = scipy_sparse.hstack([x.matrix for x in parts], format="csc")
+            rownames = parts[0].rownames
+            colnames = [name for x in parts for name in x.colnames]
+        return cls(matrix, rownames, colnames)
+
+def _write_npz(out_file, matrix, rownames, colnames):
+    """Write a sparse matrix and its names to an uncompressed npz file.
+
+    Arrays are stored uncompressed so the matrix components can be memory
+    mapped when read back.
+    """
+    matrix = scipy_sparse.csc_matrix(matrix)
+    with open(out_file, "wb") as out_handle:
+        np.savez(out_handle, format=np.array("csc"), shape=np.array(matrix.shape),
+                 data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                 rownames=np.array([str(x) for x in rownames]),
+                 colnames=np.array([str(x) for x in colnames]))
+
+def _read_npz(in_file, mmap=True):
+    """Read a sparse matrix and names written by _write_npz.
+    """
+    arrays = _mmap_npz(in_file) if mmap else {}
+    with np.load(in_file) as npz:
+        for key in npz.files:
+            if key not in arrays:
+                arrays[key] = npz[key]
+    matrix_class = scipy_sparse.csr_matrix if str(arrays["format"]) == "csr" else scipy_sparse.csc_matrix
+    matrix = matrix_class((arrays["data"], arrays["indices"], arrays["indptr"]),
+                          shape=tuple(int(x) for x in arrays["shape"]), copy=False)
+    return (matrix, [str(x) for x in arrays["rownames"]],
+            [str(x) for x in arrays["colnames"]])
+
+def _mmap_npz(in_file, keys=("data", "indices", "indptr")):
+    """Memory map numeric arrays stored uncompressed inside an npz file.
+
+    numpy ignores mmap_mode for npz archives, so locate each member's array
+    data in the zip file and map it directly. Compressed members are skipped
+    and read normally.
+    """
+    out = {}
+    with zipfile.ZipFile(in_file) as zip_handle:
+        infos = dict((x.filename, x) for x in zip_handle.infolist())
+    with open(in_file, "rb") as in_handle:
+        for key in keys:
+            info = infos.get(key + ".npy")
+            if info is None or info.compress_type != zipfile.ZIP_STORED:
+                continue
+            in_handle.seek(info.header_offset)
+            header = in_handle.read(30)
+            name_len, extra_len = struct.unpack("<HH", header[26:30])
+            in_handle.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(in_handle)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(in_handle)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(in_handle)
+            if dtype.hasobject:
+                continue
+            if int(np.prod(shape)) == 0:
+                out[key] = np.zeros(shape, dtype=dtype)
             else:
-                self.colnames = self.colnames + newsm.colnames
+                out[key] = np.memmap(in_file, dtype=dtype, mode="r", offset=in_handle.tell(),
+                                     shape=shape, order="F" if fortran_order else "C")
+    return out
 
 TRANSFORM_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data",
                              "umis")
@@ -354,12 +450,16 @@ def concatenate_sparse_counts(*samples):
                     dd.sample_data_iterator(samples) if dd.get_count_file(data)]
     if not files:
         return samples
-    counts = SparseMatrix()
-    counts.read(filename=files.pop(), colprefix=descriptions.pop())
+    # keep the historical column order, with the last sample first
+    files.insert(0, files.pop())
+    descriptions.insert(0, descriptions.pop())
+    parts = []
     for filename, description in zip(files, descriptions):
         newcounts = SparseMatrix()
         newcounts.read(filename=filename, colprefix=description)
-        counts.cat(newcounts)
+        parts.append(newcounts)
+    counts = SparseMatrix.concatenate(parts)
+    counts.write(out_file + ".npz")
     counts.write(out_file)
     newsamples = []
     for data in dd.sample_data_iterator(samples):
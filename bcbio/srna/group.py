@@ -5,13 +5,6 @@ import sys
 import shutil
 from collections import namedtuple
 
-try:
-    from seqcluster import prepare_data as prepare
-    from seqcluster import templates as template_seqcluster
-    from seqcluster.seqbuster import _create_counts, _read_miraligner, _tab_output
-except ImportError:
-    pass
-
 from bcbio.utils import file_exists, safe_makedir, move_safe, append_stem
 from bcbio.provenance import do
 from bcbio.distributed.transaction import file_transaction
@@ -20,6 +13,11 @@ from bcbio.pipeline import datadict as dd
 from bcbio.pipeline.sample import process_alignment
 from bcbio.srna import mirdeep
 from bcbio.rnaseq import spikein
+from bcbio import utils
+
+prepare = utils.LazyImport("seqcluster.prepare_data")
+template_seqcluster = utils.LazyImport("seqcluster.templates")
+seqbuster = utils.LazyImport("seqcluster.seqbuster")
 
 def run_prepare(*data):
     """
@@ -200,14 +198,14 @@ def _make_isomir_counts(data, srna_type="seqbuster", out_dir=None, stem=""):
     for sample in data:
         if sample[0].get(srna_type):
             miraligner_fn = sample[0][srna_type]
-            reads = _read_miraligner(miraligner_fn)
+            reads = seqbuster._read_miraligner(miraligner_fn)
             if reads:
-                out_file, dt, dt_pre = _tab_output(reads, miraligner_fn + ".back", dd.get_sample_name(sample[0]))
+                out_file, dt, dt_pre = seqbuster._tab_output(reads, miraligner_fn + ".back", dd.get_sample_name(sample[0]))
                 out_dts.append(dt)
             else:
                 logger.debug("WARNING::%s has NOT miRNA annotated for %s. Check if fasta files is small or species value." % (dd.get_sample_name(sample[0]), srna_type))
     if out_dts:
-        out_files = _create_counts(out_dts, out_dir)
+        out_files = seqbuster._create_counts(out_dts, out_dir)
         out_files = [move_safe(out_files[0], out_novel_isomir), move_safe(out_files[1], out_novel_mirna)]
         return out_files
     else:
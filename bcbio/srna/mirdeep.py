@@ -2,13 +2,15 @@ import os
 import sys
 import os.path as op
 
-import pysam
 
 from bcbio.log import logger
 from bcbio.utils import file_exists, safe_makedir, chdir, get_perl_exports
 from bcbio.provenance import do
 from bcbio.distributed.transaction import file_transaction
 from bcbio.pipeline import datadict as dd
+from bcbio import utils
+
+pysam = utils.LazyImport("pysam")
 
 
 def run(data):
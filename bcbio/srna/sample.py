@@ -9,7 +9,6 @@ from collections import Counter
 from contextlib import closing
 from distutils.version import LooseVersion
 
-from seqcluster.libs.fastq import collapse, write_output
 try:
     from dnapilib.apred import iterative_adapter_prediction
     error_dnapi = None
@@ -152,6 +151,7 @@ def _collapse(in_file):
     """
     Collpase reads into unique sequences with seqcluster
     """
+    from seqcluster.libs.fastq import collapse, write_output
     out_file = append_stem(in_file, ".trimming").replace(".gz", "")
     if file_exists(out_file):
         return out_file
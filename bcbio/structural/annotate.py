@@ -10,7 +10,8 @@ from bcbio.provenance import do
 from bcbio.structural import regions
 from bcbio.variation import bedutils
 
-import pybedtools
+pybedtools = utils.LazyImport("pybedtools")
+
 
 def add_genes(in_file, data, max_distance=10000, work_dir=None):
     """Add gene annotations to a BED file from pre-prepared RNA-seq data.
@@ -7,7 +7,6 @@ import re
 import shutil
 import subprocess
 
-import pysam
 import toolz as tz
 
 from bcbio import bam, utils
@@ -19,6 +18,8 @@ from bcbio.provenance import do
 from bcbio.structural import shared as sshared
 from bcbio.variation import bedutils, vcfutils
 
+pysam = utils.LazyImport("pysam")
+
 def run(items, background=None):
     """Detect copy number variations from batched set of samples using cn.mops.
     """
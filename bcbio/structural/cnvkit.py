@@ -11,8 +11,6 @@ import os
 import sys
 import tempfile
 
-import pybedtools
-import numpy as np
 import toolz as tz
 
 from bcbio import utils
@@ -26,6 +24,9 @@ from bcbio.provenance import do
 from bcbio.variation import effects, ploidy, population, vcfutils
 from bcbio.structural import annotate, plot, shared
 
+pybedtools = utils.LazyImport("pybedtools")
+np = utils.LazyImport("numpy")
+
 def use_general_sv_bins(data):
     """Check if we should use a general binning approach for a sample.
 
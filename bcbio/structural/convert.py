@@ -2,14 +2,15 @@
 """
 import os
 
-import pybedtools
-import vcf
 
 from bcbio import utils
 from bcbio.distributed.transaction import file_transaction
 from bcbio.provenance import do
 from bcbio.variation import vcfutils
 
+pybedtools = utils.LazyImport("pybedtools")
+vcf = utils.LazyImport("vcf")
+
 # ## Conversions to simplified BED files
 
 MAX_SVSIZE = 1e6  # 1Mb maximum size from callers to avoid huge calls collapsing all structural variants
@@ -7,7 +7,6 @@ import itertools
 import os
 import subprocess
 
-import vcf
 
 from bcbio import bam, utils
 from bcbio.distributed.multi import run_multicore, zeromq_aware_logging
@@ -17,6 +16,8 @@ from bcbio.provenance import do
 from bcbio.structural import shared as sshared
 from bcbio.variation import vcfutils
 
+vcf = utils.LazyImport("vcf")
+
 def _get_full_exclude_file(items, work_dir):
     base_file = os.path.join(work_dir, "%s-svs" % (os.path.splitext(os.path.basename(items[0]["work_bam"]))[0]))
     return sshared.prepare_exclude_file(items, base_file)
@@ -9,7 +9,6 @@ import copy
 import collections
 import subprocess
 
-import pysam
 
 from bcbio import utils, broad
 from bcbio.pipeline.alignment import align_to_sort_bam
@@ -17,6 +16,8 @@ from bcbio.pipeline import lane
 from bcbio.distributed.transaction import file_transaction
 from bcbio.structural import shared
 
+pysam = utils.LazyImport("pysam")
+
 ## Prepare alignments to identify discordant pair mappings
 
 def select_unaligned_read_pairs(in_bam, extra, out_dir, config):
@@ -9,7 +9,6 @@ import os
 import sys
 import shutil
 
-import vcf
 
 from bcbio import utils
 from bcbio.bam import ref
@@ -20,6 +19,8 @@ from bcbio.provenance import do
 from bcbio.structural import shared as sshared
 from bcbio.variation import effects, vcfutils, vfilter
 
+vcf = utils.LazyImport("vcf")
+
 # ## Lumpy main
 
 def _run_lumpy(full_bams, sr_bams, disc_bams, previous_evidence, work_dir, items):
@@ -5,7 +5,6 @@ as defined by the input configuration. Tries to narrow structural variant calls
 based on potential biological targets.
 """
 import os
-import pandas as pd
 import toolz as tz
 
 from bcbio import utils
@@ -16,6 +15,8 @@ from bcbio.provenance import do
 from bcbio.variation import bedutils, vcfutils
 from bcbio.structural import lumpy
 
+pd = utils.LazyImport("pandas")
+
 POST_PRIOR_FNS = {"lumpy": lumpy.run_svtyper_prioritize}
 
 def run(items):
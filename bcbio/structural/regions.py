@@ -9,8 +9,6 @@ import math
 import operator
 import os
 
-import numpy as np
-import pybedtools
 import toolz as tz
 
 from bcbio import utils
@@ -20,6 +18,9 @@ from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do
 from bcbio.variation import bedutils, multi
 
+np = utils.LazyImport("numpy")
+pybedtools = utils.LazyImport("pybedtools")
+
 def calculate_sv_bins(*items):
     """Determine bin sizes and regions to use for samples.
 
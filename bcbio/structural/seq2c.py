@@ -10,7 +10,6 @@ import os
 import subprocess
 from collections import defaultdict
 
-import pybedtools as bt
 import toolz as tz
 
 from bcbio import utils
@@ -23,6 +22,8 @@ from bcbio.log import logger
 from bcbio.variation.coverage import regions_coverage
 from bcbio.variation import bedutils, population, vcfutils
 
+bt = utils.LazyImport("pybedtools")
+
 
 def precall(items):
     """Perform initial pre-calling steps -- coverage calcuation by sample.
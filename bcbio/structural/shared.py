@@ -2,16 +2,13 @@
 
 Handles exclusion regions and preparing discordant regions.
 """
-import collections
 import os
 
-import numpy
-import pybedtools
-import pysam
 import toolz as tz
 import yaml
 
 from bcbio import bam, utils
+from bcbio.bed.intervals import IntervalSet
 from bcbio.distributed.transaction import file_transaction
 from bcbio.bam import callable
 from bcbio.pipeline import datadict as dd
@@ -19,6 +16,10 @@ from bcbio.pipeline import shared
 from bcbio.provenance import do
 from bcbio.variation import effects, population, vcfutils
 
+numpy = utils.LazyImport("numpy")
+pybedtools = utils.LazyImport("pybedtools")
+pysam = utils.LazyImport("pysam")
+
 # ## Finalizing samples
 
 def finalize_sv(orig_vcf, data, items):
@@ -125,58 +126,59 @@ def exclude_by_ends(in_file, exclude_file, data, in_params=None):
         params.update(in_params)
     assert in_file.endswith(".bed")
     out_file = "%s-norepeats%s" % utils.splitext_plus(in_file)
-    to_filter = collections.defaultdict(list)
     removed = 0
     if not utils.file_uptodate(out_file, in_file):
+        with open(in_file) as in_handle:
+            lines = in_handle.readlines()
+        rpt_sizes = _end_repeat_sizes([line.strip().split("\t")[:3] for line in lines],
+                                      _get_exclude_regions(exclude_file), params)
+        keep = rpt_sizes <= (params["total_rpt_pct"] * params["end_buffer"])
+        removed = int((~keep).sum())
         with file_transaction(data, out_file) as tx_out_file:
-            with shared.bedtools_tmpdir(data):
-                for coord, end_name in [(1, "end1"), (2, "end2")]:
-                    base, ext = utils.splitext_plus(tx_out_file)
-                    end_file = _create_end_file(in_file, coord, params, "%s-%s%s" % (base, end_name, ext))
-                    to_filter = _find_to_filter(end_file, exclude_file, params, to_filter)
             with open(tx_out_file, "w") as out_handle:
-                with open(in_file) as in_handle:
-                    for line in in_handle:
-                        key = "%s:%s-%s" % tuple(line.strip().split("\t")[:3])
-                        total_rpt_size = sum(to_filter.get(key, [0]))
-                        if total_rpt_size <= (params["total_rpt_pct"] * params["end_buffer"]):
-                            out_handle.write(line)
-                        else:
-                            removed += 1
+                out_handle.writelines(line for line, cur_keep in zip(lines, keep.tolist()) if cur_keep)
     return out_file, removed
 
-def _find_to_filter(in_file, exclude_file, params, to_exclude):
-    """Identify regions in the end file that overlap the exclusion file.
+# Exclusion regions by file, size and modification time, reused across samples and callers
+_EXCLUDE_CACHE = {}
+
+def _get_exclude_regions(exclude_file):
+    st = os.stat(exclude_file)
+    key = (os.path.abspath(exclude_file), st.st_size, st.st_mtime)
+    if key not in _EXCLUDE_CACHE:
+        _EXCLUDE_CACHE[key] = IntervalSet.from_bed(exclude_file)
+    return _EXCLUDE_CACHE[key]
+
+def _end_repeat_sizes(coords, exclude_regions, params):
+    """Total size of exclusion regions overlapping the ends of each structural variant.
 
-    We look for ends with a large percentage in a repeat or where the end contains
-    an entire repeat.
+    Checks a window of end_buffer bases inside each end. Counts overlaps where a large
+    percentage of the window is in a repeat or the window contains most of a repeat.
+    Calls with identical coordinates share their totals.
     """
-    for feat in pybedtools.BedTool(in_file).intersect(pybedtools.BedTool(exclude_file), wao=True, nonamecheck=True):
-        us_chrom, us_start, us_end, name, other_chrom, other_start, other_end, overlap = feat.fields
-        if float(overlap) > 0:
-            other_size = float(other_end) - float(other_start)
-            other_pct = float(overlap) / other_size
-            us_pct = float(overlap) / (float(us_end) - float(us_start))
-            if us_pct > params["sv_pct"] or (other_pct > params["rpt_pct"]):
-                to_exclude[name].append(float(overlap))
-    return to_exclude
-
-def _create_end_file(in_file, coord, params, out_file):
-    with open(in_file) as in_handle:
-        with open(out_file, "w") as out_handle:
-            for line in in_handle:
-                parts = line.strip().split("\t")
-                name = "%s:%s-%s" % tuple(parts[:3])
-                curpos = int(parts[coord])
-                if coord == 1:
-                    start, end = curpos, curpos + params["end_buffer"]
-                else:
-                    start, end = curpos - params["end_buffer"], curpos
-                if start > 0:
-                    out_handle.write("\t".join([parts[0], str(start),
-                                                str(end), name])
-                                     + "\n")
-    return out_file
+    chrom_names = sorted(set(x[0] for x in coords))
+    chrom_codes = dict((c, i) for i, c in enumerate(chrom_names))
+    chroms = numpy.array([chrom_codes[x[0]] for x in coords], dtype=numpy.int64)
+    starts = numpy.array([int(x[1]) for x in coords], dtype=numpy.int64)
+    ends = numpy.array([int(x[2]) for x in coords], dtype=numpy.int64)
+    sizes = numpy.zeros(len(coords))
+    end_buffer = params["end_buffer"]
+    for end_starts, end_ends in [(starts, starts + end_buffer), (ends - end_buffer, ends)]:
+        valid = end_starts > 0
+        for i, chrom in enumerate(chrom_names):
+            idx = numpy.flatnonzero((chroms == i) & valid)
+            q_idx, rpt_starts, rpt_ends = exclude_regions.overlaps(chrom, end_starts[idx], end_ends[idx])
+            overlap = (numpy.minimum(end_ends[idx][q_idx], rpt_ends) -
+                       numpy.maximum(end_starts[idx][q_idx], rpt_starts)).astype(float)
+            end_pct = overlap / (end_ends[idx][q_idx] - end_starts[idx][q_idx])
+            rpt_pct = overlap / (rpt_ends - rpt_starts)
+            use = (end_pct > params["sv_pct"]) | (rpt_pct > params["rpt_pct"])
+            sizes += numpy.bincount(idx[q_idx[use]], weights=overlap[use], minlength=len(coords))
+    if len(coords) > 0:
+        _, same_call = numpy.unique(numpy.column_stack([chroms, starts, ends]), axis=0, return_inverse=True)
+        same_call = same_call.ravel()
+        sizes = numpy.bincount(same_call, weights=sizes)[same_call]
+    return sizes
 
 def get_sv_chroms(items, exclude_file):
     """Retrieve chromosomes to process on, avoiding extra skipped chromosomes.
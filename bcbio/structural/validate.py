@@ -5,22 +5,25 @@ a set of known regions.  Requires any overlap between ensemble set and
 known regions, and removes regions from analysis that overlap with
 exclusion regions.
 """
+import collections
 import csv
 import os
 
 import toolz as tz
-import numpy as np
-import pandas as pd
-import pybedtools
 
 from bcbio.log import logger
 from bcbio import utils
+from bcbio.bed.intervals import IntervalSet
 from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do
 from bcbio.structural import convert
-from bcbio.distributed.transaction import file_transaction, tx_tmpdir
+from bcbio.distributed.transaction import file_transaction
 from bcbio.variation import bedutils, vcfutils, ploidy, validateplot
 
+np = utils.LazyImport("numpy")
+pd = utils.LazyImport("pandas")
+pybedtools = utils.LazyImport("pybedtools")
+
 mpl = utils.LazyImport("matplotlib")
 plt = utils.LazyImport("matplotlib.pyplot")
 sns = utils.LazyImport("seaborn")
@@ -30,60 +33,144 @@ sns = utils.LazyImport("seaborn")
 def _evaluate_vcf(calls, truth_vcf, work_dir, data):
     out_file = os.path.join(work_dir, os.path.join("%s-sv-validate.csv" % dd.get_sample_name(data)))
     if not utils.file_exists(out_file):
+        matcher = SVTruthMatcher(truth_vcf, dd.get_callable_regions(data), data,
+                                 tz.get_in(["config", "algorithm", "max_breakpoint_distance"], data),
+                                 tz.get_in(["config", "algorithm", "min_reciprocal_overlap"], data))
         with file_transaction(data, out_file) as tx_out_file:
             with open(tx_out_file, "w") as out_handle:
                 writer = csv.writer(out_handle)
                 writer.writerow(["sample", "caller", "vtype", "metric", "value"])
                 for call in calls:
                     detail_dir = utils.safe_makedir(os.path.join(work_dir, call["variantcaller"]))
-                    for stats in _validate_caller_vcf(call["vrn_file"], truth_vcf, dd.get_callable_regions(data),
-                                                      call["variantcaller"], detail_dir, data):
-
+                    for stats in matcher.validate(call["vrn_file"], call["variantcaller"], detail_dir, data):
                         writer.writerow(stats)
     return out_file
 
-def _validate_caller_vcf(call_vcf, truth_vcf, callable_regions, svcaller, detail_dir, data):
-    """Validate a caller VCF against truth within callable regions, returning stratified stats
+SVCall = collections.namedtuple("SVCall", "fields, key, start, end, info")
+
+class SVTruthMatcher(object):
+    """Validate caller VCFs against a truth VCF within callable regions.
+
+    Truth and calls match when they overlap the same callable region, after
+    merging callable regions closer than the 10th percentile truth event size. Each
+    region holds the last call overlapping it. Truth events and their
+    overlapping regions are indexed once, so multiple callers are validated
+    in a single process without intersecting files with bedtools.
+
+    max_breakpoint_distance and min_reciprocal_overlap optionally restrict
+    matches to calls with nearby start and end coordinates or sufficient
+    overlap with the truth event.
     """
-    stats = _calculate_comparison_stats(truth_vcf)
-    callable_regions = bedutils.clean_file(callable_regions, data)
-    callable_bed = pybedtools.BedTool(callable_regions).merge(d=stats["merge_size"]).saveas().fn
-
-    match_calls = set([])
-    truth_stats = {"tp": [], "fn": [], "fp": []}
-    detail_handles = {}
-    for stat in ["tp", "tp-baseline", "fn", "fp"]:
-        detail_handles[stat] = open(os.path.join(detail_dir, "%s.vcf" % stat), "w")
-    calls_by_region = {}
-    call_vcf = slim_vcf(call_vcf, data)
-    for call in _callable_intersect(call_vcf, callable_bed, data):
-        calls_by_region[tuple(call[-3:])] = call
-
-    truth = None
-    regions = []
-    for parts in _callable_intersect(truth_vcf, callable_bed, data):
-        cur_region = tuple(parts[-3:])
-        cur_truth = parts
-        if truth is None:
-            truth = cur_truth
-        if _get_key(cur_truth) == _get_key(truth):
-            regions.append(cur_region)
-        else:
-            match_calls, truth_stats = _check_call(truth, regions, calls_by_region, match_calls, truth_stats,
-                                                   detail_handles)
-            truth = cur_truth
-            regions = [cur_region]
-    with utils.open_gzipsafe(call_vcf) as in_handle:
-            for call in (l.split("\t") for l in in_handle if not l.startswith("#")):
-                start, end = _get_start_end(call)
+    def __init__(self, truth_vcf, callable_regions, data,
+                 max_breakpoint_distance=None, min_reciprocal_overlap=None):
+        self.stats = _calculate_comparison_stats(truth_vcf)
+        self.max_breakpoint_distance = max_breakpoint_distance
+        self.min_reciprocal_overlap = min_reciprocal_overlap
+        callable_regions = bedutils.clean_file(callable_regions, data)
+        self._regions = {}
+        self._num_regions = 0
+        regions = IntervalSet.from_bed(callable_regions).merge(self.stats["merge_size"])
+        for chrom, starts, ends in regions.items():
+            self._regions[chrom] = (self._num_regions, starts, ends)
+            self._num_regions += len(starts)
+        self._truth = []
+        truth_calls = _read_sv_calls(truth_vcf)
+        truth_lo, truth_hi = self._find_regions(truth_calls)
+        for truth, lo, hi in zip(truth_calls, truth_lo.tolist(), truth_hi.tolist()):
+            if hi > lo:
+                # group consecutive records for the same event
+                if self._truth and self._truth[-1][0].key == truth.key:
+                    self._truth[-1][1].extend(range(lo, hi))
+                else:
+                    self._truth.append((truth, list(range(lo, hi))))
+
+    def _find_regions(self, calls):
+        """Range of overlapping callable region indexes for each call.
+
+        Merged regions do not overlap, so both starts and ends are sorted and
+        overlapping regions are found with binary searches.
+        """
+        lo = np.zeros(len(calls), dtype=np.int64)
+        hi = np.zeros(len(calls), dtype=np.int64)
+        by_chrom = collections.defaultdict(list)
+        for i, call in enumerate(calls):
+            by_chrom[call.fields[0]].append(i)
+        for chrom, idx in by_chrom.items():
+            if chrom in self._regions:
+                offset, region_starts, region_ends = self._regions[chrom]
+                idx = np.array(idx, dtype=np.int64)
+                starts = np.array([calls[i].start for i in idx], dtype=np.int64)
+                ends = np.array([calls[i].end for i in idx], dtype=np.int64)
+                cur_lo = np.searchsorted(region_ends, starts, side="right")
+                cur_hi = np.maximum(np.searchsorted(region_starts, ends, side="left"), cur_lo)
+                lo[idx] = cur_lo + offset
+                hi[idx] = cur_hi + offset
+        return lo, hi
+
+    def _calls_by_region(self, calls):
+        """Index of the last call overlapping each callable region, or -1 for regions without calls.
+        """
+        lo, hi = self._find_regions(calls)
+        counts = hi - lo
+        call_idx = np.repeat(np.arange(len(calls)), counts)
+        region_idx = np.repeat(lo, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        out = np.full(self._num_regions, -1, dtype=np.int64)
+        np.maximum.at(out, region_idx, call_idx)
+        return out
+
+    def validate(self, call_vcf, svcaller, detail_dir, data):
+        """Validate a caller VCF against truth within callable regions, returning stratified stats
+        """
+        calls = _read_sv_calls(slim_vcf(call_vcf, data))
+        calls_by_region = self._calls_by_region(calls).tolist()
+        match_calls = set([])
+        truth_stats = {"tp": [], "fn": [], "fp": []}
+        detail_handles = {}
+        try:
+            for stat in ["tp", "tp-baseline", "fn", "fp"]:
+                detail_handles[stat] = open(os.path.join(detail_dir, "%s.vcf" % stat), "w")
+            for truth, regions in self._truth:
+                cur_matches = []
+                for region in regions:
+                    call_i = calls_by_region[region]
+                    if call_i >= 0:
+                        call = calls[call_i]
+                        if call.key not in match_calls and self._is_compatible(call, truth):
+                            cur_matches.append(call)
+                        match_calls.add(call.key)
+                if cur_matches:
+                    for cur_match in cur_matches:
+                        detail_handles["tp"].write("\t".join(cur_match.fields) + "\n")
+                    detail_handles["tp-baseline"].write("\t".join(truth.fields) + "\n")
+                    truth_stats["tp"].append(truth.info)
+                else:
+                    detail_handles["fn"].write("\t".join(truth.fields) + "\n")
+                    truth_stats["fn"].append(truth.info)
+            for call in calls:
+                if call.key not in match_calls and _event_passes(call.info, self.stats):
+                    detail_handles["fp"].write("\t".join(call.fields) + "\n")
+                    truth_stats["fp"].append(call.info)
+        finally:
+            for handle in detail_handles.values():
+                handle.close()
+        return _to_csv(truth_stats, self.stats, dd.get_sample_name(data), svcaller)
+
+    def _is_compatible(self, call, truth):
+        return _is_compatible(call, truth, self.max_breakpoint_distance, self.min_reciprocal_overlap)
+
+def _read_sv_calls(in_file):
+    """Parse SV records from a VCF, skipping BNDs without END coordinates.
+    """
+    out = []
+    with utils.open_gzipsafe(in_file) as in_handle:
+        for line in in_handle:
+            if not line.startswith("#"):
+                parts = line.rstrip("\r\n").split("\t")
+                start, end = _get_start_end(parts)
                 if end:
-                    key = _get_key(call)
-                    if key not in match_calls:
-                        call_info = _summarize_call(key)
-                        if _event_passes(call_info, stats):
-                            detail_handles["fp"].write("\t".join(call))
-                            truth_stats["fp"].append(call_info)
-    return _to_csv(truth_stats, stats, dd.get_sample_name(data), svcaller)
+                    key = _get_key(parts)
+                    out.append(SVCall(parts, key, int(start), int(end), _summarize_call(key)))
+    return out
 
 def _get_key(call):
     return tuple(call[:5] + call[7:8])
@@ -135,26 +222,6 @@ def _get_start_end(parts, index=7):
         return start, end
     return None, None
 
-def _callable_intersect(in_file, callable_bed, data):
-    """Return list of original VCF SVs intersected by callable regions.
-
-    Does not try to handle BNDs. We should resolve these and return where possible.
-    """
-    with tx_tmpdir(data) as tmpdir:
-        in_bed = os.path.join(tmpdir, "%s-convert.bed" % utils.splitext_plus(os.path.basename(in_file))[0])
-        with utils.open_gzipsafe(in_file) as in_handle:
-            with open(in_bed, "w") as out_handle:
-                for parts in (l.split("\t") for l in in_handle if not l.startswith("#")):
-                    start, end = _get_start_end(parts)
-                    if end:
-                        out_handle.write("\t".join([parts[0], start, end] + parts) + "\n")
-        out_file = os.path.join(tmpdir, "%s-subset.tsv" % utils.splitext_plus(os.path.basename(in_file))[0])
-        cmd = "bedtools intersect -a {in_bed} -b {callable_bed} -wa -wb > {out_file}"
-        do.run(cmd.format(**locals()), "Intersect VCF by callable")
-        with open(out_file) as in_handle:
-            for line in in_handle:
-                yield line.rstrip().split("\t")[3:]
-
 def _summarize_call(parts):
     """Provide summary metrics on size and svtype for a SV call.
     """
@@ -163,34 +230,26 @@ def _summarize_call(parts):
     start, end = _get_start_end(parts, index=-1)
     return {"svtype": svtype, "size": int(end) - int(start)}
 
-def _is_compatible(call, truth):
+def _is_compatible(call, truth, max_breakpoint_distance=None, min_reciprocal_overlap=None):
     """Determine if a call and truth set are equivalent matches.
 
-    Entry point to restrict matches by call type or size.
-    """
-    call = _summarize_call(_get_key(call))
-    truth = _summarize_call(_get_key(truth))
-    return call["size"] < (truth["size"] * 2)
-
-def _check_call(truth, regions, calls_by_region, match_calls, truth_stats, out_handles):
-    """Validate if we have a call that matches this given truth set within callable regions.
+    Entry point to restrict matches by call type or size. Calls must be less than
+    twice the truth size and, if provided, have start and end within
+    max_breakpoint_distance of the truth and overlap at least min_reciprocal_overlap
+    of both call and truth sizes.
     """
-    cur_matches = []
-    for region in regions:
-        cur_match_call = calls_by_region.get(region)
-        if cur_match_call:
-            if _get_key(cur_match_call) not in match_calls and _is_compatible(cur_match_call, truth):
-                cur_matches.append(cur_match_call)
-            match_calls.add(_get_key(cur_match_call))
-    if cur_matches:
-        for cur_match in cur_matches:
-            out_handles["tp"].write("\t".join(cur_match) + "\n")
-        out_handles["tp-baseline"].write("\t".join(truth) + "\n")
-        truth_stats["tp"].append(_summarize_call(_get_key(truth)))
-    else:
-        out_handles["fn"].write("\t".join(truth) + "\n")
-        truth_stats["fn"].append(_summarize_call(_get_key(truth)))
-    return match_calls, truth_stats
+    if call.info["size"] >= truth.info["size"] * 2:
+        return False
+    if max_breakpoint_distance is not None:
+        if (abs(call.start - truth.start) > max_breakpoint_distance or
+                abs(call.end - truth.end) > max_breakpoint_distance):
+            return False
+    if min_reciprocal_overlap is not None:
+        overlap = min(call.end, truth.end) - max(call.start, truth.start)
+        if (overlap <= 0 or overlap < min_reciprocal_overlap * call.info["size"] or
+                overlap < min_reciprocal_overlap * truth.info["size"]):
+            return False
+    return True
 
 def slim_vcf(in_file, data):
     """Remove larger annotations which slow down VCF processing
@@ -5,7 +5,6 @@ https://github.com/jewmanchue/wham
 import collections
 import os
 
-import vcf
 
 from bcbio import utils
 from bcbio.bam import ref
@@ -16,6 +15,8 @@ from bcbio.structural import shared
 from bcbio.variation import vcfutils
 from bcbio.provenance import do
 
+vcf = utils.LazyImport("vcf")
+
 def run(items, background=None):
     """Detect copy number variations from batched set of samples using WHAM.
     """
@@ -15,17 +15,13 @@ from bcbio.upload import filesystem
 from bcbio.pipeline import qcsummary
 
 # Avoid bioblend import errors, raising at time of use
-try:
-    import bioblend
-    from bioblend.galaxy import GalaxyInstance
-    import simplejson
-except ImportError:
-    GalaxyInstance, bioblend, simplejson = None, None, None
+bioblend_galaxy = utils.lazy_import_optional("bioblend.galaxy")
+simplejson = utils.lazy_import_optional("simplejson")
 
 def update_file(finfo, sample_info, config):
     """Update file in Galaxy data libraries.
     """
-    if GalaxyInstance is None:
+    if bioblend_galaxy is None or simplejson is None:
         raise ImportError("Could not import bioblend.galaxy")
     if "dir" not in config:
         raise ValueError("Galaxy upload requires `dir` parameter in config specifying the "
@@ -64,7 +60,7 @@ def _galaxy_library_upload(finfo, sample_info, config):
         galaxy_url = config["galaxy_url"]
         if not galaxy_url.endswith("/"):
             galaxy_url += "/"
-        gi = GalaxyInstance(galaxy_url, config["galaxy_api_key"])
+        gi = bioblend_galaxy.GalaxyInstance(galaxy_url, config["galaxy_api_key"])
     else:
         raise ValueError("Galaxy upload requires `galaxy_url` and `galaxy_api_key` in config")
     if storage_file and sample_info and not finfo.get("index", False) and not finfo.get("plus", False):
@@ -79,7 +75,7 @@ def _to_datalibrary_safe(fname, gi, folder_name, sample_info, config):
         try:
             _to_datalibrary(fname, gi, folder_name, sample_info, config)
             break
-        except (simplejson.scanner.JSONDecodeError, bioblend.galaxy.client.ConnectionError) as e:
+        except (simplejson.scanner.JSONDecodeError, bioblend_galaxy.client.ConnectionError) as e:
             num_tries += 1
             if num_tries > max_tries:
                 raise
@@ -8,6 +8,7 @@ import shutil
 import contextlib
 import itertools
 import functools
+import pkgutil
 import random
 from six.moves import configparser
 import fnmatch
@@ -323,14 +324,14 @@ def file_plus_index(fname):
 def remove_plus(orig):
     """Remove a fils, including biological index files.
     """
-    for ext in ["", ".idx", ".gbi", ".tbi", ".bai"]:
+    for ext in ["", ".idx", ".gbi", ".fqi", ".tbi", ".bai"]:
         if os.path.exists(orig + ext):
              remove_safe(orig + ext)
 
 def copy_plus(orig, new):
     """Copy a fils, including biological index files.
     """
-    for ext in ["", ".idx", ".gbi", ".tbi", ".bai"]:
+    for ext in ["", ".idx", ".gbi", ".fqi", ".tbi", ".bai"]:
         if os.path.exists(orig + ext) and (not os.path.lexists(new + ext) or not os.path.exists(new + ext)):
             shutil.copyfile(orig + ext, new + ext)
 
@@ -340,7 +341,7 @@ def symlink_plus(orig, new):
     orig = os.path.abspath(orig)
     if not os.path.exists(orig):
         raise RuntimeError("File not found: %s" % orig)
-    for ext in ["", ".idx", ".gbi", ".tbi", ".bai"]:
+    for ext in ["", ".idx", ".gbi", ".fqi", ".tbi", ".bai"]:
         if os.path.exists(orig + ext) and (not os.path.lexists(new + ext) or not os.path.exists(new + ext)):
             with chdir(os.path.dirname(new)):
                 remove_safe(new + ext)
@@ -859,3 +860,13 @@ class LazyImport(types.ModuleType):
     def __repr__(self):
         return "<module '%s' will be lazily loaded>" %\
                 object.__getattribute__(self,'__name__')
+
+def lazy_import_optional(name):
+    """Lazily import an optional module, returning None if it is not installed.
+
+    Only looks for the top level package, without importing it, so we retain
+    fast startup while supporting checks for missing optional dependencies.
+    """
+    if pkgutil.find_loader(name.split(".")[0]) is None:
+        return None
+    return LazyImport(name)
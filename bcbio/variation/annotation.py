@@ -6,7 +6,6 @@ import glob
 import gzip
 import os
 
-import pybedtools
 import toolz as tz
 
 from bcbio import broad, utils
@@ -15,6 +14,8 @@ from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do
 from bcbio.variation import vcfutils
 
+pybedtools = utils.LazyImport("pybedtools")
+
 def get_gatk_annotations(config, include_depth=True, include_baseqranksum=True,
                          gatk_input=True):
     """Retrieve annotations to use for GATK VariantAnnotator.
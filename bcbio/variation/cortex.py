@@ -14,9 +14,6 @@ import subprocess
 import itertools
 import shutil
 
-import pysam
-from Bio import Seq
-from Bio.SeqIO.QualityIO import FastqGeneralIterator
 
 from bcbio import bam
 from bcbio.distributed.transaction import file_transaction
@@ -24,6 +21,11 @@ from bcbio.pipeline import config_utils
 from bcbio.pipeline.shared import subset_variant_regions
 from bcbio.utils import file_exists, safe_makedir
 from bcbio.variation import vcfutils
+from bcbio import utils
+
+pysam = utils.LazyImport("pysam")
+Seq = utils.LazyImport("Bio.Seq")
+QualityIO = utils.LazyImport("Bio.SeqIO.QualityIO")
 
 def run_cortex(align_bams, items, ref_file, assoc_files, region=None,
                out_file=None):
@@ -323,7 +325,7 @@ def _count_fastq_reads(in_fastq, min_reads):
     """
     with open(in_fastq) as in_handle:
         items = list(itertools.takewhile(lambda i : i <= min_reads,
-                                         (i for i, _ in enumerate(FastqGeneralIterator(in_handle)))))
+                                         (i for i, _ in enumerate(QualityIO.FastqGeneralIterator(in_handle)))))
     return len(items)
 
 def get_sample_name(align_bam):
@@ -6,10 +6,6 @@ import collections
 import itertools
 import os
 import shutil
-import yaml
-import pybedtools
-import numpy as np
-import pysam
 import toolz as tz
 
 from bcbio import bam, utils
@@ -21,6 +17,10 @@ from bcbio.provenance import do
 from bcbio.pipeline import shared
 from bcbio.structural import regions
 
+pybedtools = utils.LazyImport("pybedtools")
+np = utils.LazyImport("numpy")
+pysam = utils.LazyImport("pysam")
+
 GENOME_COV_THRESH = 0.40  # percent of genome covered for whole genome analysis
 OFFTARGET_THRESH = 0.01  # percent of offtarget reads required to be capture (not amplification) based
 DEPTH_THRESHOLDS = [1, 5, 10, 20, 50, 100, 250, 500, 1000, 5000, 10000, 50000]
@@ -128,40 +128,21 @@ def _subset_to_variant_regions(callable_file, variant_regions, data):
             pybedtools.BedTool(callable_file).intersect(variant_regions).saveas(tx_out_file)
     return out_file
 
-def _get_cache_file(data, target_name):
-    prefix = os.path.join(
-        utils.safe_makedir(os.path.join(dd.get_work_dir(data), "align", dd.get_sample_name(data))),
-        "%s-coverage" % (dd.get_sample_name(data)))
-    cache_file = prefix + "-" + target_name + "-stats.yaml"
-    return cache_file
-
-def _read_cache(cache_file, reuse_cmp_files):
-    reuse_cmp_file = [fn for fn in reuse_cmp_files if fn]
-    if all(utils.file_uptodate(cache_file, fn) for fn in reuse_cmp_file):
-        with open(cache_file) as in_handle:
-            return yaml.safe_load(in_handle)
-    return dict()
-
-def _write_cache(cache, cache_file):
-    with open(cache_file, "w") as out_handle:
-        yaml.safe_dump(cache, out_handle, default_flow_style=False, allow_unicode=False)
-
 def get_average_coverage(target_name, bed_file, data, bam_file=None):
     if not bam_file:
         bam_file = dd.get_align_bam(data) or dd.get_work_bam(data)
-    cache_file = _get_cache_file(data, target_name)
-    cache = _read_cache(cache_file, [bam_file, bed_file])
-    if "avg_coverage" in cache:
-        return int(cache["avg_coverage"])
+    avg_cov = readstats.get_metric(data, "avg_coverage", bam_file, bed_file=bed_file,
+                                   target_name=target_name)
+    if avg_cov is not None:
+        return int(avg_cov)
 
     if bed_file:
         avg_cov = _average_bed_coverage(bed_file, target_name, data)
     else:
         avg_cov = _average_genome_coverage(data, bam_file)
 
-    cache["avg_coverage"] = int(avg_cov)
-    _write_cache(cache, cache_file)
-    return int(avg_cov)
+    return int(readstats.set_metric(data, "avg_coverage", int(avg_cov), bam_file, bed_file=bed_file,
+                                    target_name=target_name))
 
 def _average_genome_coverage(data, bam_file):
     """Quickly calculate average coverage for whole genome files using indices.
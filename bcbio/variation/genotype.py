@@ -104,13 +104,9 @@ def combine_multiple_callers(samples):
 def _split_by_ready_regions(ext, file_key, dir_ext_fn):
     """Organize splits based on regions generated by parallel_prep_region.
 
-    Sort splits so largest regions analyzed first, avoiding potentially lagging runs
-    at end.
+    Sort splits so the most expensive regions, by estimated region cost, are
+    analyzed first, avoiding potentially lagging runs at end.
     """
-    def _sort_by_size(region_w_bams):
-        region, _ = region_w_bams
-        _, start, end = region
-        return end - start
     def _assign_bams_to_regions(data):
         """Ensure BAMs aligned with input regions, either global or individual.
         """
@@ -131,7 +127,8 @@ def _split_by_ready_regions(ext, file_key, dir_ext_fn):
             out_file = os.path.join(out_dir, "%s%s" % (name, ext))
             assert isinstance(data["region"], (list, tuple))
             out_parts = []
-            for r, work_bams in sorted(_assign_bams_to_regions(data), key=_sort_by_size, reverse=True):
+            for r, work_bams in pregion.sort_by_cost(list(_assign_bams_to_regions(data)), data,
+                                                     key=lambda x: x[0]):
                 out_region_dir = os.path.join(out_dir, r[0])
                 out_region_file = os.path.join(out_region_dir,
                                                "%s-%s%s" % (name, pregion.to_safestr(r), ext))
@@ -5,7 +5,6 @@ in addition to somatic variants. Different callers distinguish germline calls
 in different ways. This unifies the output and extracts into a separate VCF
 with germline calls included.
 """
-import cyvcf2
 
 from bcbio import utils
 from bcbio.distributed.transaction import file_transaction
@@ -13,6 +12,8 @@ from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do
 from bcbio.variation import vcfutils
 
+cyvcf2 = utils.LazyImport("cyvcf2")
+
 def split_somatic(items):
     """Split somatic batches, adding a germline target.
 
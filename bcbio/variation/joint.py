@@ -11,7 +11,6 @@ import collections
 import math
 import os
 
-import pysam
 import toolz as tz
 
 from bcbio import broad, utils
@@ -23,6 +22,8 @@ from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do
 from bcbio.variation import bamprep, gatkjoint, genotype, multi, vcfutils
 
+pysam = utils.LazyImport("pysam")
+
 SUPPORTED = {"general": ["freebayes", "platypus", "samtools"],
              "gatk": ["gatk-haplotype"],
              "gvcf": ["strelka2"],
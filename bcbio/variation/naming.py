@@ -7,13 +7,14 @@ Uses Devon Ryan's great collection of contig mappings:
 https://github.com/dpryan79/ChromosomeMappings
 """
 import os
-import requests
 
 from bcbio import utils
 from bcbio.bam import ref
 from bcbio.distributed.transaction import file_transaction
 from bcbio.variation import vcfutils
 
+requests = utils.LazyImport("requests")
+
 # ## Cached results
 GMAP = {}
 
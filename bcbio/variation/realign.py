@@ -1,11 +1,13 @@
 """Perform realignment of BAM files around indels using the GATK toolkit.
 """
 import os
-import pysam
 
 from bcbio.log import logger
 from bcbio.distributed.transaction import file_transaction
 from bcbio.pipeline.shared import subset_variant_regions
+from bcbio import utils
+
+pysam = utils.LazyImport("pysam")
 
 # ## GATK realignment
 
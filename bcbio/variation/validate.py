@@ -7,25 +7,27 @@ validity of pipeline updates and algorithm changes.
 import collections
 import contextlib
 import csv
+import functools
 import hashlib
 import os
 import shutil
 import subprocess
 import time
 
-from pysam import VariantFile
 import toolz as tz
 import yaml
 
 from bcbio import broad, utils
 from bcbio.bam import callable
 from bcbio.cwl import cwlutils
+from bcbio.distributed.multi import run_multicore, zeromq_aware_logging
 from bcbio.distributed.transaction import file_transaction
-from bcbio.heterogeneity import bubbletree
 from bcbio.pipeline import config_utils, shared
 from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do
-from bcbio.variation import annotation, bedutils, validateplot, vcfutils, multi, naming
+from bcbio.variation import annotation, bedutils, validateplot, vcfstats, vcfutils, multi, naming
+
+pysam = utils.LazyImport("pysam")
 
 # ## Individual sample comparisons
 
@@ -293,7 +295,7 @@ def _pick_best_quality_score(vrn_file):
     to_check = 25
     scores = collections.defaultdict(int)
     try:
-        in_handle = VariantFile(vrn_file)
+        in_handle = pysam.VariantFile(vrn_file)
     except ValueError:
         raise ValueError("Failed to parse input file in preparation for validation: %s" % vrn_file)
     with contextlib.closing(in_handle) as val_in:
@@ -595,29 +597,115 @@ def _get_validate_plotdata_yaml(grading_file, data):
 
 # ## Summarize by frequency
 
-def freq_summary(val_file, call_file, truth_file, target_name):
+def freq_summary(val_file, call_file, truth_file, target_name, config=None, cores=1):
     """Summarize true and false positive calls by variant type and frequency.
 
     Resolve differences in true/false calls based on output from hap.py:
     https://github.com/sequencing/hap.py
+
+    Merge joins the sorted validation output with truth and call files
+    retrieved by chromosome from their indexes, keeping only records at
+    the current position in memory. With multiple cores, chromosomes are
+    summarized in parallel.
     """
     out_file = "%s-freqs.csv" % utils.splitext_plus(val_file)[0]
-    truth_freqs = _read_truth_freqs(truth_file)
-    call_freqs = _read_call_freqs(call_file, target_name)
-    with VariantFile(val_file) as val_in:
-        with open(out_file, "w") as out_handle:
-            writer = csv.writer(out_handle)
-            writer.writerow(["vtype", "valclass", "freq"])
-            for rec in val_in:
-                call_type = _classify_rec(rec)
-                val_type = _get_validation_status(rec)
-                key = _get_key(rec)
-                freq = truth_freqs.get(key, call_freqs.get(key, 0.0))
-                writer.writerow([call_type, val_type, freq])
+    header = ["vtype", "valclass", "freq"]
+    out_dir = os.path.dirname(os.path.abspath(val_file))
+    val_file, call_file, truth_file = [_bgzip_and_index_local(x, out_dir, config)
+                                       for x in [val_file, call_file, truth_file]]
+    with file_transaction(out_file) as tx_out_file:
+        if cores > 1:
+            with pysam.VariantFile(val_file) as val_in:
+                contigs = list(val_in.header.contigs)
+            work_dir = utils.safe_makedir("%s-parts" % utils.splitext_plus(tx_out_file)[0])
+            parallel = {"type": "local", "num_jobs": cores, "cores_per_job": 1}
+            part_files = run_multicore(_freq_summary_contig,
+                                       [[val_file, call_file, truth_file, target_name, contig,
+                                         os.path.join(work_dir, "%s.csv" % i), config or {}]
+                                        for i, contig in enumerate(contigs)],
+                                       config or {}, parallel)
+            with open(tx_out_file, "w") as out_handle:
+                csv.writer(out_handle).writerow(header)
+                for part_file in part_files:
+                    with open(part_file) as in_handle:
+                        shutil.copyfileobj(in_handle, out_handle)
+            shutil.rmtree(work_dir)
+        else:
+            with open(tx_out_file, "w") as out_handle:
+                writer = csv.writer(out_handle)
+                writer.writerow(header)
+                writer.writerows(_freq_rows(val_file, call_file, truth_file, target_name))
     return out_file
 
-def _get_key(rec):
-    return (rec.contig, rec.pos, rec.ref, rec.alts[0])
+def _bgzip_and_index_local(in_file, out_dir, config):
+    """Provide an indexed VCF, preparing it in the validation directory if needed.
+
+    Avoids writing next to shared truth sets and call files, using those
+    already bgzipped and indexed in place.
+    """
+    if in_file.endswith(".gz") and (utils.file_exists(in_file + ".tbi") or utils.file_exists(in_file + ".csi")):
+        return in_file
+    return vcfutils.bgzip_and_index(in_file, config, remove_orig=False, out_dir=out_dir)
+
+@utils.map_wrap
+@zeromq_aware_logging
+def _freq_summary_contig(val_file, call_file, truth_file, target_name, contig, out_file, config):
+    with open(out_file, "w") as out_handle:
+        csv.writer(out_handle).writerows(_freq_rows(val_file, call_file, truth_file, target_name, contig))
+    return [out_file]
+
+def _freq_rows(val_file, call_file, truth_file, target_name, contig=None):
+    """Generate variant type, validation class and frequency for validated records.
+
+    Frequencies come from the truth set when available, otherwise from the
+    target sample in the call file.
+    """
+    with pysam.VariantFile(val_file) as val_in, pysam.VariantFile(truth_file) as truth_in, \
+            pysam.VariantFile(call_file) as call_in:
+        cur_contig = None
+        for rec in (_fetch_contig(val_in, contig) if contig else val_in):
+            if rec.contig != cur_contig:
+                cur_contig = rec.contig
+                truth_freqs = _LocusWindow(_fetch_contig(truth_in, cur_contig), _truth_freq)
+                call_freqs = _LocusWindow(_fetch_contig(call_in, cur_contig),
+                                          functools.partial(_call_freq, sample_name=target_name))
+            alleles = (rec.ref, rec.alts[0])
+            freq = truth_freqs.get(rec.pos).get(alleles, call_freqs.get(rec.pos).get(alleles, 0.0))
+            yield [_classify_rec(rec), _get_validation_status(rec), freq]
+
+def _fetch_contig(vcf_in, contig):
+    """Retrieve records on a chromosome from an indexed VCF, handling chromosomes without records.
+    """
+    if vcf_in.index is None:
+        raise ValueError("Retrieving records on %s requires an indexed VCF" % contig)
+    if contig not in vcf_in.index:
+        return iter([])
+    return vcf_in.fetch(contig)
+
+class _LocusWindow(object):
+    """Frequencies at a single position from a position sorted stream of records.
+
+    value_fn returns a ((ref, alt), freq) pair for a record, or None to skip
+    it. Positions must be requested in increasing order.
+    """
+    def __init__(self, recs, value_fn):
+        self._recs = iter(recs)
+        self._value_fn = value_fn
+        self._next = next(self._recs, None)
+        self._pos = None
+        self._cur = {}
+
+    def get(self, pos):
+        if pos != self._pos:
+            self._pos = pos
+            self._cur = {}
+            while self._next is not None and self._next.pos <= pos:
+                if self._next.pos == pos:
+                    val = self._value_fn(self._next)
+                    if val is not None:
+                        self._cur[val[0]] = val[1]
+                self._next = next(self._recs, None)
+        return self._cur
 
 def _classify_rec(rec):
     """Determine class of variant in the record.
@@ -632,28 +720,17 @@ def _get_validation_status(rec):
     """
     return rec.info["type"]
 
-def _read_call_freqs(in_file, sample_name):
-    """Identify frequencies for calls in the input file.
+def _call_freq(rec, sample_name):
+    """Frequency of a passing call in the target sample.
     """
-    out = {}
-    with VariantFile(in_file) as call_in:
-        for rec in call_in:
-            if rec.filter.keys() == ["PASS"]:
-                for name, sample in rec.samples.items():
-                    if name == sample_name:
-                        alt, depth, freq = bubbletree.sample_alt_and_depth(rec, sample)
-                        if freq is not None:
-                            out[_get_key(rec)] = freq
-    return out
+    if rec.filter.keys() == ["PASS"] and sample_name in rec.samples:
+        alt, depth, freq = vcfstats.sample_alt_and_depth(rec, rec.samples[sample_name])
+        if freq is not None:
+            return (rec.ref, rec.alts[0] if rec.alts else ""), freq
 
-def _read_truth_freqs(in_file):
+def _truth_freq(rec):
     """Read frequency of calls from truth VCF.
 
     Currently handles DREAM data, needs generalization for other datasets.
     """
-    out = {}
-    with VariantFile(in_file) as bcf_in:
-        for rec in bcf_in:
-            freq = float(rec.info.get("VAF", 1.0))
-            out[_get_key(rec)] = freq
-    return out
+    return (rec.ref, rec.alts[0]), float(rec.info.get("VAF", 1.0))
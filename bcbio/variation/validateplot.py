@@ -7,13 +7,14 @@ import collections
 import os
 
 from distutils.version import LooseVersion
-import numpy as np
-import pandas as pd
 
 from bcbio.log import logger
 from bcbio import utils
 from bcbio.variation import bamprep
 
+np = utils.LazyImport("numpy")
+pd = utils.LazyImport("pandas")
+
 mpl = utils.LazyImport("matplotlib")
 plt = utils.LazyImport("matplotlib.pyplot")
 mpl_ticker = utils.LazyImport("matplotlib.ticker")
@@ -16,7 +16,6 @@ import sys
 from six.moves import zip
 
 import toolz as tz
-import pybedtools
 
 from bcbio import broad, utils
 from bcbio.distributed.transaction import file_transaction
@@ -26,6 +25,8 @@ from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do
 from bcbio.variation import annotation, bamprep, bedutils, vcfutils
 
+pybedtools = utils.LazyImport("pybedtools")
+
 def _is_bed_file(target):
     return target and isinstance(target, basestring) and os.path.isfile(target)
 
@@ -14,7 +14,8 @@ from bcbio.variation import samtools, vcfutils
 from bcbio.variation.vcfutils import (combine_variant_files, write_empty_vcf,
                                       get_paired_bams, bgzip_and_index)
 
-import pysam
+pysam = utils.LazyImport("pysam")
+
 
 
 def run_varscan(align_bams, items, ref_file, assoc_files,
@@ -0,0 +1,301 @@
+"""Collect per-record VCF statistics in a single pass, cached next to the VCF.
+
+Filtering, heterogeneity and validation steps each need small per-record
+summaries of the same VCF files: read depths, allele frequencies, variant
+types and genotypes. `get_stats` reads a VCF once, stores these as compact
+NumPy arrays in a cache file alongside it, and returns a `VcfStats` object
+that consumers query instead of re-parsing the VCF. The cache is reused
+while the VCF size and modification time are unchanged.
+
+Per-sample values are only collected for requested samples, so callers
+needing only record level statistics like INFO depth skip parsing sample
+columns entirely. Samples requested later are added to the existing cache.
+"""
+import array
+import math
+import os
+
+from bcbio import utils
+from bcbio.distributed.transaction import file_transaction
+from bcbio.log import logger
+
+np = utils.LazyImport("numpy")
+pysam = utils.LazyImport("pysam")
+
+# Increment when the stored arrays change, to invalidate existing caches
+CACHE_VERSION = 2
+
+# Record flags
+PASS = 1
+PASS_OR_REJECT = 2
+SNP = 4
+BIALLELIC = 8
+
+# Genotype classes
+GT_MISSING, GT_HOM_REF, GT_HET, GT_HOM_ALT = range(4)
+GT_NAMES = ["missing", "hom_ref", "het", "hom_alt"]
+
+def get_stats(in_file, samples=None):
+    """Retrieve statistics for a VCF file, using a cached copy when up to date.
+
+    samples -- Names of samples to collect per-sample values for. Defaults to
+    all samples in the VCF; an empty list collects only record level values.
+    """
+    cache_file = "%s-vcfstats.npz" % utils.splitext_plus(in_file)[0]
+    source = _source_signature(in_file)
+    if utils.file_exists(cache_file):
+        try:
+            with np.load(cache_file) as npz:
+                arrays = dict((k, npz[k]) for k in npz.files)
+            if (int(arrays["version"]) == CACHE_VERSION and
+                    arrays["source"].tolist() == source):
+                missing = _missing_samples(arrays, samples)
+                if not missing:
+                    return VcfStats(arrays)
+                samples = [str(x) for x in arrays["sample_names"]] + missing
+        except (IOError, OSError, ValueError, KeyError) as e:
+            logger.info("Ignoring invalid VCF statistics cache %s: %s" % (cache_file, e))
+    arrays = _collect(in_file, samples)
+    arrays["version"] = np.array(CACHE_VERSION)
+    arrays["source"] = np.array(source)
+    try:
+        with file_transaction(cache_file) as tx_cache_file:
+            with open(tx_cache_file, "wb") as out_handle:
+                np.savez(out_handle, **arrays)
+    except (IOError, OSError) as e:
+        logger.info("Could not cache VCF statistics for %s: %s" % (in_file, e))
+    return VcfStats(arrays)
+
+def get_avg_depth(in_file):
+    """Average INFO depth of called variants, rounded up.
+
+    Collects and caches only record level statistics, so reruns read the
+    cache instead of the VCF.
+    """
+    return get_stats(in_file, samples=[]).avg_depth()
+
+def _mean_depth(depths):
+    if len(depths) > 0:
+        return int(math.ceil(depths.mean()))
+    else:
+        return 0
+
+def _source_signature(in_file):
+    st = os.stat(in_file)
+    return [float(st.st_size), float(st.st_mtime)]
+
+def _missing_samples(arrays, samples):
+    """Requested samples present in the VCF but not collected in cached arrays.
+    """
+    header_samples = [str(x) for x in arrays["header_samples"]]
+    collected = set(str(x) for x in arrays["sample_names"])
+    wanted = header_samples if samples is None else [x for x in header_samples if x in samples]
+    return [x for x in wanted if x not in collected]
+
+def sample_alt_and_depth(rec, sample):
+    """Flexibly get ALT allele and depth counts, handling FreeBayes, MuTect and other cases.
+    """
+    if sample and "AD" in sample:
+        all_counts = [int(x) for x in sample["AD"]]
+        alt_counts = sum(all_counts[1:])
+        depth = sum(all_counts)
+    elif sample and "AO" in sample and sample.get("RO") is not None:
+        alts = sample["AO"]
+        if not isinstance(alts, (list, tuple)):
+            alts = [alts]
+        alt_counts = sum([int(x) for x in alts])
+        depth = alt_counts + int(sample["RO"])
+    elif "DP" in rec.info and "AF" in rec.info:
+        af = rec.info["AF"][0] if isinstance(rec.info["AF"], (tuple, list)) else rec.info["AF"]
+        return None, rec.info["DP"], af
+    else:
+        alt_counts = None
+    if alt_counts is None or depth is None or depth == 0:
+        return None, None, None
+    else:
+        freq = float(alt_counts) / float(depth)
+        return alt_counts, depth, freq
+
+def _genotype_class(sample):
+    indices = sample.allele_indices
+    if not indices or any(x is None for x in indices):
+        return GT_MISSING
+    elif all(x == 0 for x in indices):
+        return GT_HOM_REF
+    elif len(set(indices)) > 1:
+        return GT_HET
+    else:
+        return GT_HOM_ALT
+
+def _collect(in_file, samples=None):
+    """Stream through a VCF, collecting per-record values and per-sample values for samples.
+
+    Values accumulate in typed arrays rather than Python lists to keep
+    memory low for whole genome VCFs.
+    """
+    nan = float("nan")
+    chrom_codes = {}
+    chroms = array.array("i")
+    positions = array.array("q")
+    flags = array.array("B")
+    info_dp = array.array("d")
+    info_depth = array.array("d")
+    info_freq = array.array("d")
+    depths = array.array("d")
+    freqs = array.array("d")
+    genotypes = array.array("b")
+    nonref = array.array("b")
+    with pysam.VariantFile(in_file) as bcf_in:
+        header_samples = list(bcf_in.header.samples)
+    sample_names = [x for x in header_samples if samples is None or x in samples]
+    with pysam.VariantFile(in_file, drop_samples=not sample_names) as bcf_in:
+        has_dp = "DP" in bcf_in.header.info
+        for rec in bcf_in:
+            if rec.chrom not in chrom_codes:
+                chrom_codes[rec.chrom] = len(chrom_codes)
+            chroms.append(chrom_codes[rec.chrom])
+            positions.append(rec.pos)
+            filters = list(rec.filter.keys())
+            flag = 0
+            if filters == ["PASS"]:
+                flag |= PASS
+            if "PASS" in filters or "REJECT" in filters:
+                flag |= PASS_OR_REJECT
+            if max([len(x) for x in rec.alleles]) == 1:
+                flag |= SNP
+            if rec.alts and len(rec.alts) == 1:
+                flag |= BIALLELIC
+            flags.append(flag)
+            dp = rec.info.get("DP") if has_dp else None
+            info_dp.append(float(dp) if dp is not None else nan)
+            _, depth, freq = sample_alt_and_depth(rec, None)
+            info_depth.append(float(depth) if depth is not None and freq is not None else nan)
+            info_freq.append(float(freq) if depth is not None and freq is not None else nan)
+            for name in sample_names:
+                sample = rec.samples[name]
+                _, depth, freq = sample_alt_and_depth(rec, sample)
+                depths.append(float(depth) if depth is not None and freq is not None else nan)
+                freqs.append(float(freq) if depth is not None and freq is not None else nan)
+                genotypes.append(_genotype_class(sample))
+                nonref.append(sum(x for x in (sample.allele_indices or []) if x is not None) > 0)
+    num_samples = len(sample_names)
+    def _to_numpy(xs, dtype, per_sample=False):
+        out = np.frombuffer(xs, dtype=dtype) if len(xs) > 0 else np.zeros(0, dtype=dtype)
+        return out.reshape((len(positions), num_samples)) if per_sample else out
+    chrom_names = sorted(chrom_codes, key=lambda x: chrom_codes[x])
+    return {"chrom_names": np.array(chrom_names, dtype=np.str_),
+            "header_samples": np.array(header_samples, dtype=np.str_),
+            "sample_names": np.array(sample_names, dtype=np.str_),
+            "chrom": _to_numpy(chroms, np.int32),
+            "pos": _to_numpy(positions, np.int64),
+            "flags": _to_numpy(flags, np.uint8),
+            "info_dp": _to_numpy(info_dp, np.float64),
+            "info_depth": _to_numpy(info_depth, np.float64),
+            "info_freq": _to_numpy(info_freq, np.float64),
+            "depth": _to_numpy(depths, np.float64, True),
+            "freq": _to_numpy(freqs, np.float64, True),
+            "genotype": _to_numpy(genotypes, np.int8, True),
+            "nonref": _to_numpy(nonref, np.int8, True)}
+
+class VcfStats(object):
+    """Per-record statistics for a VCF file, held as NumPy arrays.
+
+    Missing depths and frequencies are stored as NaN. Per-sample arrays have
+    one column for each collected sample in `sample_names`.
+    """
+    def __init__(self, arrays):
+        self._arrays = arrays
+        self.chrom_names = [str(x) for x in arrays["chrom_names"]]
+        self.header_samples = [str(x) for x in arrays["header_samples"]]
+        self.sample_names = [str(x) for x in arrays["sample_names"]]
+
+    def __len__(self):
+        return len(self._arrays["pos"])
+
+    def __getitem__(self, key):
+        return self._arrays[key]
+
+    def _sample_index(self, sample_name):
+        if sample_name in self.sample_names:
+            return self.sample_names.index(sample_name)
+        elif sample_name in self.header_samples:
+            raise ValueError("Sample %s not collected in VCF statistics, request it in get_stats"
+                             % sample_name)
+        else:
+            return None
+
+    def has_flags(self, flags):
+        """Boolean mask of records with all the provided flags set.
+        """
+        return (self._arrays["flags"] & flags) == flags
+
+    def sample_values(self, sample_name):
+        """Depth and allele frequency for a sample, falling back to INFO fields.
+
+        Matches `sample_alt_and_depth`, which uses INFO DP and AF for VCFs
+        without samples.
+        """
+        i = self._sample_index(sample_name)
+        if i is None:
+            if self.header_samples:
+                nan = np.full(len(self), np.nan)
+                return nan, nan
+            return self._arrays["info_depth"], self._arrays["info_freq"]
+        return self._arrays["depth"][:, i], self._arrays["freq"][:, i]
+
+    def sample_nonref(self, sample_name):
+        """Boolean mask of records with a non-reference genotype call in a sample.
+
+        VCFs without samples have no genotypes, so all records are included.
+        """
+        i = self._sample_index(sample_name)
+        if i is None:
+            return np.full(len(self), not self.header_samples, dtype=bool)
+        return self._arrays["nonref"][:, i] > 0
+
+    def avg_depth(self):
+        """Average INFO depth of called variants, rounded up.
+        """
+        dp = self._arrays["info_dp"]
+        return _mean_depth(dp[~np.isnan(dp)])
+
+    def depth_histogram(self, max_depth=500):
+        """Counts of records by INFO depth, with depths above max_depth in the last bin.
+        """
+        dp = self._arrays["info_dp"]
+        dp = np.minimum(dp[~np.isnan(dp)], max_depth).astype(np.int64)
+        return np.bincount(dp, minlength=max_depth + 1).tolist()
+
+    def af_histogram(self, sample_name, bins=20):
+        """Counts of sample allele frequencies in equally sized bins between 0 and 1.
+        """
+        _, freqs = self.sample_values(sample_name)
+        freqs = freqs[~np.isnan(freqs)]
+        counts, _ = np.histogram(freqs, bins=bins, range=(0.0, 1.0))
+        return counts.tolist()
+
+    def variant_types(self, pass_only=False):
+        """Count SNPs and indels, optionally only for records passing filters.
+        """
+        mask = self.has_flags(PASS) if pass_only else np.ones(len(self), dtype=bool)
+        snps = int((mask & self.has_flags(SNP)).sum())
+        return {"snp": snps, "indel": int(mask.sum()) - snps}
+
+    def genotype_counts(self, sample_name):
+        i = self._sample_index(sample_name)
+        if i is None:
+            return {}
+        counts = np.bincount(self._arrays["genotype"][:, i].astype(np.int64), minlength=len(GT_NAMES))
+        return dict(zip(GT_NAMES, counts.tolist()))
+
+    def summary(self):
+        """Summarize depths, frequencies, variant types and genotypes for reporting.
+        """
+        return {"records": len(self),
+                "avg_depth": self.avg_depth(),
+                "depth_histogram": self.depth_histogram(),
+                "variant_types": {"all": self.variant_types(),
+                                  "pass": self.variant_types(pass_only=True)},
+                "samples": dict((name, {"genotypes": self.genotype_counts(name),
+                                        "af_histogram": self.af_histogram(name)})
+                                for name in self.sample_names)}
@@ -5,16 +5,15 @@ import math
 import os
 import shutil
 
-import numpy
 import toolz as tz
-import yaml
 
 from bcbio import broad, utils
 from bcbio.distributed.transaction import file_transaction
 from bcbio.pipeline import config_utils
 from bcbio.pipeline import datadict as dd
 from bcbio.provenance import do, programs
-from bcbio.variation import vcfutils
+from bcbio.variation import vcfstats, vcfutils
+
 
 # ## General functionality
 
@@ -162,32 +161,9 @@ def _do_high_depth_filter(data):
     return is_genome and not is_paired
 
 def _calc_vcf_stats(in_file):
-    """Calculate statistics on VCF for filtering, saving to a file for quick re-runs.
-    """
-    out_file = "%s-stats.yaml" % utils.splitext_plus(in_file)[0]
-    if not utils.file_exists(out_file):
-        stats = {"avg_depth": _average_called_depth(in_file)}
-        with open(out_file, "w") as out_handle:
-            yaml.safe_dump(stats, out_handle, default_flow_style=False, allow_unicode=False)
-        return stats
-    else:
-        with open(out_file) as in_handle:
-            stats = yaml.safe_load(in_handle)
-        return stats
-
-def _average_called_depth(in_file):
-    """Retrieve the average depth of called reads in the provided VCF.
+    """Calculate statistics on VCF for filtering, reusing cached VCF statistics when present.
     """
-    import cyvcf2
-    depths = []
-    for rec in cyvcf2.VCF(str(in_file)):
-        d = rec.INFO.get("DP")
-        if d is not None:
-            depths.append(int(d))
-    if len(depths) > 0:
-        return int(math.ceil(numpy.mean(depths)))
-    else:
-        return 0
+    return {"avg_depth": vcfstats.get_avg_depth(in_file)}
 
 def platypus(in_file, data):
     """Filter Platypus calls, removing Q20 filter and replacing with depth and quality based filter.
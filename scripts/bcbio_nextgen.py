@@ -36,7 +36,7 @@ from bcbio.distributed import runfn, clargs
 from bcbio.pipeline.main import run_main
 from bcbio.server import main as server_main
 from bcbio.graph import graph
-from bcbio.provenance import programs
+from bcbio.provenance import profile, programs
 from bcbio.pipeline import version
 
 def main(**kwargs):
@@ -52,6 +52,7 @@ def parse_cl_args(in_args):
                 "runfn": runfn.add_subparser,
                 "graph": graph.add_subparser,
                 "version": programs.add_subparser,
+                "profile": profile.add_subparser,
                 "sequencer": machine.add_subparser}
     description = "Community developed high throughput sequencing analysis."
     parser = argparse.ArgumentParser(description=description)
@@ -85,6 +86,11 @@ def parse_cl_args(in_args):
                             default=False,
                             action="store_true",
                             help="run controller locally")
+        parser.add_argument("--reuse_cluster",
+                            default=False,
+                            action="store_true",
+                            help=("Keep ipython clusters running between steps, "
+                                  "resizing only when resource needs change"))
         parser.add_argument("-q", "--queue",
                             help=("Scheduler queue to run jobs on, for "
                                   "ipython parallel"))
@@ -221,6 +227,8 @@ if __name__ == "__main__":
         graph.bootstrap(kwargs["args"])
     elif "version" in kwargs and kwargs["version"]:
         programs.write_versions({"work": kwargs["args"].workdir})
+    elif "profile" in kwargs and kwargs["profile"]:
+        profile.summarize(kwargs["args"])
     elif "sequencer" in kwargs and kwargs["sequencer"]:
         machine.check_and_postprocess(kwargs["args"])
     else:
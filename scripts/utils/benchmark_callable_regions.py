@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Benchmark combining callable regions across large batches of samples.
+
+Usage:
+  benchmark_callable_regions.py [num_samples] [blocks_per_chrom]
+
+Writes synthetic nblock BED files for a batch of samples, then combines them
+into analysis blocks with bedtools, through pybedtools as done previously,
+and with in memory IntervalSets, checking both produce identical output.
+"""
+from __future__ import print_function
+import filecmp
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import pybedtools
+
+from bcbio.bed.intervals import IntervalSet
+
+CHROM_SIZES = [("chr%s" % i, 250000000 - i * 8000000) for i in range(1, 23)]
+MIN_N_SIZE = 250
+
+def _write_nblocks(out_file, blocks_per_chrom, seed):
+    rand = random.Random(seed)
+    with open(out_file, "w") as out_handle:
+        for chrom, size in CHROM_SIZES:
+            points = sorted(rand.sample(range(0, size, 50), 2 * blocks_per_chrom))
+            for start, end in zip(points[::2], points[1::2]):
+                if end - start > MIN_N_SIZE:
+                    out_handle.write("%s\t%s\t%s\n" % (chrom, start, end))
+    return out_file
+
+def _ref_lines():
+    return "\n".join("%s\t0\t%s" % (c, s) for c, s in CHROM_SIZES)
+
+def _run_bedtools(nblock_files, out_file):
+    bed_regions = [pybedtools.BedTool(x) for x in nblock_files]
+    nblock_regions = reduce(lambda a, b: a.intersect(b, nonamecheck=True), bed_regions).saveas()
+    ref_regions = pybedtools.BedTool(_ref_lines(), from_string=True)
+    final = ref_regions.subtract(nblock_regions, nonamecheck=True).merge(d=MIN_N_SIZE)
+    final.saveas(out_file)
+    ref_regions.subtract(final, nonamecheck=True).saveas(out_file + ".noanalysis")
+
+def _run_intervals(nblock_files, out_file):
+    nblock_regions = reduce(lambda a, b: a.intersect(b), (IntervalSet.from_bed(x) for x in nblock_files))
+    ref_regions = IntervalSet.from_records((c, 0, s) for c, s in CHROM_SIZES)
+    final = ref_regions.subtract(nblock_regions).merge(MIN_N_SIZE)
+    final.to_bed(out_file)
+    ref_regions.subtract(final).to_bed(out_file + ".noanalysis")
+
+def _timed(name, fn, *args):
+    start = time.time()
+    fn(*args)
+    print("%-12s %8.2fs" % (name, time.time() - start))
+
+def main(num_samples=1000, blocks_per_chrom=2000):
+    work_dir = tempfile.mkdtemp()
+    pybedtools.set_tempdir(work_dir)
+    try:
+        nblock_files = [_write_nblocks(os.path.join(work_dir, "s%s-nblocks.bed" % i), int(blocks_per_chrom), i)
+                        for i in range(int(num_samples))]
+        print("%s samples, %s nblocks per chromosome" % (num_samples, blocks_per_chrom))
+        bt_file = os.path.join(work_dir, "bedtools-analysis_blocks.bed")
+        iv_file = os.path.join(work_dir, "intervals-analysis_blocks.bed")
+        _timed("bedtools", _run_bedtools, nblock_files, bt_file)
+        _timed("intervals", _run_intervals, nblock_files, iv_file)
+        for ext in ["", ".noanalysis"]:
+            assert filecmp.cmp(bt_file + ext, iv_file + ext, shallow=False), "Outputs differ: %s" % ext
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
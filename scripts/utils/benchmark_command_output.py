@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Benchmark logging overhead for commands with large amounts of output.
+
+Usage:
+  benchmark_command_output.py [num_lines]
+
+Runs `seq num_lines` through `bcbio.provenance.do._do_run`, which drains
+output in a background reader and logs in rate limited batches, and through
+the previous line by line readline and poll loop. Both use a stub logger
+which formats messages without writing them, so timings reflect reading and
+logging overhead rather than log handler output.
+"""
+from __future__ import print_function
+import collections
+import resource
+import subprocess
+import sys
+import time
+
+from bcbio.provenance import do
+
+class _StubLogger(object):
+    def __init__(self):
+        self.messages = 0
+
+    def debug(self, msg):
+        "%s" % msg
+        self.messages += 1
+
+def _do_run_readline(cmd, log):
+    """Previous implementation: read and log one line at a time, polling for completion.
+    """
+    s = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=True)
+    debug_stdout = collections.deque(maxlen=100)
+    while 1:
+        line = s.stdout.readline()
+        if line.rstrip():
+            debug_stdout.append(line)
+            log.debug(line.rstrip())
+        exitcode = s.poll()
+        if exitcode is not None:
+            for line in s.stdout:
+                debug_stdout.append(line)
+            break
+    s.communicate()
+    s.stdout.close()
+
+def _do_run_pump(cmd, log):
+    orig_logger, do.logger = do.logger, log
+    try:
+        do._do_run(cmd, None)
+    finally:
+        do.logger = orig_logger
+
+def _time(fn, cmd):
+    log = _StubLogger()
+    start_cpu = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.time()
+    fn(cmd, log)
+    wall = time.time() - start
+    end_cpu = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (end_cpu.ru_utime - start_cpu.ru_utime) + (end_cpu.ru_stime - start_cpu.ru_stime)
+    return wall, cpu, log.messages
+
+def main(num_lines=2000000):
+    cmd = ["seq", str(int(num_lines))]
+    print("Command: %s" % " ".join(cmd))
+    print("%-25s %10s %10s %14s" % ("method", "wall (s)", "cpu (s)", "log messages"))
+    for name, fn in [("readline and poll", _do_run_readline),
+                     ("background reader", _do_run_pump)]:
+        wall, cpu, messages = _time(fn, cmd)
+        print("%-25s %10.2f %10.2f %14s" % (name, wall, cpu, messages))
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Benchmark serial and sharded parallel disambiguation of mixed species reads.
+
+Usage:
+  benchmark_disambiguate.py [num_pairs] [cores]
+
+Writes synthetic query name sorted paired end BAMs for two species, where
+half of the pairs align to both, then times disambiguation with a single
+PDXFilter against sharded runs across multiple cores.
+"""
+from __future__ import print_function
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import pysam
+
+from bcbio.pipeline.disambiguate import pdxfilter
+
+def _write_bam(fname, names, seed):
+    rand = random.Random(seed)
+    header = {"HD": {"VN": "1.0", "SO": "queryname"},
+              "SQ": [{"SN": "chr%s" % i, "LN": 100000000} for i in range(1, 23)]}
+    seq = "".join(rand.choice("ACGT") for _ in range(100))
+    quals = pysam.qualitystring_to_array("I" * 100)
+    with pysam.AlignmentFile(fname, "wb", header=header) as out_bam:
+        for name in names:
+            chrom = rand.randint(0, 21)
+            pos = rand.randint(0, 99999000)
+            for read1, (start, mate_start) in [(True, (pos, pos + 250)), (False, (pos + 250, pos))]:
+                read = pysam.AlignedSegment()
+                read.query_name = name
+                read.query_sequence = seq
+                read.query_qualities = quals
+                read.flag = 1 + 2 + (64 if read1 else 128)
+                read.reference_id = chrom
+                read.reference_start = start
+                read.mapping_quality = 60
+                read.cigarstring = "100M"
+                read.next_reference_id = chrom
+                read.next_reference_start = mate_start
+                read.set_tags([("AS", rand.randint(80, 100)), ("NM", rand.randint(0, 3))])
+                out_bam.write(read)
+    return fname
+
+def _prep(work_dir, num_pairs):
+    names = ["HWI-ST1234:8:1101:%s:%s" % (i // 1000, i % 1000) for i in range(num_pairs)]
+    names.sort(key=pdxfilter.convert_alphanumeric)
+    human = _write_bam(os.path.join(work_dir, "human.bam"), names, 1)
+    explant = _write_bam(os.path.join(work_dir, "explant.bam"), names[::2], 2)
+    return human, explant
+
+def _outputs(work_dir, name):
+    return [os.path.join(work_dir, name, "%s.bam" % x) for x in ["human", "explant", "ambiguous"]] + \
+           [os.path.join(work_dir, name, "summary.txt")]
+
+def _timed(name, num_pairs, fn, *args, **kwargs):
+    start = time.time()
+    out = fn(*args, **kwargs)
+    elapsed = time.time() - start
+    print("%-24s %8.2fs %10.0f pairs/s" % (name, elapsed, num_pairs / elapsed))
+    return out
+
+def main(num_pairs=1000000, cores=None):
+    num_pairs = int(num_pairs)
+    cores = int(cores) if cores else multiprocessing.cpu_count()
+    work_dir = tempfile.mkdtemp()
+    try:
+        human, explant = _prep(work_dir, num_pairs)
+        print("%s read pairs, %s cores" % (num_pairs, cores))
+        _timed("find shards", num_pairs, pdxfilter.find_shards, human, explant, cores)
+        serial = _timed("serial", num_pairs, pdxfilter.PDXFilter(human, explant, *_outputs(work_dir, "serial")).run)
+        pool = multiprocessing.Pool(cores)
+        try:
+            sharded = _timed("sharded", num_pairs, pdxfilter.run_sharded, human, explant,
+                             *_outputs(work_dir, "sharded"), num_shards=cores,
+                             map_fn=lambda xs: pool.map(pdxfilter.run_shard, xs, chunksize=1))
+        finally:
+            pool.close()
+            pool.join()
+        assert serial == sharded, (serial, sharded)
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
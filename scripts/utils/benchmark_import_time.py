@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""Benchmark cold startup time for bcbio command line entry points.
+
+Usage:
+  benchmark_import_time.py [num_runs] [budget_seconds]
+
+Imports the modules behind bcbio_nextgen.py, `bcbio_nextgen.py runfn` CWL
+steps and distributed workers in fresh Python processes, reporting the fastest
+and median import times along with any heavy third party modules loaded at
+startup. Heavy dependencies should be lazily imported when first used.
+
+Exits with an error if the fastest import of any entry point exceeds the
+budget, 3 seconds by default or BCBIO_IMPORT_BUDGET if set. Increase it
+for slow filesystems.
+"""
+from __future__ import print_function
+import json
+import os
+import subprocess
+import sys
+
+ENTRY_POINTS = [("bcbio_nextgen.py", "bcbio.pipeline.main"),
+                ("runfn.process", "bcbio.distributed.runfn"),
+                ("multiprocessing workers", "bcbio.distributed.multitasks")]
+HEAVY_MODULES = ["pandas", "numpy", "scipy", "matplotlib", "statsmodels", "pysam", "pybedtools",
+                 "vcf", "cyvcf2", "gffutils", "Bio", "seqcluster", "joblib", "requests", "bioblend"]
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.time()
+__import__(sys.argv[1])
+print(json.dumps({"seconds": time.time() - start,
+                  "modules": sorted(set(x.split(".")[0] for x in sys.modules))}))
+"""
+
+def cold_import(module):
+    """Import a module in a new Python process, returning time taken and top level modules loaded.
+    """
+    out = subprocess.check_output([sys.executable, "-c", _IMPORT_SCRIPT, module])
+    return json.loads(out.decode().strip().split("\n")[-1])
+
+def main(num_runs=5, budget=None):
+    budget = float(budget or os.environ.get("BCBIO_IMPORT_BUDGET", 3.0))
+    print("%-25s %-30s %8s %8s  %s" % ("entry point", "module", "min (s)", "median", "heavy imports"))
+    over = []
+    for name, module in ENTRY_POINTS:
+        runs = [cold_import(module) for _ in range(int(num_runs))]
+        times = sorted(x["seconds"] for x in runs)
+        heavy = [x for x in HEAVY_MODULES if x in runs[0]["modules"]]
+        print("%-25s %-30s %8.2f %8.2f  %s" % (name, module, times[0], times[len(times) // 2],
+                                              ", ".join(heavy) or "-"))
+        if times[0] > budget:
+            over.append(name)
+    if over:
+        sys.exit("Startup over budget of %.2fs: %s" % (budget, ", ".join(over)))
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Benchmark serialized size and dispatch time for IPython cluster arguments.
+
+Usage:
+  benchmark_ipython_transport.py <bcbio_system.yaml> <genome-resources.yaml> [num_samples]
+
+Builds a batch of sample world dictionaries sharing configuration and
+genome resources, then compares pickling each task's full arguments (the
+previous transport) against sending shared subtrees by reference.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+from six.moves import cPickle as pickle
+
+from bcbio.distributed import ipython
+
+def _sample(i, system_config, resources):
+    config = {"resources": system_config.get("resources", {}),
+              "galaxy_config": "/path/to/universe_wsgi.ini",
+              "algorithm": {"aligner": "bwa", "variantcaller": ["gatk-haplotype", "freebayes"],
+                            "num_cores": 16, "mark_duplicates": True,
+                            "variant_regions": "/path/to/regions.bed"}}
+    return [{"description": "sample%s" % i,
+             "files": ["/path/to/sample%s_1.fq.gz" % i, "/path/to/sample%s_2.fq.gz" % i],
+             "dirs": {"work": "/path/to/work", "galaxy": "/path/to/galaxy"},
+             "rgnames": {"sample": "sample%s" % i, "rg": "sample%s" % i, "pl": "illumina"},
+             "config": config,
+             "genome_resources": resources,
+             "reference": {"fasta": {"base": "/path/to/hg38.fa"},
+                           "bwa": {"indexes": ["/path/to/hg38.fa.%s" % x
+                                               for x in ["amb", "ann", "bwt", "pac", "sa"]]}}}]
+
+def _dispatch(items, shared_dir):
+    """Serialize arguments as sent to engines, returning total bytes.
+    """
+    if shared_dir:
+        items = ipython.zip_args(items, shared_dir=shared_dir)
+    return sum(len(pickle.dumps(x, pickle.HIGHEST_PROTOCOL)) for x in items)
+
+def main(system_file, resources_file, num_samples=500):
+    with open(system_file) as in_handle:
+        system_config = yaml.safe_load(in_handle)
+    with open(resources_file) as in_handle:
+        resources = yaml.safe_load(in_handle)
+    items = [_sample(i, system_config, resources) for i in range(int(num_samples))]
+    shared_dir = tempfile.mkdtemp()
+    try:
+        for name, cur_dir in [("full", None), ("shared", shared_dir)]:
+            start = time.time()
+            size = _dispatch(items, cur_dir)
+            print("%s: %.1f Mb, %.2fs to prepare %s tasks" % (name, size / 1e6, time.time() - start,
+                                                             len(items)))
+        start = time.time()
+        ipython._SHARED_CACHE.clear()
+        ipython.unzip_args(ipython.zip_args(items, shared_dir=shared_dir))
+        print("shared round trip with cold engine cache: %.2fs" % (time.time() - start))
+        print("shared subtrees on disk: %.1f Kb" %
+              (sum(os.path.getsize(os.path.join(shared_dir, f)) for f in os.listdir(shared_dir)) / 1e3))
+    finally:
+        shutil.rmtree(shared_dir)
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
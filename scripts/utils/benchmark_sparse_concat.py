@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""Benchmark combining single-cell UMI count matrices.
+
+Usage:
+  benchmark_sparse_concat.py [num_samples] [num_genes] [cells_per_sample]
+
+Generates random sparse count matrices for many samples, then compares
+concatenating them one at a time with SparseMatrix.cat (the previous
+approach) against a single SparseMatrix.concatenate call, along with reading
+the combined matrix from MatrixMarket text and memory mapped npz files.
+"""
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from scipy import sparse
+
+from bcbio.rnaseq import umi
+
+def _samples(num_samples, num_genes, num_cells):
+    rownames = ["gene%s" % i for i in range(num_genes)]
+    for i in range(num_samples):
+        matrix = sparse.random(num_genes, num_cells, density=0.05, format="coo", random_state=i)
+        yield umi.SparseMatrix(matrix, rownames,
+                               ["sample%s:cell%s" % (i, j) for j in range(num_cells)])
+
+def _timed(name, fn, *args):
+    start = time.time()
+    out = fn(*args)
+    print("%-32s %8.2fs" % (name, time.time() - start))
+    return out
+
+def _cat_each(parts):
+    counts = umi.SparseMatrix()
+    for part in parts:
+        counts.cat(part)
+    return counts
+
+def _read(fname):
+    counts = umi.SparseMatrix()
+    counts.read(fname)
+    return counts
+
+def main(num_samples=300, num_genes=20000, num_cells=200):
+    parts = list(_samples(int(num_samples), int(num_genes), int(num_cells)))
+    print("%s samples, %s genes x %s cells per sample" % (num_samples, num_genes, num_cells))
+    _timed("cat once per sample", _cat_each, parts)
+    counts = _timed("concatenate", umi.SparseMatrix.concatenate, parts)
+    work_dir = tempfile.mkdtemp()
+    try:
+        mtx_file = os.path.join(work_dir, "tagcounts.mtx")
+        npz_file = mtx_file + ".npz"
+        _timed("write mtx", counts.write, mtx_file)
+        _timed("write npz", counts.write, npz_file)
+        _timed("read mtx", _read, mtx_file)
+        _timed("read npz (memory mapped)", _read, npz_file)
+        print("mtx: %.1f Mb, npz: %.1f Mb" % (os.path.getsize(mtx_file) / 1e6,
+                                               os.path.getsize(npz_file) / 1e6))
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Benchmark split and combine scheduling with and without streaming combines.
+
+Usage:
+  benchmark_split_combine.py [num_files] [num_parts] [num_jobs] [combine_time]
+
+Runs `split.parallel_split_combine` on synthetic work: each input file splits
+into parts sleeping 0.1-0.4s, followed by a combine per file sleeping
+combine_time seconds. Both modes share a single `multi.worker_pool`. The
+barrier runner lacks a `stream` method, so all split parts finish before any
+combine starts, as with IPython. The streaming runner submits each combine at
+COMBINE_PRIORITY once its parts are back, overlapping merges with remaining
+split work. Timings reflect scheduling rather than process startup.
+"""
+from __future__ import print_function
+import sys
+import time
+
+from bcbio import utils
+from bcbio.distributed import multi, split
+
+@utils.map_wrap
+@multi.zeromq_aware_logging
+def _run_part(data, duration, part_file):
+    time.sleep(duration)
+    data = dict(data)
+    data["work_bam"] = part_file
+    return [data]
+
+@utils.map_wrap
+@multi.zeromq_aware_logging
+def _combine(parts, out_file, config, combine_times):
+    time.sleep(combine_times[0])
+    return [out_file]
+
+_FNS = {"run_part": _run_part, "combine": _combine}
+
+def _split_fn(num_parts):
+    def _split(data):
+        i = data["index"]
+        return data["out_file"], [(0.1 * (1 + (i + j) % 4), "%s-%s" % (data["out_file"], j))
+                                  for j in range(num_parts)]
+    return _split
+
+def _runner(parallel, config, stream):
+    def run_parallel(fn_name, items):
+        return multi.run_multicore(_FNS[fn_name], items, config, parallel)
+    def run_parallel_stream(fn_name, items, priority=0):
+        return multi.run_multicore_stream(_FNS[fn_name], items, config, parallel, priority)
+    if stream:
+        run_parallel.stream = run_parallel_stream
+    return run_parallel
+
+def _run(num_files, num_parts, num_jobs, combine_time, stream):
+    config = {"algorithm": {}, "resources": {}}
+    parallel = {"type": "local", "num_jobs": num_jobs, "cores_per_job": 1}
+    args = [[{"index": i, "out_file": "sample%s.bam" % i, "config": config,
+              "combine_time": combine_time}] for i in range(num_files)]
+    fn = _runner(parallel, config, stream)
+    # warm up pool workers so timings exclude process startup
+    multi.run_multicore(_run_part, [[{"config": config}, 0.0, "warmup"]] * num_jobs, config, parallel)
+    start = time.time()
+    out = split.parallel_split_combine(args, _split_fn(num_parts), fn, "run_part", "combine",
+                                       "work_bam", ["config", "combine_time"])
+    wall = time.time() - start
+    assert [x[0]["work_bam"] for x in out[:num_files]] == [x[0]["out_file"] for x in args], out
+    return wall
+
+def main(num_files=5, num_parts=4, num_jobs=4, combine_time=1.0):
+    num_files, num_parts, num_jobs = int(num_files), int(num_parts), int(num_jobs)
+    combine_time = float(combine_time)
+    print("%s files x %s parts of 0.1-0.4s, %ss combine per file, on %s cores" %
+          (num_files, num_parts, combine_time, num_jobs))
+    print("%-20s %10s" % ("mode", "wall (s)"))
+    with multi.worker_pool():
+        for name, stream in [("barrier", False), ("streaming combine", True)]:
+            print("%-20s %10.2f" % (name, _run(num_files, num_parts, num_jobs, combine_time, stream)))
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
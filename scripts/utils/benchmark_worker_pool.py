@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""Benchmark repeated multicore stages with and without a persistent worker pool.
+
+Usage:
+  benchmark_worker_pool.py [num_stages] [num_jobs] [items_per_stage]
+
+Runs a series of short `run_multicore` stages, as in a pipeline with many
+small steps, first with a new joblib.Parallel for every stage and then
+sharing a single `multi.worker_pool` across all stages. Each task imports
+the modules used by multiprocessing workers, so the difference reflects time
+spent spawning processes and re-importing bcbio rather than running tasks.
+"""
+from __future__ import print_function
+import sys
+import time
+
+from bcbio import utils
+from bcbio.distributed import multi
+
+@utils.map_wrap
+@multi.zeromq_aware_logging
+def _task(i, config):
+    __import__("bcbio.distributed.multitasks")
+    return [i]
+
+def _run_stages(num_stages, num_jobs, items_per_stage):
+    config = {"algorithm": {}, "resources": {}}
+    parallel = {"type": "local", "num_jobs": num_jobs, "cores_per_job": 1}
+    times = []
+    for stage in range(num_stages):
+        start = time.time()
+        out = multi.run_multicore(_task, [[i, config] for i in range(items_per_stage)], config, parallel)
+        assert out == list(range(items_per_stage)), out
+        times.append(time.time() - start)
+    return times
+
+def main(num_stages=10, num_jobs=4, items_per_stage=8):
+    num_stages, num_jobs, items_per_stage = int(num_stages), int(num_jobs), int(items_per_stage)
+    print("%s stages of %s items on %s cores" % (num_stages, items_per_stage, num_jobs))
+    print("%-20s %10s %10s %10s" % ("mode", "total (s)", "first (s)", "median (s)"))
+    def _report(name, times):
+        print("%-20s %10.2f %10.2f %10.2f" % (name, sum(times), times[0],
+                                              sorted(times)[len(times) // 2]))
+    _report("joblib per stage", _run_stages(num_stages, num_jobs, items_per_stage))
+    with multi.worker_pool() as pool:
+        times = _run_stages(num_stages, num_jobs, items_per_stage)
+        stats = pool.stats
+    _report("persistent pool", times)
+    print("Persistent pool created %s, reused %s times" % (stats["created"], stats["reused"]))
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,59 @@
+import gzip
+import os
+import subprocess
+
+import pytest
+
+from bcbio.bam import fastq
+
+
+def _write_fastq(fname, lengths, name="r"):
+    opener = gzip.open if fname.endswith(".gz") else open
+    with opener(fname, "wb") as out_handle:
+        for i, length in enumerate(lengths):
+            out_handle.write(("@%s%s\n%s\n+\n%s\n" % (name, i, "A" * length, "I" * length)).encode())
+    return fname
+
+
+def _names(fname):
+    return [rec[0].rstrip()[1:].decode() for rec in fastq.fastq_records(fname)]
+
+
+def _singles(fname):
+    base, ext = os.path.splitext(fname)
+    return base + ".singles" + ext
+
+
+def test_fastq_records_plain_and_gzip(tmpdir):
+    for ext in [".fq", ".fq.gz"]:
+        fname = _write_fastq(str(tmpdir.join("in%s" % ext)), [10, 20, 30])
+        records = list(fastq.fastq_records(fname))
+        assert len(records) == 3
+        assert records[1][1].rstrip() == b"A" * 20
+        assert fastq.count_records(fname) == 3
+        assert fastq.estimate_maximum_read_length(fname) == 30
+
+
+def test_filter_reads_by_length(tmpdir):
+    fq1 = _write_fastq(str(tmpdir.join("test_1.fq")), [30, 10, 30, 25])
+    fq2 = _write_fastq(str(tmpdir.join("test_2.fq")), [30, 30, 10, 20])
+    cur_dir = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        fq1_out, fq2_out = fastq.filter_reads_by_length(fq1, fq2, "fastq-sanger", min_length=20)
+    finally:
+        os.chdir(cur_dir)
+    assert _names(fq1_out) == ["r0", "r3"]
+    assert _names(fq2_out) == ["r0", "r3"]
+    assert _names(_singles(fq1)) == ["r2"]
+    assert _names(_singles(fq2)) == ["r1"]
+
+
+def test_fastq_records_pigz_failure(tmpdir, monkeypatch):
+    fname = _write_fastq(str(tmpdir.join("in.fq.gz")), [10, 20])
+    pigz = tmpdir.join("pigz")
+    pigz.write("#!/bin/sh\nprintf '@r0\\nAAAA\\n+\\nIIII\\n'\nexit 1\n")
+    pigz.chmod(0o755)
+    monkeypatch.setattr(fastq.utils, "which", lambda x: str(pigz))
+    with pytest.raises(subprocess.CalledProcessError):
+        list(fastq.fastq_records(fname, threads=2))
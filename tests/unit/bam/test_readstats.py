@@ -0,0 +1,55 @@
+import multiprocessing
+import os
+
+from bcbio.bam import readstats
+
+
+def _data(tmpdir, sample="s1"):
+    return {"dirs": {"work": str(tmpdir)}, "rgnames": {"sample": sample}}
+
+
+def _write(fname, content):
+    with open(fname, "wb") as out_handle:
+        out_handle.write(content)
+    return fname
+
+
+def _set_metrics(args):
+    work_dir, bam_file, i = args
+    data = {"dirs": {"work": work_dir}, "rgnames": {"sample": "s%s" % i}}
+    readstats.set_metric(data, "mapped_reads", i, bam_file, ["not unmapped"])
+
+
+def test_metric_cache(tmpdir):
+    bam_file = _write(str(tmpdir.join("s1.bam")), b"BAM" * 50000)
+    bed_file = _write(str(tmpdir.join("regions.bed")), b"chr1\t0\t100\n")
+    data = _data(tmpdir)
+    assert readstats.get_metric(data, "mapped_reads", bam_file) is None
+    readstats.set_metric(data, "mapped_reads", 100, bam_file)
+    readstats.set_metric(data, "mapped_reads", 10, bam_file, ["not duplicate"], bed_file)
+    readstats.set_metric(data, "avg_coverage", 30, bam_file, target_name="genome")
+    assert readstats.get_metric(data, "mapped_reads", bam_file) == 100
+    assert readstats.get_metric(data, "mapped_reads", bam_file, ["not duplicate"], bed_file) == 10
+    assert readstats.get_metric(data, "avg_coverage", bam_file, target_name="genome") == 30
+    assert readstats.get_metric(_data(tmpdir, "s2"), "mapped_reads", bam_file) is None
+    # values follow file contents, not locations
+    moved_bam = str(tmpdir.join("moved.bam"))
+    os.rename(bam_file, moved_bam)
+    assert readstats.get_metric(data, "mapped_reads", moved_bam) == 100
+    _write(bed_file, b"chr1\t0\t200\n")
+    assert readstats.get_metric(data, "mapped_reads", moved_bam, ["not duplicate"], bed_file) is None
+    _write(moved_bam, b"BAM" * 50001)
+    assert readstats.get_metric(data, "mapped_reads", moved_bam) is None
+
+
+def test_metric_cache_concurrent_writers(tmpdir):
+    bam_file = _write(str(tmpdir.join("s1.bam")), b"BAM")
+    pool = multiprocessing.Pool(4)
+    try:
+        pool.map(_set_metrics, [(str(tmpdir), bam_file, i) for i in range(40)])
+    finally:
+        pool.close()
+        pool.join()
+    for i in range(40):
+        data = _data(tmpdir, "s%s" % i)
+        assert readstats.get_metric(data, "mapped_reads", bam_file, ["not unmapped"]) == i
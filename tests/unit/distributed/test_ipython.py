@@ -0,0 +1,42 @@
+import copy
+
+from bcbio.distributed import ipython
+
+
+def _items():
+    config = {"algorithm": {"aligner": "bwa", "num_cores": 4}, "resources": {"gatk": {"jvm_opts": ["-Xmx2g"]}}}
+    return [[{"description": "sample%s" % i, "config": copy.deepcopy(config),
+              "reference": {"fasta": {"base": "/ref/hg38.fa"}}}] for i in range(3)]
+
+
+def test_shared_transport(tmpdir, monkeypatch):
+    monkeypatch.setattr(ipython, "_SHARED_CACHE", {})
+    items = _items()
+    zipped = ipython.zip_args(items, shared_dir=str(tmpdir))
+    assert items == _items()
+    assert zipped[0][0]["config"] == zipped[2][0]["config"]
+    assert ipython._is_shared_ref(zipped[0][0]["reference"])
+    assert len(tmpdir.listdir()) == 2
+    # cold engine cache, reading shared subtrees from disk
+    monkeypatch.setattr(ipython, "_SHARED_CACHE", {})
+    unzipped = ipython.unzip_args(zipped)
+    assert unzipped == items
+    assert unzipped[0][0]["config"] is not unzipped[1][0]["config"]
+    # engines return unchanged subtrees by reference and modified ones inline
+    unzipped[1][0]["config"]["algorithm"]["num_cores"] = 1
+    returned = ipython.zip_args(unzipped)
+    assert ipython._is_shared_ref(returned[0][0]["config"])
+    assert returned[1][0]["config"]["algorithm"]["num_cores"] == 1
+    assert ipython.unzip_args(returned) == unzipped
+
+
+def test_shared_transport_types(tmpdir, monkeypatch):
+    """Subtrees with the same JSON representation but different types are not confused.
+    """
+    monkeypatch.setattr(ipython, "_SHARED_CACHE", {})
+    items = [[{"config": {"algorithm": {"bounds": (1, 2)}, "resources": {}}}],
+             [{"config": {"algorithm": {"bounds": [1, 2]}, "resources": {}}}]]
+    shared = [ipython.share_args(x, str(tmpdir)) for x in items]
+    assert shared[0][0]["config"] != shared[1][0]["config"]
+    monkeypatch.setattr(ipython, "_SHARED_CACHE", {})
+    assert [ipython.unshare_args(x) for x in shared] == items
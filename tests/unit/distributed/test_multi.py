@@ -0,0 +1,51 @@
+import time
+
+from bcbio.distributed import multi
+from bcbio.pipeline import config_utils
+
+
+def _lookup(args):
+    name, config = args
+    return [config_utils.get_program(name, config)]
+
+
+def test_worker_program_lookups(monkeypatch):
+    """Program lookups in multicore workers are included in the parent statistics.
+    """
+    monkeypatch.setattr(config_utils, "_WORKER_CACHE_STATS",
+                        {"lookups": 0, "hits": 0, "checks_saved": 0, "programs": 0})
+    config = {"algorithm": {}, "resources": {}}
+    parallel = {"type": "local", "num_jobs": 2, "cores_per_job": 1}
+    before = config_utils.get_program_cache_stats()
+    with multi.worker_pool():
+        out = multi.run_multicore(_lookup, [["sh", config] for _ in range(4)], config, parallel)
+    assert len(out) == 4
+    after = config_utils.get_program_cache_stats()
+    assert after["lookups"] - before["lookups"] == 4
+    assert after["hits"] - before["hits"] >= 2
+
+
+def _timed_sleep(args):
+    seconds, config = args
+    start = time.time()
+    time.sleep(seconds)
+    return [(start, time.time())]
+
+
+def _nested(args):
+    num_jobs, config = args
+    parallel = {"type": "local", "num_jobs": num_jobs, "cores_per_job": 1}
+    return [multi.run_multicore(_timed_sleep, [[0.5, config] for _ in range(num_jobs)], config, parallel)]
+
+
+def test_nested_multicore_parallel():
+    """Multicore calls inside pool workers run their own items concurrently.
+    """
+    config = {"algorithm": {}, "resources": {}}
+    parallel = {"type": "local", "num_jobs": 2, "cores_per_job": 1}
+    with multi.worker_pool():
+        out = multi.run_multicore(_nested, [[2, config] for _ in range(2)], config, parallel)
+    assert len(out) == 2
+    for spans in out:
+        starts, ends = zip(*spans)
+        assert max(starts) < min(ends), spans
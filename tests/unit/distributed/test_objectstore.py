@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+import pytest
+
+from bcbio.distributed import objectstore
+
+
+class FakeObjectStore(object):
+    """Local object store serving byte ranges with a fixed per-request latency.
+
+    Tracks the maximum number of range requests in flight at once.
+    """
+    def __init__(self, data, latency=0.0, fail_after=None):
+        self.data = data
+        self.latency = latency
+        self.fail_after = fail_after
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, start, end):
+        with self._lock:
+            self.requests += 1
+            if self.fail_after is not None and self.requests > self.fail_after:
+                raise IOError("Connection reset")
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            return self.data[start:end + 1]
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def downloader(self, **kwargs):
+        return objectstore.RangeDownloader(len(self.data), self.fetch, retries=0, **kwargs)
+
+
+@pytest.fixture
+def store():
+    return FakeObjectStore(os.urandom(1000003))
+
+
+def test_iter_parts(store):
+    dl = store.downloader(part_size=65536, concurrency=4)
+    assert b"".join(dl.iter_parts()) == store.data
+    reader = objectstore._RangeReader(store.downloader(part_size=1000, concurrency=4))
+    assert reader.read(10) == store.data[:10]
+    assert reader.read(2500) == store.data[10:2510]
+    assert b"".join(reader.chunks()) == store.data[2510:]
+
+
+def test_resume_download(store, tmpdir):
+    out_file = str(tmpdir.join("download.bam"))
+    store.fail_after = 5
+    with pytest.raises(IOError):
+        store.downloader(part_size=100000, concurrency=1).to_file(out_file)
+    assert not os.path.exists(out_file)
+    store.fail_after, store.requests = None, 0
+    store.downloader(part_size=100000, concurrency=3).to_file(out_file)
+    assert store.requests == 6
+    with open(out_file, "rb") as in_handle:
+        assert in_handle.read() == store.data
+    assert os.listdir(str(tmpdir)) == ["download.bam"]
+
+
+def test_concurrent_requests(store, tmpdir):
+    store.latency = 0.02
+    for concurrency in [1, 8]:
+        store.max_in_flight = 0
+        out_file = str(tmpdir.join("download%s" % concurrency))
+        store.downloader(part_size=31250, concurrency=concurrency).to_file(out_file)
+        with open(out_file, "rb") as in_handle:
+            assert in_handle.read() == store.data
+        if concurrency == 1:
+            assert store.max_in_flight == 1
+        else:
+            assert 1 < store.max_in_flight <= concurrency
@@ -0,0 +1,64 @@
+import contextlib
+
+from bcbio.distributed import ipython, prun
+
+
+def _parallel(num_jobs, cores_per_job, mem="2.00"):
+    return {"type": "ipython", "scheduler": "slurm", "queue": "general", "tag": "", "resources": [],
+            "num_jobs": num_jobs, "cores_per_job": cores_per_job, "mem": mem}
+
+
+def test_cluster_reuse(monkeypatch):
+    started, stopped = [], []
+
+    @contextlib.contextmanager
+    def create(parallel, dirs, config):
+        view = object()
+        started.append((parallel["num_jobs"], parallel["cores_per_job"]))
+        yield view
+        stopped.append(view)
+    monkeypatch.setattr(ipython, "create", create)
+
+    manager = prun.ClusterManager()
+    view = manager.acquire(_parallel(10, 16), {}, {}, "alignment")
+    manager.release()
+    # lighter stage runs one job per existing engine, using all engine cores
+    lighter = _parallel(40, 4)
+    assert manager.acquire(lighter, {}, {}, "qc") is view
+    assert (lighter["num_jobs"], lighter["cores_per_job"], lighter["mem"]) == (10, 16, "2.00")
+    manager.release()
+    uneven = _parallel(15, 5, "1.00")
+    assert manager.acquire(uneven, {}, {}, "uneven") is view
+    assert (uneven["num_jobs"], uneven["cores_per_job"], uneven["mem"]) == (10, 16, "2.00")
+    manager.release()
+    # too few cores needed to keep all engines, shrink
+    manager.acquire(_parallel(1, 16), {}, {}, "summary")
+    manager.release()
+    # more memory per job than running engines have
+    manager.acquire(_parallel(1, 16, "8.00"), {}, {}, "memory")
+    manager.release()
+    manager.close()
+    assert started == [(10, 16), (1, 16), (1, 16)]
+    assert len(stopped) == 3
+    assert [x["reused"] for x in manager.stages] == [False, True, True, False, False]
+
+
+def test_cluster_discard(monkeypatch):
+    """Failed stages stop the cluster through its context manager.
+    """
+    stopped = []
+
+    @contextlib.contextmanager
+    def create(parallel, dirs, config):
+        view = object()
+        yield view
+        stopped.append(view)
+    monkeypatch.setattr(ipython, "create", create)
+
+    manager = prun.ClusterManager()
+    view = manager.acquire(_parallel(10, 16), {}, {}, "alignment")
+    manager.discard()
+    assert stopped == [view]
+    assert manager.available() and not manager.owns(view)
+    manager.close()
+    assert stopped == [view]
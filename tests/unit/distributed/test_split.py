@@ -0,0 +1,59 @@
+from bcbio.distributed import split
+
+
+class _Incremental(list):
+    incremental = True
+
+
+class FakeRunner(object):
+    """Run split and combine functions in process, recording submitted batches.
+    """
+    def __init__(self, incremental):
+        self.incremental = incremental
+        self.combines = []
+        self.fns = {"process": self._process, "combine": self._combine}
+
+    def _process(self, data, in_file, out_file):
+        # parts can return multiple items, like paired tumor/normal samples
+        return [dict(data, work_bam=out_file), dict(data, work_bam=out_file, pair=True)]
+
+    def _combine(self, parts, final_file, config):
+        return [[final_file, sorted(parts)]]
+
+    def __call__(self, fn_name, items):
+        return [x for _, out in self.stream(fn_name, items) for x in out]
+
+    def stream(self, fn_name, items, priority=0):
+        out = [(i, self.fns[fn_name](*x)) for i, x in enumerate(items)]
+        if fn_name == "combine":
+            self.combines.append(out)
+        return _Incremental(out) if self.incremental else iter(out)
+
+
+def _split_fn(data):
+    parts = [(data["in_file"], "%s-%s.bam" % (data["name"], i)) for i in range(3)]
+    return "%s.bam" % data["name"], parts
+
+
+def _run(incremental):
+    runner = FakeRunner(incremental)
+    args = [[{"name": name, "in_file": "%s.fq" % name, "config": {}}] for name in ["s1", "s2"]]
+    out = split.parallel_split_combine(args, _split_fn, runner, "process", "combine",
+                                       "work_bam", ["config"])
+    return runner, out
+
+
+def test_stream_combine_incremental():
+    runner, out = _run(True)
+    combined = [x[1][0] for batch in runner.combines for x in batch]
+    assert sorted(x[0] for x in combined) == ["s1.bam", "s2.bam"]
+    assert sorted(set(combined[0][1])) == ["s1-0.bam", "s1-1.bam", "s1-2.bam"]
+    assert len(runner.combines) == 2
+    assert [x[0]["work_bam"] for x in out] == ["s1.bam", "s2.bam"] + ["s1.bam"] * 5 + ["s2.bam"] * 5
+
+
+def test_stream_combine_eager_batches():
+    runner, out = _run(False)
+    assert len(runner.combines) == 1
+    assert sorted(x[1][0][0] for x in runner.combines[0]) == ["s1.bam", "s2.bam"]
+    assert len(out) == 12
@@ -1,3 +1,6 @@
+import errno
+import os
+
 import pytest
 import mock
 
@@ -235,3 +238,99 @@ class TestFileTransaction(object):
         with file_transaction(CONFIG, '/some/path'):
             pass
         assert not transaction.shutil.move.called
+
+
+class TestCommit(object):
+    """Commit transactional files on real filesystems.
+    """
+    @pytest.yield_fixture(autouse=True)
+    def run_db(self, monkeypatch):
+        from bcbio.provenance import diagnostics
+        monkeypatch.setattr(diagnostics, '_RUN_DB', None)
+        yield None
+
+    def _data(self, tmpdir):
+        from bcbio.provenance import diagnostics
+        work_dir = tmpdir.mkdir('work')
+        diagnostics.initialize({'work': str(work_dir)})
+        return {'dirs': {'work': str(work_dir)},
+                'config': {'resources': {'tmp': {'dir': str(tmpdir.join('tmp'))}}}}
+
+    def _commits(self, data):
+        from bcbio.provenance import diagnostics
+        db_file = diagnostics.get_db(data['dirs']['work'])
+        return diagnostics.summarize(db_file)['commits']
+
+    def test_renames_on_same_filesystem(self, tmpdir):
+        data = self._data(tmpdir)
+        out_file = str(tmpdir.join('work', 'out.txt'))
+        with file_transaction(data, out_file) as tx_out_file:
+            with open(tx_out_file, 'w') as out_handle:
+                out_handle.write('data')
+        with open(out_file) as in_handle:
+            assert in_handle.read() == 'data'
+        assert [(x[0], x[1]) for x in self._commits(data)] == [('rename', 1)]
+
+    def test_tx_file_next_to_output_on_other_filesystem(self, tmpdir, mocker):
+        tmp_dir = str(tmpdir.join('tmp'))
+        mocker.patch('bcbio.distributed.transaction._same_filesystem',
+                     side_effect=lambda x, y: x.startswith(tmp_dir) == y.startswith(tmp_dir))
+        data = self._data(tmpdir)
+        out_file = str(tmpdir.join('work', 'out.txt'))
+        with file_transaction(data, out_file) as tx_out_file:
+            assert os.path.dirname(os.path.dirname(tx_out_file)) == str(tmpdir.join('work', 'bcbiotx'))
+            with open(tx_out_file, 'w') as out_handle:
+                out_handle.write('data')
+        assert os.path.exists(out_file)
+        assert not os.path.exists(os.path.dirname(tx_out_file))
+
+    def test_tx_file_hidden_next_to_output(self, tmpdir, mocker):
+        """Outputs on a filesystem apart from tmp and work use hidden directories,
+        removing those left by exited processes.
+        """
+        out_dir = tmpdir.mkdir('upload')
+        mocker.patch('bcbio.distributed.transaction._same_filesystem',
+                     side_effect=lambda x, y: x.startswith(str(out_dir)) == y.startswith(str(out_dir)))
+        stale = out_dir.mkdir(transaction._local_tmpdir_prefix() + '999999999-abc')
+        other_host = out_dir.mkdir('.bcbiotx-otherhost-1-abc')
+        data = self._data(tmpdir)
+        out_file = str(out_dir.join('out.txt'))
+        with file_transaction(data, out_file) as tx_out_file:
+            assert os.path.dirname(os.path.dirname(tx_out_file)) == str(out_dir)
+            with open(tx_out_file, 'w') as out_handle:
+                out_handle.write('data')
+        assert os.path.exists(out_file)
+        assert not stale.check()
+        assert other_host.check()
+        assert not os.path.exists(os.path.dirname(tx_out_file))
+
+    def test_copies_on_cross_device_rename(self, tmpdir, mocker):
+        data = self._data(tmpdir)
+        tx_file = tmpdir.join('tx.txt')
+        tx_file.write('data')
+        out_file = str(tmpdir.join('work', 'out.txt'))
+        rename = os.rename
+
+        def _rename(src, dst):
+            if src == str(tx_file):
+                raise OSError(errno.EXDEV, 'Invalid cross-device link')
+            rename(src, dst)
+        mocker.patch('bcbio.distributed.transaction.os.rename', side_effect=_rename)
+        _move_file_with_sizecheck(str(tx_file), out_file, data)
+        with open(out_file) as in_handle:
+            assert in_handle.read() == 'data'
+        assert not tx_file.check()
+        assert [(x[0], x[1]) for x in self._commits(data)] == [('copy', 1)]
+
+    def test_copies_with_sizecheck_across_filesystems(self, tmpdir, mocker):
+        mocker.patch('bcbio.distributed.transaction._same_filesystem', return_value=False)
+        data = self._data(tmpdir)
+        tx_file = tmpdir.join('tx.txt')
+        tx_file.write('data' * 1000)
+        out_file = str(tmpdir.join('work', 'out.txt'))
+        _move_file_with_sizecheck(str(tx_file), out_file, data)
+        with open(out_file) as in_handle:
+            assert in_handle.read() == 'data' * 1000
+        assert not tx_file.check()
+        assert not os.path.exists(out_file + '.bcbiotmp')
+        assert [(x[0], x[1]) for x in self._commits(data)] == [('copy', 1)]
@@ -38,3 +38,38 @@ def test_should_not_run_fusion_when_fusion_mode_and_wrong_caller(config):
 def test_should_run_fusion_when_fusion_mode_and_right_caller(config):
     result = config_utils.should_run_fusion('TEST', config)
     assert result is True
+
+
+def _make_program(dirname, name):
+    prog = dirname.join(name)
+    prog.write("#!/bin/sh\n")
+    prog.chmod(0o755)
+    return str(prog)
+
+
+def test_get_program_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr(config_utils, "_PROGRAM_CACHE", {})
+    monkeypatch.setattr(config_utils, "_PROGRAM_CACHE_STATS",
+                        {"lookups": 0, "hits": 0, "checks_saved": 0})
+    monkeypatch.setattr(config_utils, "_WORKER_CACHE_STATS",
+                        {"lookups": 0, "hits": 0, "checks_saved": 0, "programs": 0})
+    bin_one = tmpdir.mkdir("one")
+    bin_two = tmpdir.mkdir("two")
+    prog_one = _make_program(bin_one, "bcbio_test_prog")
+    prog_two = _make_program(bin_two, "bcbio_test_prog")
+    monkeypatch.setenv("PATH", str(bin_one))
+    config = {"resources": {}}
+    assert config_utils.get_program("bcbio_test_prog", config) == prog_one
+    assert config_utils.get_program("bcbio_test_prog", {"config": config}) == prog_one
+    stats = config_utils.get_program_cache_stats()
+    assert stats["lookups"] == 2 and stats["hits"] == 1 and stats["checks_saved"] > 0
+    # PATH changes trigger a new lookup
+    monkeypatch.setenv("PATH", str(bin_two))
+    assert config_utils.get_program("bcbio_test_prog", config) == prog_two
+    # so do configuration changes
+    config = {"resources": {"bcbio_test_prog": {"cmd": prog_one, "dir": str(bin_one)}}}
+    assert config_utils.get_program("bcbio_test_prog", config) == prog_one
+    assert config_utils.get_program("bcbio_test_prog", config, "dir") == str(bin_one)
+    assert config_utils.get_program_cache_stats()["hits"] == 1
+    with pytest.raises(config_utils.CmdNotFound):
+        config_utils.get_program("bcbio_missing_prog", {})
@@ -0,0 +1,125 @@
+import gzip
+import random
+import struct
+import zlib
+
+import pysam
+
+from bcbio.distributed import multi
+from bcbio.pipeline import disambiguate
+from bcbio.pipeline.disambiguate import pdxfilter
+
+
+def _write_bam(fname, names, seed):
+    """Write a query name sorted BAM with paired alignments for each name.
+    """
+    rand = random.Random(seed)
+    header = {"HD": {"VN": "1.0", "SO": "queryname"},
+              "SQ": [{"SN": "chr1", "LN": 1000000}]}
+    with pysam.AlignmentFile(fname, "wb", header=header) as out_bam:
+        for name in names:
+            pos = rand.randint(0, 999000)
+            score = rand.randint(80, 100)
+            for read1, (start, mate_start) in [(True, (pos, pos + 200)), (False, (pos + 200, pos))]:
+                read = pysam.AlignedSegment()
+                read.query_name = name
+                read.query_sequence = "".join(rand.choice("ACGT") for _ in range(100))
+                read.query_qualities = pysam.qualitystring_to_array("I" * 100)
+                read.flag = 1 + 2 + (64 if read1 else 128)
+                read.reference_id = 0
+                read.reference_start = start
+                read.mapping_quality = 60
+                read.cigarstring = "100M"
+                read.next_reference_id = 0
+                read.next_reference_start = mate_start
+                read.set_tags([("AS", score), ("NM", rand.randint(0, 3))])
+                out_bam.write(read)
+    return fname
+
+
+def _prep_bams(tmpdir):
+    names = sorted(["read%s" % i for i in range(3000)], key=pdxfilter.convert_alphanumeric)
+    human = _write_bam(str(tmpdir.join("human.bam")), names, 1)
+    explant = _write_bam(str(tmpdir.join("explant.bam")),
+                         [x for i, x in enumerate(names) if i % 3], 2)
+    return human, explant
+
+
+def _bgzf_block(data):
+    compress = zlib.compressobj(6, zlib.DEFLATED, -15)
+    cdata = compress.compress(data) + compress.flush()
+    header = struct.pack("<BBBBIBBHBBHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(cdata) + 25)
+    return header + cdata + struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data))
+
+
+def _reblock(in_file, out_file, block_size=10000):
+    """Rewrite a BAM in fixed size BGZF blocks, so alignments span blocks.
+    """
+    with gzip.open(in_file, "rb") as in_handle:
+        data = in_handle.read()
+    with open(out_file, "wb") as out_handle:
+        for i in range(0, len(data), block_size):
+            out_handle.write(_bgzf_block(data[i:i + block_size]))
+        out_handle.write(_bgzf_block(b""))
+    return out_file
+
+
+def _read_names(fname):
+    with pysam.AlignmentFile(fname, "rb", check_sq=False) as in_bam:
+        return [x.query_name for x in in_bam]
+
+
+def test_infer_sort_order():
+    assert pdxfilter.infer_sort_order(["r2", "r10", "r10", "r11"]) == "natural"
+    assert pdxfilter.infer_sort_order(["r10", "r11", "r2"]) == "lexicographic"
+    assert pdxfilter.infer_sort_order(["r2", "r1"]) is None
+
+
+def test_sharded_matches_serial(tmpdir):
+    human, explant = _prep_bams(tmpdir)
+    outputs = {}
+    for name, num_shards in [("serial", 1), ("sharded", 5)]:
+        out_files = [str(tmpdir.join("%s.%s.bam" % (name, x))) for x in ["human", "explant", "ambiguous"]]
+        summary = str(tmpdir.join("%s_summary.txt" % name))
+        if num_shards == 1:
+            counts = pdxfilter.PDXFilter(human, explant, *(out_files + [summary])).run()
+        else:
+            counts = pdxfilter.run_sharded(human, explant, *(out_files + [summary]),
+                                           num_shards=num_shards)
+        outputs[name] = (counts, [_read_names(x) for x in out_files], open(summary).read())
+    assert outputs["serial"] == outputs["sharded"]
+    assert sum(outputs["serial"][0]) == 3000
+    _, shards = pdxfilter.find_shards(human, explant, 5)
+    assert len(shards) > 1
+
+
+def _serial_outputs(tmpdir, human, explant):
+    out_files = [str(tmpdir.join("serial.%s.bam" % x)) for x in ["human", "explant", "ambiguous"]]
+    counts = pdxfilter.PDXFilter(human, explant, *out_files).run()
+    return counts, [_read_names(x) for x in out_files]
+
+
+def test_shards_spanning_blocks(tmpdir):
+    """Shard boundaries are found when alignments do not start BGZF blocks.
+    """
+    human, explant = _prep_bams(tmpdir)
+    human = _reblock(human, str(tmpdir.join("human_reblock.bam")))
+    explant = _reblock(explant, str(tmpdir.join("explant_reblock.bam")))
+    _, shards = pdxfilter.find_shards(human, explant, 8)
+    assert len(shards) > 1
+    assert any(x["human"][0] & 0xffff for x in shards[1:])
+    out_files = [str(tmpdir.join("sharded.%s.bam" % x)) for x in ["human", "explant", "ambiguous"]]
+    counts = pdxfilter.run_sharded(human, explant, *out_files, num_shards=8)
+    assert (counts, [_read_names(x) for x in out_files]) == _serial_outputs(tmpdir, human, explant)
+
+
+def test_sharded_multicore(tmpdir):
+    """Shards run through the persistent multicore pool match a serial run.
+    """
+    human, explant = _prep_bams(tmpdir)
+    base = str(tmpdir.join("multicore"))
+    config = {"algorithm": {}, "resources": {}}
+    with multi.worker_pool():
+        counts = disambiguate._run_pdx_filter_sharded(human, explant, base, 2, config)
+    out_files = ["%s.%s.bam" % (base, x) for x in ["human", "explant", "ambiguous"]]
+    assert (counts, [_read_names(x) for x in out_files]) == _serial_outputs(tmpdir, human, explant)
@@ -0,0 +1,42 @@
+from bcbio.pipeline import region
+
+
+def _data(caller="gatk-haplotype"):
+    return {"config": {"algorithm": {"variantcaller": caller}}}
+
+
+def test_mean_depth():
+    depths = {"chr1": ([0, 100, 200], [100, 200, 300], [10.0, 20.0, 0.0])}
+    assert region._mean_depth(("chr1", 0, 100), depths) == 10.0
+    assert region._mean_depth(("chr1", 50, 150), depths) == 15.0
+    assert region._mean_depth(("chr1", 150, 300), depths) == 20.0 / 3
+    assert region._mean_depth(("chr2", 0, 100), depths) is None
+
+
+def test_region_cost():
+    depths = {"chr1": ([0], [1000], [30.0])}
+    assert region.region_cost(("chr1", 0, 100), _data(), depths) == 3000.0
+    assert region.region_cost(("chr1", 0, 100), _data(), {}) == 100.0
+
+
+def test_region_depths_cache(tmpdir):
+    """Cached depths are re-read when the depth file changes.
+    """
+    depth_file = tmpdir.join("regions.bed")
+    depth_file.write("chr1\t0\t100\t10.0\n")
+    assert region._read_region_depths(str(depth_file)) == {"chr1": ([0], [100], [10.0])}
+    depth_file.write("chr1\t0\t100\t10.0\nchr2\t0\t50\t5.0\n")
+    assert region._read_region_depths(str(depth_file))["chr2"] == ([0], [50], [5.0])
+
+
+def test_sort_and_partition_by_cost(monkeypatch):
+    monkeypatch.setattr(region, "_get_region_depths", lambda data: {})
+    regions = [("chr1", 0, 10), ("chr1", 20, 1000), ("chr1", 1100, 1110),
+               ("chr2", 0, 500), ("chr2", 600, 1100)]
+    assert region.sort_by_cost(regions, _data())[0] == ("chr1", 20, 1000)
+    blocks = region.partition_by_cost(regions, 3, _data())
+    assert [r for b in blocks for r in b] == regions
+    assert blocks == [[("chr1", 0, 10), ("chr1", 20, 1000)],
+                      [("chr1", 1100, 1110), ("chr2", 0, 500)],
+                      [("chr2", 600, 1100)]]
+    assert region.partition_by_cost(regions, 1, _data()) == [regions]
@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from bcbio.provenance import diagnostics
+
+
+def test_commands_without_data_use_run_db(tmpdir, monkeypatch):
+    monkeypatch.setattr(diagnostics, "_RUN_DB", None)
+    db_file = diagnostics.initialize({"work": str(tmpdir)})
+    cmd_id = diagnostics.start_cmd("samtools index in.bam", "Index BAM", None)
+    assert cmd_id["db"] == db_file
+    diagnostics.end_cmd(cmd_id, True, {"exitcode": 0})
+    info = diagnostics.summarize(db_file)
+    assert [(x[0], x[1]) for x in info["programs"]] == [("samtools", 1)]
+
+
+def test_summarize_unknown_run(tmpdir, monkeypatch):
+    monkeypatch.setattr(diagnostics, "_RUN_DB", None)
+    db_file = diagnostics.initialize({"work": str(tmpdir)})
+    info = diagnostics.summarize(db_file, run_id=42)
+    assert info["start"] is None
+    assert info["runs"] == [1]
+
+
+def test_busy_db_drops_records(tmpdir, monkeypatch):
+    """Writes give up quickly on a locked database instead of blocking workers.
+    """
+    monkeypatch.setattr(diagnostics, "_RUN_DB", None)
+    monkeypatch.setattr(diagnostics, "_WRITE_TIMEOUT", 0.1)
+    db_file = diagnostics.initialize({"work": str(tmpdir)})
+    lock = sqlite3.connect(db_file)
+    lock.execute("BEGIN EXCLUSIVE")
+    try:
+        start = time.time()
+        diagnostics.record_stage({"work": str(tmpdir)}, "alignment", start, start + 1)
+        assert time.time() - start < 5
+    finally:
+        lock.rollback()
+        lock.close()
+    assert diagnostics.summarize(db_file)["stages"] == []
+    diagnostics.record_stage({"work": str(tmpdir)}, "alignment", start, start + 1)
+    assert [x[0] for x in diagnostics.summarize(db_file)["stages"]] == ["alignment"]
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pytest
+
+from bcbio.rnaseq import count
+
+
+def _write_counts(fname, rows):
+    with open(fname, "w") as out_handle:
+        for name, val in rows:
+            out_handle.write("%s\t%s\n" % (name, val))
+    return fname
+
+
+def _read(fname):
+    with open(fname) as in_handle:
+        return [l.rstrip("\n").split("\t") for l in in_handle]
+
+
+def test_combine_count_files(tmpdir):
+    files = [_write_counts(str(tmpdir.join("s2.counts")), [("geneA", 5), ("geneB", 0)]),
+             _write_counts(str(tmpdir.join("s1.counts")), [("geneA", 1.5), ("geneB", "NA")])]
+    out_file = count.combine_count_files(files, str(tmpdir.join("combined.counts")), ext=".counts",
+                                         binary=True)
+    assert _read(out_file) == [["id", "s1", "s2"], ["geneA", "1.5", "5"], ["geneB", "NA", "0"]]
+    with np.load(out_file + ".npz") as mat:
+        assert list(mat["colnames"]) == ["s1", "s2"]
+        assert list(mat["rownames"]) == ["geneA", "geneB"]
+        assert mat["matrix"][0].tolist() == [1.5, 5.0]
+
+
+def test_combine_count_files_mismatched_rows(tmpdir):
+    files = [_write_counts(str(tmpdir.join("s1.counts")), [("geneA", 5), ("geneB", 0)]),
+             _write_counts(str(tmpdir.join("s2.counts")), [("geneB", 1), ("geneA", 2)])]
+    with pytest.raises(ValueError):
+        count.combine_count_files(files, str(tmpdir.join("combined.counts")), ext=".counts")
+    files[1] = _write_counts(files[1], [("geneA", 1)])
+    with pytest.raises(ValueError):
+        count.combine_count_files(files, str(tmpdir.join("combined.counts")), ext=".counts")
+    assert not os.path.exists(str(tmpdir.join("combined.counts")))
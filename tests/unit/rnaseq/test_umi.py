@@ -0,0 +1,49 @@
+import numpy as np
+from scipy import sparse
+
+from bcbio.rnaseq import umi
+
+
+def _part(i, nrows=5, ncols=3):
+    matrix = sparse.random(nrows, ncols, density=0.4, format="coo", random_state=i)
+    return umi.SparseMatrix(matrix, ["gene%s" % x for x in range(nrows)],
+                            ["s%s:cell%s" % (i, x) for x in range(ncols)])
+
+
+def test_concatenate_matches_stack():
+    parts = [_part(i) for i in range(4)]
+    combined = umi.SparseMatrix.concatenate(parts)
+    expected = sparse.hstack([x.matrix for x in parts])
+    assert combined.matrix.shape == (5, 12)
+    assert (combined.matrix != expected).nnz == 0
+    assert combined.rownames == ["gene%s" % x for x in range(5)]
+    assert combined.colnames == ["s%s:cell%s" % (i, x) for i in range(4) for x in range(3)]
+    byrow = umi.SparseMatrix.concatenate(parts, byrow=True)
+    assert (byrow.matrix != sparse.vstack([x.matrix for x in parts])).nnz == 0
+    assert byrow.rownames == ["gene%s" % x for _ in range(4) for x in range(5)]
+    assert byrow.colnames == ["s0:cell%s" % x for x in range(3)]
+
+
+def test_cat_appends_columns():
+    parts = [_part(i) for i in range(3)]
+    counts = umi.SparseMatrix()
+    for part in parts:
+        counts.cat(part)
+    assert (counts.matrix != sparse.hstack([x.matrix for x in parts])).nnz == 0
+    assert counts.colnames == ["s%s:cell%s" % (i, x) for i in range(3) for x in range(3)]
+
+
+def test_npz_roundtrip(tmpdir):
+    counts = umi.SparseMatrix.concatenate([_part(i) for i in range(3)])
+    out_file = counts.write(str(tmpdir.join("tagcounts.mtx.npz")))
+    mapped = umi.SparseMatrix()
+    mapped.read(out_file, colprefix="batch")
+    # memory mapped arrays are read-only views of the file
+    assert not mapped.matrix.data.flags.writeable
+    assert mapped.rownames == counts.rownames
+    assert mapped.colnames == ["batch:" + x for x in counts.colnames]
+    assert np.allclose(mapped.matrix.toarray(), counts.matrix.toarray())
+    loaded = umi.SparseMatrix()
+    loaded.read(out_file, mmap=False)
+    assert loaded.matrix.data.flags.writeable
+    assert np.allclose(loaded.matrix.toarray(), counts.matrix.toarray())
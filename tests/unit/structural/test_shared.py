@@ -0,0 +1,17 @@
+from bcbio.structural import shared
+
+
+def test_exclude_by_ends(tmpdir):
+    exclude_file = tmpdir.join("exclude.bed")
+    exclude_file.write("chr1\t1000\t1040\nchr1\t5000\t8000\n")
+    in_file = tmpdir.join("calls.bed")
+    # ends with 40bp in a repeat are removed, 20bp is below the 50% window cutoff
+    in_file.write("chr1\t990\t3000\tDEL_lumpy\n"
+                  "chr1\t2000\t5020\tDEL_lumpy\n"
+                  "chr1\t2000\t5040\tDEL_lumpy\n"
+                  "chr2\t990\t3000\tDEL_lumpy\n")
+    out_file, removed = shared.exclude_by_ends(str(in_file), str(exclude_file), {})
+    assert removed == 2
+    with open(out_file) as in_handle:
+        assert in_handle.read() == "chr1\t2000\t5020\tDEL_lumpy\nchr2\t990\t3000\tDEL_lumpy\n"
+    assert len(shared._EXCLUDE_CACHE) == 1
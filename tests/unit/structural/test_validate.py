@@ -0,0 +1,77 @@
+import csv
+import os
+
+import pytest
+
+from bcbio.structural import validate
+
+
+def _write_vcf(fname, records):
+    with open(fname, "w") as out_handle:
+        out_handle.write("##fileformat=VCFv4.2\n")
+        out_handle.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample\n")
+        for chrom, start, end, svtype in records:
+            info = "SVTYPE=%s;END=%s" % (svtype, end) if end else "SVTYPE=BND"
+            out_handle.write("\t".join([chrom, str(start), ".", "N", "<%s>" % svtype, "50", "PASS",
+                                        info, "GT", "0/1"]) + "\n")
+    return fname
+
+
+@pytest.fixture
+def sv_inputs(tmpdir, monkeypatch):
+    monkeypatch.setattr(validate.bedutils, "clean_file", lambda x, data: x)
+    monkeypatch.setattr(validate, "slim_vcf", lambda x, data: x)
+    truth = _write_vcf(str(tmpdir.join("truth.vcf")),
+                       [("1", 1000, 2000, "DEL"), ("1", 50000, 51000, "DEL"),
+                        ("1", 90000, 90500, "DUP"), ("2", 5000, 6000, "DEL")])
+    calls = _write_vcf(str(tmpdir.join("calls.vcf")),
+                       [("1", 1100, 2050, "DEL"), ("1", 50100, 51050, "DEL"),
+                        ("1", 70000, 71000, "DEL"), ("2", 5400, 6000, "DEL"),
+                        ("2", 8000, None, "BND")])
+    callable_bed = str(tmpdir.join("callable.bed"))
+    with open(callable_bed, "w") as out_handle:
+        out_handle.write("1\t0\t3000\n1\t49000\t55000\n1\t65000\t80000\n2\t0\t10000\n")
+    return truth, calls, callable_bed
+
+
+def _counts(rows):
+    return dict(((svtype, metric), count) for _, _, svtype, metric, count in rows)
+
+
+def test_sv_truth_matcher(sv_inputs, tmpdir):
+    truth, calls, callable_bed = sv_inputs
+    matcher = validate.SVTruthMatcher(truth, callable_bed, {"description": "sample"})
+    detail_dir = str(tmpdir.mkdir("caller"))
+    counts = _counts(matcher.validate(calls, "caller", detail_dir, {"description": "sample"}))
+    # the truth DUP is outside callable regions and the DEL call at 70000 has no truth event
+    assert counts[("DEL", "tp")] == 3
+    assert counts[("DEL", "fn")] == 0
+    assert counts[("DEL", "fp")] == 1
+    assert counts[("DUP", "tp")] == 0
+    assert counts[("DUP", "fn")] == 0
+    with open(os.path.join(detail_dir, "tp.vcf")) as in_handle:
+        assert [l.split("\t")[1] for l in in_handle] == ["1100", "50100", "5400"]
+
+
+def test_sv_truth_matcher_breakpoints(sv_inputs, tmpdir):
+    truth, calls, callable_bed = sv_inputs
+    matcher = validate.SVTruthMatcher(truth, callable_bed, {"description": "sample"},
+                                      max_breakpoint_distance=200, min_reciprocal_overlap=0.5)
+    detail_dir = str(tmpdir.mkdir("caller"))
+    counts = _counts(matcher.validate(calls, "caller", detail_dir, {"description": "sample"}))
+    # the chromosome 2 call starts 400bp from the truth start
+    assert counts[("DEL", "tp")] == 2
+    assert counts[("DEL", "fn")] == 1
+    assert counts[("DEL", "fp")] == 1
+
+
+def test_evaluate_vcf_config(sv_inputs, tmpdir):
+    truth, calls, callable_bed = sv_inputs
+    data = {"description": "sample", "regions": {"callable": callable_bed},
+            "config": {"algorithm": {"max_breakpoint_distance": 200, "min_reciprocal_overlap": 0.5}}}
+    work_dir = str(tmpdir.mkdir("validate"))
+    out_file = validate._evaluate_vcf([{"variantcaller": "caller", "vrn_file": calls}], truth, work_dir, data)
+    with open(out_file) as in_handle:
+        counts = _counts(list(csv.reader(in_handle))[1:])
+    assert counts[("DEL", "tp")] == "2"
+    assert counts[("DEL", "fn")] == "1"
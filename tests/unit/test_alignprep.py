@@ -1,3 +1,8 @@
+import os
+import subprocess
+
+import pytest
+
 from bcbio.ngsalign import alignprep
 
 
@@ -11,3 +16,82 @@ class TestMisc(object):
         assert alignprep._pick_align_split_size(250, 5, 20, 50) == 20
         assert alignprep._pick_align_split_size(500, 5, 20, 50) == 40
         assert alignprep._pick_align_split_size(750, 5, 20, 50) == 60
+
+    def test_read_offset_index(self, tmpdir):
+        """Build read offset indexes from fastq input streamed in arbitrary chunks.
+        """
+        records = [b"@r%s\nACGT\n+\nIIII\n" % i for i in range(25)]
+        fastq = b"".join(records)
+        expected = [sum(len(r) for r in records[:i]) for i in range(0, 25, 10)]
+        for chunk_size in [1, 7, 64, len(fastq)]:
+            indexer = alignprep._ReadOffsetIndexer(step=10)
+            for i in range(0, len(fastq), chunk_size):
+                indexer.add(fastq[i:i + chunk_size])
+            in_file = str(tmpdir.join("reads%s.fq.gz" % chunk_size))
+            indexer.write(in_file + alignprep.READ_INDEX_EXT)
+            index = alignprep.read_offset_index(in_file)
+            assert index == {"reads": 25, "step": 10, "offsets": expected}
+            assert alignprep.total_reads(in_file) == 25
+
+    def test_read_offset_index_splits(self, tmpdir):
+        """Split bgzipped fastq on read index points, seeking with BGZF virtual offsets.
+        """
+        from Bio import bgzf
+        records = [b"@r%s\n%s\n+\n%s\n" % (i, b"A" * (i % 150 + 1), b"I" * (i % 150 + 1))
+                   for i in range(5000)]
+        in_file = str(tmpdir.join("reads.fq.gz"))
+        with bgzf.BgzfWriter(in_file, "wb") as out_handle:
+            out_handle.write(b"".join(records))
+        indexer = alignprep._ReadOffsetIndexer(step=100)
+        indexer.add(b"".join(records))
+        indexer.write(in_file + alignprep.READ_INDEX_EXT, in_file)
+        index = alignprep.read_offset_index(in_file)
+        assert len(index["voffsets"]) == 50
+        with bgzf.BgzfReader(in_file, "rb") as in_handle:
+            for i in [0, 1, 27, 49]:
+                in_handle.seek(index["voffsets"][i])
+                assert in_handle.read(len(records[i * 100])) == records[i * 100]
+        assert alignprep._find_read_splits(in_file, 1234) == ["1-4800", "4801-9600", "9601-14400",
+                                                             "14401-19200", "19201-20000"]
+
+    def test_stream_with_read_index(self, tmpdir):
+        """Index streamed reads while passing them on, reaping commands which exit early.
+        """
+        in_file = str(tmpdir.join("reads.fq"))
+        with open(in_file, "w") as out_handle:
+            out_handle.write("".join("@r%s\nACGT\n+\nIIII\n" % i for i in range(25)))
+        out_file = str(tmpdir.join("reads-copy.fq"))
+        index_file = str(tmpdir.join("reads-copy.fq" + alignprep.READ_INDEX_EXT))
+        alignprep._stream_with_read_index("cat %s" % in_file, index_file, "cat > %s" % out_file)
+        assert open(out_file).read() == open(in_file).read()
+        assert alignprep.read_offset_index(out_file)["reads"] == 25
+        fail_index = str(tmpdir.join("fail.fq" + alignprep.READ_INDEX_EXT))
+        with pytest.raises(subprocess.CalledProcessError) as excinfo:
+            alignprep._stream_with_read_index("yes @r | head -n 10000000", fail_index, "exit 3")
+        assert excinfo.value.returncode == 3
+        assert not os.path.exists(fail_index)
+
+    def test_split_namedpipe_missing_index(self, tmpdir, monkeypatch):
+        """Rebuild a missing read offset index for the second pair instead of requiring grabix.
+        """
+        from Bio import bgzf
+        records = ("".join("@r%s\nACGT\n+\nIIII\n" % i for i in range(2000))).encode("ascii")
+        in_files = [str(tmpdir.join("reads_%s.fq.gz" % i)) for i in [1, 2]]
+        for in_file in in_files:
+            with bgzf.BgzfWriter(in_file, "wb") as out_handle:
+                out_handle.write(records)
+
+        def _read_index(in_file, config):
+            indexer = alignprep._ReadOffsetIndexer()
+            indexer.add(records)
+            return indexer.write(in_file + alignprep.READ_INDEX_EXT, in_file)
+        monkeypatch.setattr(alignprep, "_read_index", _read_index)
+        _read_index(in_files[0], {})
+        data = {"align_split": "4001-8000", "config": {"resources": {"bgzip": {"cmd": "cat"}}}}
+        cls = alignprep.split_namedpipe_cls(in_files[0], in_files[1], data)
+        assert [x.startswith("<(tail -c") for x in cls] == [True, True]
+        assert os.path.exists(in_files[1] + alignprep.READ_INDEX_EXT)
+        monkeypatch.setattr(alignprep, "_read_index", lambda in_file, config: None)
+        with pytest.raises(ValueError) as excinfo:
+            alignprep.split_namedpipe_cls(str(tmpdir.join("missing.fq.gz")), None, data)
+        assert "read offset index" in str(excinfo.value)
@@ -0,0 +1,100 @@
+import random
+
+from bcbio.bed.intervals import IntervalSet
+
+
+def _set(regions, chrom="chr1"):
+    return IntervalSet.from_records([(chrom, s, e) for s, e in regions])
+
+
+def _coords(intervals):
+    return [(x.start, x.end) for x in intervals]
+
+
+def _random_blocks(rand, n, max_pos=5000):
+    """Sorted, non-overlapping blocks, some book-ended, like nblock BED files.
+    """
+    points = sorted(rand.sample(range(max_pos), 2 * n))
+    out = []
+    for i in range(n):
+        start, end = points[2 * i], points[2 * i + 1]
+        if out and rand.random() < 0.3:
+            start = out[-1][1]
+        out.append((start, end))
+    return out
+
+
+def _covered(regions):
+    covered = set()
+    for start, end in regions:
+        covered.update(range(start, end))
+    return covered
+
+
+def _subtract(regions, other):
+    covered = _covered(other)
+    out = []
+    for start, end in regions:
+        cur = None
+        for pos in range(start, end):
+            if pos in covered:
+                if cur is not None:
+                    out.append((cur, pos))
+                cur = None
+            elif cur is None:
+                cur = pos
+        if cur is not None:
+            out.append((cur, end))
+    return out
+
+
+def test_interval_operations():
+    a = _set([(0, 100), (100, 200), (500, 900)])
+    b = _set([(50, 150), (600, 700), (800, 1000)])
+    assert _coords(a.intersect(b)) == [(50, 100), (100, 150), (600, 700), (800, 900)]
+    assert _coords(a.subtract(b)) == [(0, 50), (150, 200), (500, 600), (700, 800)]
+    assert _coords(a.merge()) == [(0, 200), (500, 900)]
+    assert _coords(a.merge(300)) == [(0, 900)]
+    assert _coords(a.filter_size(100)) == [(500, 900)]
+    ref = IntervalSet.from_records([("chr1", 0, 1200), ("chr2", 0, 500)])
+    assert _coords(a.complement(ref)) == [(200, 500), (900, 1200), (0, 500)]
+    assert [x.chrom for x in a.complement(ref)] == ["chr1", "chr1", "chr2"]
+    combined = _set([(10, 20)], "chr2").cat(a).sort(["chr1", "chr2"])
+    assert combined.chroms() == ["chr1", "chr2"]
+    assert len(combined) == 4
+
+
+def test_interval_operations_random():
+    rand = random.Random(42)
+    for _ in range(200):
+        a = _random_blocks(rand, rand.randint(0, 20))
+        b = _random_blocks(rand, rand.randint(0, 20))
+        expected = [(max(s, bs), min(e, be)) for s, e in a for bs, be in b if bs < e and be > s]
+        assert _coords(_set(a).intersect(_set(b))) == expected
+        assert _coords(_set(a).subtract(_set(b))) == _subtract(a, b)
+        assert _coords(_set([(0, 5000)]).subtract(_set(a + b))) == _subtract([(0, 5000)], a + b)
+
+
+def test_bed_roundtrip(tmpdir):
+    in_file = tmpdir.join("in.bed")
+    in_file.write("track name=test\nchr1\t10\t20\tname\nchr2\t5\t8\n\nchr1\t30\t40\n")
+    regions = IntervalSet.from_bed(str(in_file))
+    assert regions.chroms() == ["chr1", "chr2"]
+    out_file = regions.to_bed(str(tmpdir.join("out.bed")))
+    with open(out_file) as in_handle:
+        assert in_handle.read() == "chr1\t10\t20\nchr1\t30\t40\nchr2\t5\t8\n"
+    assert IntervalSet.from_bed(out_file) == regions
+
+
+def test_overlaps_random():
+    rand = random.Random(7)
+    for _ in range(200):
+        # overlapping repeats, unlike merged blocks
+        repeats = sorted((s, s + rand.randint(1, 300)) for s in rand.sample(range(5000), rand.randint(0, 30)))
+        queries = [(s, s + 50) for s in rand.sample(range(5000), rand.randint(0, 20))]
+        idx, starts, ends = _set(repeats).overlaps("chr1", [s for s, _ in queries], [e for _, e in queries])
+        found = sorted(zip(idx.tolist(), starts.tolist(), ends.tolist()))
+        expected = sorted((i, r_start, r_end) for i, (s, e) in enumerate(queries)
+                          for r_start, r_end in repeats if r_start < e and r_end > s)
+        assert found == expected
+    assert [len(x) for x in _set(repeats).overlaps("chr2", [10], [20])] == [0, 0, 0]
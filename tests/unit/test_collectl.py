@@ -0,0 +1,49 @@
+import datetime
+import gzip
+
+from bcbio.graph import collectl
+
+
+def _write_raw(out_file):
+    lines = ["# SubSys: b NumCPUs: 8 HZ: 100",
+             "# Kernel: 3.10.0 Memory: 16384000 kB Swap: 0 kB"]
+    for tstamp in [1000, 1010, 1020]:
+        lines.append(">>> %s.003 <<<" % tstamp)
+        lines.append("cpu  %s 1 2 3 4 5 6 7 0 0" % tstamp)
+        lines.append("cpu0  1 1 2 3 4 5 6 7 0 0")
+        lines.append("disk 8 0 sda %s 2 3 4 5 6 7 8 9 10 11" % tstamp)
+        lines.append("Net   eth0:%s 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16" % tstamp)
+        for mem in ["MemTotal:", "MemFree:", "Buffers:", "Cached:"]:
+            lines.append("%s %s kB" % (mem, tstamp))
+    # truncated final sample
+    lines.extend([">>> 1030.001 <<<", "cpu  1 1 1 1 1 1 1 1 0 0"])
+    with gzip.open(out_file, "wb") as out_handle:
+        out_handle.write("\n".join(lines).encode("ascii") + b"\n")
+
+
+def test_load_collectl(tmpdir):
+    raw_file = str(tmpdir.join("host-20171105-000000.raw.gz"))
+    _write_raw(raw_file)
+    start, end = [datetime.datetime.utcfromtimestamp(x) for x in [1010, 1100]]
+    for _ in range(2):  # parse, then load from cache
+        df, hardware = collectl.load_collectl(raw_file, start, end)
+        assert hardware == {"num_cpus": 8, "memory": 16}
+        assert len(df) == 2
+        assert df["cpu_user"].tolist() == [1010.0, 1020.0]
+        assert df["sda_num_reads"].tolist() == [1010.0, 1020.0]
+        assert df["eth0_rbyte"].tolist() == [1010.0, 1020.0]
+        assert df["mem_cached"].tolist() == [1010.0, 1020.0]
+    assert tmpdir.join("host-20171105-000000.raw.gz.npz").check()
+
+
+def test_load_collectl_cache_write_failure(tmpdir, monkeypatch):
+    raw_file = str(tmpdir.join("host-20171105-000000.raw.gz"))
+    _write_raw(raw_file)
+
+    def _rename(src, dst):
+        raise OSError("Read-only file system")
+    monkeypatch.setattr(collectl.os, "rename", _rename)
+    start, end = [datetime.datetime.utcfromtimestamp(x) for x in [1010, 1100]]
+    df, hardware = collectl.load_collectl(raw_file, start, end)
+    assert len(df) == 2
+    assert tmpdir.listdir() == [tmpdir.join("host-20171105-000000.raw.gz")]
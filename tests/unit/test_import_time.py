@@ -0,0 +1,29 @@
+"""Startup imports for command line entry points and CWL steps.
+
+Heavy dependencies should be lazily imported, since every worker and CWL step
+imports the pipeline modules. scripts/utils/benchmark_import_time.py reports
+and checks startup times.
+"""
+import subprocess
+import sys
+
+import pytest
+
+ENTRY_POINTS = ["bcbio.pipeline.main", "bcbio.distributed.runfn"]
+HEAVY_MODULES = ["pandas", "scipy", "matplotlib", "statsmodels", "pysam", "pybedtools",
+                 "vcf", "cyvcf2", "gffutils", "seqcluster"]
+
+
+def _loaded_modules(module):
+    """Top level modules loaded by importing a module in a new Python process.
+    """
+    out = subprocess.check_output([sys.executable, "-c",
+                                   "import sys; __import__(sys.argv[1]); print(' '.join(sys.modules))",
+                                   module])
+    return set(x.split(".")[0] for x in out.decode().strip().split("\n")[-1].split())
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_startup_avoids_heavy_imports(module):
+    loaded = _loaded_modules(module)
+    assert [x for x in HEAVY_MODULES if x in loaded] == []
@@ -0,0 +1,52 @@
+import csv
+
+import pysam
+
+from bcbio.variation import validate
+
+HEADER = """##fileformat=VCFv4.2
+##FILTER=<ID=PASS,Description="All filters passed">
+##FILTER=<ID=LowQual,Description="Low quality">
+##INFO=<ID=VAF,Number=1,Type=Float,Description="Variant allele frequency">
+##INFO=<ID=type,Number=1,Type=String,Description="Validation class">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allele depths">
+##contig=<ID=1,length=100000>
+##contig=<ID=2,length=100000>
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO"""
+
+
+def _write_indexed(fname, records, samples=None):
+    with open(fname, "w") as out_handle:
+        out_handle.write(HEADER)
+        out_handle.write("\tFORMAT\t%s\n" % "\t".join(samples) if samples else "\n")
+        for rec in records:
+            out_handle.write("\t".join(rec.split()) + "\n")
+    return pysam.tabix_index(fname, preset="vcf", force=True)
+
+
+def test_freq_summary(tmpdir):
+    val_file = _write_indexed(str(tmpdir.join("val.vcf")),
+                              ["1 100 . A G 50 PASS type=TP",
+                               "1 100 . A T 50 PASS type=FP",
+                               "1 250 . AT A 50 PASS type=FN",
+                               "1 300 . C G 50 PASS type=FP",
+                               "2 50 . G C 50 PASS type=TP"])
+    truth_file = _write_indexed(str(tmpdir.join("truth.vcf")),
+                                ["1 100 . A G 50 PASS VAF=0.5",
+                                 "1 250 . AT A 50 PASS ."])
+    call_file = _write_indexed(str(tmpdir.join("calls.vcf")),
+                               ["1 100 . A G 50 PASS . GT:AD 0/1:1,1",
+                                "1 100 . A T 50 PASS . GT:AD 0/1:6,2",
+                                "1 300 . C G 50 LowQual . GT:AD 0/1:5,5",
+                                "2 50 . G C 50 PASS . GT:AD 0/1:3,1"],
+                               samples=["tumor"])
+    out_file = validate.freq_summary(val_file, call_file, truth_file, "tumor")
+    with open(out_file) as in_handle:
+        rows = list(csv.reader(in_handle))
+    assert rows == [["vtype", "valclass", "freq"],
+                    ["snp", "TP", "0.5"],
+                    ["snp", "FP", "0.25"],
+                    ["indel", "FN", "1.0"],
+                    ["snp", "FP", "0.0"],
+                    ["snp", "TP", "0.25"]]
@@ -0,0 +1,127 @@
+import os
+import random
+
+import pysam
+import pytest
+
+from bcbio.variation import vcfstats
+
+HEADER = """##fileformat=VCFv4.2
+##FILTER=<ID=PASS,Description="All filters passed">
+##FILTER=<ID=REJECT,Description="Germline">
+##FILTER=<ID=LowQual,Description="Low quality">
+##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">
+##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allele depths">
+##contig=<ID=1,length=1000000>
+##contig=<ID=2,length=1000000>
+##contig=<ID=X,length=1000000>
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ttumor\tnormal
+"""
+
+
+def _write_vcf(fname, seed, num_records=400):
+    rand = random.Random(seed)
+    with open(fname, "w") as out_handle:
+        out_handle.write(HEADER)
+        for chrom in ["1", "X", "2", "1"]:
+            pos = 0
+            for _ in range(num_records // 4):
+                pos += rand.randint(1, 500)
+                ref = rand.choice(["A", "C", "AT"])
+                alt = rand.choice(["G", "T", "G,T", "CTT"])
+                filt = rand.choice(["PASS", "PASS", "REJECT", "LowQual"])
+                info = "DP=%s;AF=0.5" % rand.randint(1, 60) if rand.random() < 0.9 else "."
+                samples = []
+                for _ in range(2):
+                    gt = rand.choice(["0/0", "0/1", "1/1", "./."])
+                    ad = ",".join(str(rand.randint(0, 30)) for _ in range(len(alt.split(",")) + 1))
+                    samples.append("%s:%s" % (gt, ad))
+                out_handle.write("\t".join([chrom, str(pos), ".", ref, alt, "50", filt, info, "GT:AD"] +
+                                           samples) + "\n")
+    return fname
+
+
+def _expected_sample_values(in_file, sample_name):
+    depths, freqs = [], []
+    with pysam.VariantFile(in_file) as call_in:
+        for rec in call_in:
+            alt, depth, freq = vcfstats.sample_alt_and_depth(rec, rec.samples[sample_name])
+            depths.append(depth if freq is not None else None)
+            freqs.append(freq)
+    return depths, freqs
+
+
+def test_collect_matches_records(tmpdir):
+    in_file = _write_vcf(str(tmpdir.join("calls.vcf")), 1)
+    stats = vcfstats.get_stats(in_file)
+    assert len(stats) == 400
+    assert stats.sample_names == ["tumor", "normal"]
+    assert stats.chrom_names == ["1", "X", "2"]
+    with pysam.VariantFile(in_file) as bcf_in:
+        depths = [rec.info["DP"] for rec in bcf_in if "DP" in rec.info]
+    assert stats.avg_depth() == -(-sum(depths) // len(depths))
+    assert sum(stats.depth_histogram()) == len(depths)
+    for name in stats.sample_names:
+        depths, freqs = stats.sample_values(name)
+        assert ([None if x != x else x for x in depths.tolist()],
+                [None if x != x else x for x in freqs.tolist()]) == _expected_sample_values(in_file, name)
+        assert sum(stats.genotype_counts(name).values()) == 400
+    types = stats.variant_types()
+    assert types["snp"] + types["indel"] == 400
+
+
+def test_cache_reuse_and_invalidation(tmpdir):
+    in_file = _write_vcf(str(tmpdir.join("calls.vcf")), 2)
+    cache_file = str(tmpdir.join("calls-vcfstats.npz"))
+    first = vcfstats.get_stats(in_file)
+    assert os.path.exists(cache_file)
+    cached = vcfstats.get_stats(in_file)
+    assert cached.summary() == first.summary()
+    _write_vcf(in_file, 3, num_records=200)
+    os.utime(in_file, (0, 0))
+    assert len(vcfstats.get_stats(in_file)) == 200
+
+
+def test_info_only(tmpdir):
+    """VCFs without samples use INFO depth and frequency.
+    """
+    in_file = _write_vcf(str(tmpdir.join("calls.vcf")), 4)
+    info_file = str(tmpdir.join("calls-info.vcf"))
+    with open(in_file) as in_handle, open(info_file, "w") as out_handle:
+        for line in in_handle:
+            if not line.startswith("##"):
+                line = "\t".join(line.rstrip("\n").split("\t")[:8]) + "\n"
+            out_handle.write(line)
+    stats = vcfstats.get_stats(info_file)
+    assert stats.sample_names == []
+    depths, freqs = stats.sample_values("tumor")
+    assert stats.sample_nonref("tumor").all()
+    with pysam.VariantFile(info_file) as bcf_in:
+        expected = [rec.info["DP"] if "DP" in rec.info else None for rec in bcf_in]
+    assert [None if d != d else int(d) for d in depths.tolist()] == expected
+    assert set(freqs[freqs == freqs].tolist()) == {0.5}
+
+
+def test_requested_samples(tmpdir):
+    """Per-sample values are collected only for requested samples, extending the cache.
+    """
+    in_file = _write_vcf(str(tmpdir.join("calls.vcf")), 5)
+    with pysam.VariantFile(in_file) as bcf_in:
+        depths = [rec.info["DP"] for rec in bcf_in if "DP" in rec.info]
+    assert vcfstats.get_avg_depth(in_file) == -(-sum(depths) // len(depths))
+    assert os.path.exists(str(tmpdir.join("calls-vcfstats.npz")))
+    info_stats = vcfstats.get_stats(in_file, samples=[])
+    assert info_stats.sample_names == []
+    assert info_stats.header_samples == ["tumor", "normal"]
+    assert info_stats["depth"].shape == (400, 0)
+    with pytest.raises(ValueError):
+        info_stats.sample_values("tumor")
+    assert vcfstats.get_avg_depth(in_file) == info_stats.avg_depth()
+    tumor_stats = vcfstats.get_stats(in_file, ["tumor"])
+    assert tumor_stats.sample_names == ["tumor"]
+    assert vcfstats.get_stats(in_file, samples=[]).sample_names == ["tumor"]
+    all_stats = vcfstats.get_stats(in_file)
+    assert all_stats.sample_names == ["tumor", "normal"]
+    assert (all_stats.sample_nonref("tumor") == tumor_stats.sample_nonref("tumor")).all()